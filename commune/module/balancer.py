@@ -0,0 +1,148 @@
+import os
+import time
+import random
+import threading
+from typing import Dict, Optional
+import commune as c
+
+
+class Balancer:
+    """
+    Client-side load balancer over the replicas of a module (model, model::a, model::b, ...).
+
+    Each call goes to the better of two random replicas, scored by in-flight calls times the
+    EWMA latency (power of two choices). A replica that fails failure_threshold calls in a row is
+    taken out of rotation (circuit open) and after cooldown seconds one probe call is let through
+    (half open): success puts it back, failure opens the circuit again. The replica set is cached
+    and only re-read when the namespace file changes.
+    """
+    balancers = {}
+    balancers_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, module:str, network:str = 'local', **kwargs) -> 'Balancer':
+        with cls.balancers_lock:
+            if (module, network) not in cls.balancers:
+                cls.balancers[(module, network)] = cls(module, network=network, **kwargs)
+            return cls.balancers[(module, network)]
+
+    def __init__(self,
+                 module:str,
+                 network:str = 'local',
+                 refresh_interval:float = 1.0,
+                 alpha:float = 0.3,
+                 failure_threshold:int = 3,
+                 cooldown:float = 10.0):
+        self.module = module
+        self.network = network
+        self.refresh_interval = refresh_interval
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.replicas = {} # name -> address
+        self.stats = {} # name -> {'inflight', 'latency', 'failures', 'opened', 'probing'}
+        self.namespace_path = None
+        self.namespace_version = None
+        self.last_refresh = 0
+
+    ############ REPLICA LAND ###############
+
+    def version(self) -> Optional[int]:
+        # the mtime of the namespace file, None if the network is not stored in one (e.g. subspace)
+        try:
+            if self.namespace_path == None:
+                self.namespace_path = c.module('namespace').resolve_path(self.network, extension='json')
+            return os.stat(self.namespace_path).st_mtime_ns
+        except Exception:
+            return None
+
+    def refresh(self, force:bool = False) -> Dict[str, str]:
+        now = time.time()
+        if not force and len(self.replicas) > 0 and now - self.last_refresh < self.refresh_interval:
+            return self.replicas
+        self.last_refresh = now
+        version = self.version()
+        if not force and len(self.replicas) > 0 and version != None and version == self.namespace_version:
+            return self.replicas
+        namespace = c.namespace(self.module, network=self.network)
+        # the replicas are the module and its tagged copies, anything matching the search otherwise
+        replicas = {k: v for k, v in namespace.items() if k == self.module or k.startswith(self.module + '::')} or namespace
+        with self.lock:
+            self.replicas = replicas
+            self.stats = {name: self.stats.get(name) or self.new_stats() for name in replicas}
+            self.namespace_version = version
+        return self.replicas
+
+    def new_stats(self) -> dict:
+        return {'inflight': 0, 'latency': None, 'failures': 0, 'opened': None, 'probing': False}
+
+    def address(self, name:str) -> str:
+        return self.replicas[name]
+
+    ############ CHOICE LAND ###############
+
+    def available(self, name:str, now:float) -> bool:
+        stats = self.stats[name]
+        if stats['opened'] == None:
+            return True
+        # half open: a single probe once the cooldown has passed
+        return now - stats['opened'] >= self.cooldown and not stats['probing']
+
+    def load(self, name:str) -> float:
+        stats = self.stats[name]
+        latency = stats['latency']
+        if latency == None:
+            # replicas we have not timed yet count as average
+            known = [s['latency'] for s in self.stats.values() if s['latency'] != None]
+            latency = sum(known) / len(known) if len(known) > 0 else 1.0
+        # the expected wait: calls ahead of us times the typical latency
+        return (stats['inflight'] + 1) * latency
+
+    def choose(self, track:bool = True) -> str:
+        """
+        Picks a replica, counting the call as in flight until release is called if track
+        """
+        self.refresh()
+        now = time.time()
+        with self.lock:
+            assert len(self.replicas) > 0, f'No replicas of {self.module} found in {self.network}'
+            candidates = [name for name in self.replicas if self.available(name, now)]
+            if len(candidates) == 0:
+                # every circuit is open, try the one that opened longest ago rather than fail outright
+                candidates = [min(self.replicas, key=lambda name: self.stats[name]['opened'])]
+            name = min(random.sample(candidates, min(2, len(candidates))), key=self.load)
+            if track:
+                stats = self.stats[name]
+                stats['inflight'] += 1
+                if stats['opened'] != None:
+                    stats['probing'] = True
+        return name
+
+    def release(self, name:str, latency:float = None, success:bool = True):
+        with self.lock:
+            stats = self.stats.get(name)
+            if stats == None:
+                return
+            stats['inflight'] = max(stats['inflight'] - 1, 0)
+            if success:
+                if latency != None:
+                    stats['latency'] = latency if stats['latency'] == None else (1 - self.alpha) * stats['latency'] + self.alpha * latency
+                stats.update(failures=0, opened=None, probing=False)
+            else:
+                stats['failures'] += 1
+                if stats['probing'] or stats['failures'] >= self.failure_threshold:
+                    stats.update(opened=time.time(), probing=False)
+
+    def trip(self, name:str):
+        """
+        Takes a replica out of rotation (e.g. while it restarts), it is probed again after the cooldown
+        """
+        self.refresh()
+        with self.lock:
+            if name in self.stats:
+                self.stats[name].update(opened=time.time(), probing=False)
+
+    def state(self) -> Dict[str, dict]:
+        self.refresh()
+        return {name: {**stats, 'address': self.replicas[name]} for name, stats in self.stats.items()}
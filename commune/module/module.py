@@ -37,7 +37,11 @@ class c:
     helper_whitelist = ['info', 'schema','server_name', 'is_admin'] # whitelist of helper functions to load
     whitelist = [] # whitelist of functions to load
     blacklist = [] # blacklist of functions to not to access for outside use
+    cache_fns = [] # idempotent functions whose server responses are cached (list or {fn: ttl seconds})
     server_mode = 'http' # http, grpc, ws (websocket)
+    process_manager = 'supervisor' # supervisor, pm2
+    pm2_fallback = None # also look for processes under pm2: None if pm2 is installed, True or False to force it
+    log_level = os.getenv('COMMUNE_LOG_LEVEL', 'info') # debug, info, warning, error, critical
     default_network = 'local' # local, subnet
     cache = {} # cache for module objects
     home = os.path.expanduser('~') # the home directory
@@ -303,10 +307,15 @@ class c:
         if path == None: 
             path = cls.config_path()
         else:
-            module_tree = cls.module_tree()
-            path = module_tree[path].replace('.py', '.yaml')
+            # resolving a named config walks the module tree, so remember where it lives,
+            # and walk it again if the module has moved since
+            module_path = c.config_path_cache.get(path)
+            if module_path == None or not os.path.exists(module_path):
+                module_path = cls.module_tree()[path]
+                c.config_path_cache[path] = module_path
+            path = module_path.replace('.py', '.yaml')
             
-        config = cls.load_yaml(path)
+        config = cls.cached_yaml(path)
 
         # convert to munch
         if config == None:
@@ -321,6 +330,34 @@ class c:
     
     default_config = load_config
 
+    config_cache = {} # yaml path -> (mtime, size, config)
+    config_path_cache = {} # config name -> module python path
+
+    @classmethod
+    def cached_yaml(cls, path:str) -> Dict:
+        '''
+        Parsed yaml, reread only when the file's mtime or size changes.
+        Returns a copy, so callers can merge into it without touching the cache.
+        '''
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return cls.load_yaml(path)
+        cached = c.config_cache.get(path)
+        if cached == None or cached[0] != stat.st_mtime_ns or cached[1] != stat.st_size:
+            cached = (stat.st_mtime_ns, stat.st_size, cls.load_yaml(path))
+            c.config_cache[path] = cached
+        return cls.copy_config(cached[2])
+
+    @classmethod
+    def copy_config(cls, x:Any) -> Any:
+        # copies only the containers, which is all a merge can mutate, and is far cheaper than deepcopy
+        if isinstance(x, dict):
+            return {k: cls.copy_config(v) for k, v in x.items()}
+        if isinstance(x, list):
+            return [cls.copy_config(v) for v in x]
+        return x
+
     @classmethod
     def encrypt_path(cls, path:str, key=None, prefix='ENCRYPTED') -> str:
         '''
@@ -878,9 +915,9 @@ class c:
         
 
     @classmethod
-    def used_ports(cls, ports:List[int] = None, ip:str = '0.0.0.0', port_range:Tuple[int, int] = None):
+    def scan_used_ports(cls, ports:List[int] = None, ip:str = '0.0.0.0', port_range:Tuple[int, int] = None):
         '''
-        Get availabel ports out of port range
+        Get used ports out of port range by probing every port
         
         Args:
             ports: list of ports
@@ -907,7 +944,7 @@ class c:
         return used_ports
     
 
-    get_used_ports = used_ports
+    get_used_ports = scan_used_ports
     
     @classmethod
     def makedirs(cls, *args, **kwargs):
@@ -1045,13 +1082,78 @@ class c:
         return ports
     
     @classmethod
-    def used_ports(cls, ip='0.0.0.0') -> List[int]:
-        used_ports = []
-        for port in range(*cls.port_range()): 
-            if not cls.port_available(port=port, ip=ip):
-                used_ports += [port]
-                
-        return used_ports
+    def used_ports(cls, ip='0.0.0.0', mode:str = 'namespace') -> List[int]:
+        '''
+        Get the used ports from the local namespace and the reserved ports (mode=namespace),
+        or by probing every port in the port range (mode=scan)
+        '''
+        if mode == 'scan':
+            return cls.scan_used_ports(ip=ip)
+        used_ports = cls.reserved_ports(max_age=cls.port_reserve_ttl)
+        for address in c.namespace(network='local').values():
+            if isinstance(address, str) and ':' in address:
+                used_ports += [int(address.split(':')[-1])]
+        return sorted(set(used_ports))
+
+    @classmethod
+    def port_bindable(cls, port:int, ip:str = '0.0.0.0') -> bool:
+        import socket
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            try:
+                sock.bind((ip, int(port)))
+                return True
+            except OSError:
+                return False
+
+    @classmethod
+    def bind_port(cls, port:int = None, ip:str = None, max_tries:int = 10, **kwargs) -> 'socket.socket':
+        '''
+        Binds a socket to the port (or a free port if None) and returns it listening.
+        The listen is the claim: with SO_REUSEADDR another socket can still bind a port 
+        that is bound but not listening, but not one that is listening, so handing the 
+        socket to the server leaves no window for another server to take the port.
+        '''
+        import socket
+        ip = ip if ip else c.default_ip
+        avoid_ports = kwargs.pop('avoid_ports', None) or []
+        for i in range(max_tries):
+            bind_port = port if port != None else cls.free_port(ip=ip, avoid_ports=avoid_ports, **kwargs)
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            try:
+                sock.bind((ip, int(bind_port)))
+                sock.listen()
+                return sock
+            except OSError as e:
+                sock.close()
+                if port != None:
+                    raise Exception(f'port {port} is already in use on {ip}') from e
+                # lost the race for this port, try another
+                avoid_ports += [bind_port]
+        raise Exception(f'Failed to bind a free port after {max_tries} tries')
+
+    port_lock_path = os.path.expanduser('~/.commune/port.lock')
+    port_reserve_ttl = 60 # seconds a reservation holds a port before a server binds it
+
+    @classmethod
+    def port_lock(cls):
+        '''
+        File lock that makes free_port + reserve_port atomic across processes
+        '''
+        import fcntl
+        from contextlib import contextmanager
+
+        @contextmanager
+        def lock():
+            os.makedirs(os.path.dirname(cls.port_lock_path), exist_ok=True)
+            with open(cls.port_lock_path, 'w') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield f
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        return lock()
     
     @classmethod
     def free_address(cls, **kwargs):
@@ -1068,40 +1170,33 @@ class c:
         
         '''
         
-        Get an availabldefe port within the {port_range} [start_port, end_poort] and {ip}
+        Get an available port within the {port_range} [start_port, end_poort] and {ip}.
+        Ports in the namespace or reserved are skipped without touching the network,
+        and with reserve=True the port is claimed under the port lock so concurrent callers never get the same port.
         '''
-        avoid_ports = avoid_ports if avoid_ports else []
+        avoid_ports = set(avoid_ports if avoid_ports else [])
         
         if ports == None:
             port_range = cls.resolve_port_range(port_range)
             ports = list(range(*port_range))
             
-            
-            
         ip = ip if ip else c.default_ip
 
         if random_selection:
-            ports = c.shuffle(ports)
-            
-        reserved_ports = cls.reserved_ports()
-        # return only when the port is available
-        
-        port = None
-        for port in ports: 
-            if port in reserved_ports:
-                continue
-            if port in avoid_ports:
-                continue
+            ports = c.shuffle(list(ports))
             
-            if cls.port_available(port=port, ip=ip):
-                if reserve:
-                    cls.reserve_port(port)
-                return port
-        
-    
-    
+        with cls.port_lock():
+            avoid_ports = avoid_ports.union(cls.used_ports())
+            # return only when the port can be bound
+            for port in ports: 
+                if port in avoid_ports:
+                    continue
+                if cls.port_bindable(port=port, ip=ip):
+                    if reserve:
+                        cls.reserve_port(port, lock=False)
+                    return port
 
-        raise Exception(f'ports {port_range[0]} to {port_range[1]} are occupied, change the port_range to encompase more ports')
+        raise Exception(f'ports {min(ports)} to {max(ports)} are occupied, change the port_range to encompase more ports')
 
     get_available_port = free_port
 
@@ -1424,11 +1519,11 @@ class c:
         return bool(len(modules) > 0)
     
     @classmethod
-    def tasks(cls, task = None, mode='pm2',**kwargs) -> List[str]:
+    def tasks(cls, task = None, mode=None,**kwargs) -> List[str]:
         kwargs['network'] = 'local'
         kwargs['update'] = False
         modules = c.servers( **kwargs)
-        tasks = getattr(cls, f'{mode}_list')(task)
+        tasks = cls.process_list(task, mode=mode)
         tasks = list(filter(lambda x: x not in modules, tasks))
         return tasks
     
@@ -1567,6 +1662,16 @@ class c:
             return result
         
         return wrapper
+
+    @staticmethod
+    def cache_response(ttl:float = 10):
+        '''
+        Marks a function as idempotent, so the server caches its response for ttl seconds
+        '''
+        def decorator(fn):
+            fn.__cache_ttl__ = ttl
+            return fn
+        return decorator
     
     @staticmethod
     def remotewrap(fn):
@@ -1922,10 +2027,15 @@ class c:
         if c.is_address(module):
             address = module
         else:
+            if prefix_match == True and namespace == None:
+                # the balancer caches the replica set and prefers idle, fast and healthy replicas
+                balancer = c.balancer(module, network=network)
+                module = balancer.choose(track=False)
+                namespace = balancer.replicas
             namespace = namespace if namespace != None else c.namespace(module, network=network)
             modules = list(namespace.keys())
             if prefix_match == True:
-                module = c.choice(modules)
+                module = module if module in namespace else c.choice(modules)
             else:
                 modules = [m for m in modules if m==module]
                 
@@ -2472,7 +2582,8 @@ class c:
         if address != None and ':' in address:
             port = int(address.split(':')[-1])
         if port == None:
-            port = c.free_port()
+            # the remote server unreserves the port once it has bound it
+            port = c.free_port(reserve=remote)
         # NOTE REMOVE THIS FROM THE KWARGS REMOTE
 
         if remote:
@@ -2509,8 +2620,9 @@ class c:
             if refresh:
                 c.print(f'Stopping existing server {server_name}', color='yellow') 
                 c.deregister_server(server_name, network=network)
-                if c.pm2_exists(server_name): 
-                    c.kill(server_name)
+                process_manager = c.process_manager_of(server_name)
+                if process_manager != None: 
+                    c.kill(server_name, mode=process_manager)
             else:  
                 return {'success':True, 'message':f'Server {server_name} already exists'}
 
@@ -2761,13 +2873,14 @@ class c:
 
     @classmethod
     def kill(cls, module,
-             mode:str = 'pm2',
+             mode:str = None,
              verbose:bool = False,
              update : bool = True,
              prefix_match = False,
              network = 'local', # local, dev, test, main
              **kwargs):
 
+        mode = cls.resolve_process_manager(module, mode=mode, prefix_match=prefix_match)
         kill_fn = getattr(cls, f'{mode}_kill')
         delete_modules = []
 
@@ -2873,7 +2986,7 @@ class c:
                kwargs: dict = None,
                name:Optional[str]=None,  
                refresh:bool=True,
-               mode:str = 'pm2',
+               mode:str = None,
                tag:str=None, 
                tag_seperator: str = '::',
                verbose : bool = True, 
@@ -2881,10 +2994,11 @@ class c:
                update: bool = False,
                **extra_kwargs):
         '''
-        Launch a module as pm2 or ray 
+        Launch a module as a supervisor process, pm2 or ray 
         '''
         if update:
             cls.update()
+        mode = mode if mode != None else cls.process_manager
         kwargs = kwargs if kwargs else {}
         kwargs.update(extra_kwargs)
         args = args if args else []
@@ -2910,7 +3024,7 @@ class c:
         if mode == 'local':
             return getattr(module, fn)(*args, **kwargs)
 
-        elif mode == 'pm2':
+        elif mode in ['supervisor', 'pm2']:
             
             launch_kwargs = dict(
                     module=module, 
@@ -2925,7 +3039,7 @@ class c:
             )
             
 
-            assert fn != None, 'fn must be specified for pm2 launch'
+            assert fn != None, f'fn must be specified for {mode} launch'
             stdout = getattr(cls, f'{mode}_launch')(**launch_kwargs)
             
             
@@ -3199,10 +3313,45 @@ class c:
             
     
     @classmethod
-    def restart(cls, name:str, mode:str='pm2', verbose:bool = False, prefix_match:bool = True):
+    def restart(cls, name:str, mode:str=None, verbose:bool = False, prefix_match:bool = True):
+        mode = cls.resolve_process_manager(name, mode=mode, prefix_match=prefix_match)
         refreshed_modules = getattr(cls, f'{mode}_restart')(name, verbose=verbose, prefix_match=prefix_match)
         return refreshed_modules
 
+    def reload_module(self, paths:List[str] = None) -> Dict[str, Any]:
+        '''
+        Reloads the source of this module and moves the live instance onto the new class.
+        The instance state (models, keys, config) is kept, calls already running finish 
+        on the old code and the next call runs the new code, as the class swap is a single assignment.
+        Classes it inherits from whose files are in paths are reloaded first, so the new class builds on them.
+        '''
+        import importlib
+        import importlib.util
+        old_class = self.__class__
+        if paths != None:
+            paths = set(os.path.abspath(p) for p in paths)
+            reloaded = set()
+            for base in reversed(old_class.__mro__[1:]):
+                # the core module is never reloaded under a running server
+                if base.__module__ in reloaded or base.__module__ in ['__main__', __name__]:
+                    continue
+                base_module = sys.modules.get(base.__module__)
+                if base_module != None and os.path.abspath(getattr(base_module, '__file__', None) or '') in paths:
+                    importlib.reload(base_module)
+                    reloaded.add(base.__module__)
+        py_module = sys.modules.get(old_class.__module__)
+        if py_module != None and old_class.__module__ != '__main__':
+            py_module = importlib.reload(py_module)
+        else:
+            # a module run as a script lives in __main__, load its file again under its own name
+            path = inspect.getfile(old_class)
+            spec = importlib.util.spec_from_file_location(self.module_path().replace('.', '_') + '_reload', path)
+            py_module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(py_module)
+        new_class = getattr(py_module, old_class.__name__)
+        self.__class__ = new_class
+        return {'success': True, 'msg': f'Reloaded {old_class.__name__} from {inspect.getfile(new_class)}'}
+
     def restart_self(self):
         """
         Helper function to restart the server
@@ -3225,6 +3374,175 @@ class c:
         return stdout
 
     pm2_dir = os.path.expanduser('~/.pm2')
+
+    ## SUPERVISOR LAND (same surface as the pm2 functions, without the shell-outs)
+    @classmethod
+    def process_managers(cls) -> List[str]:
+        # the default first, the others still run processes started before a switch
+        managers = [cls.process_manager] + [m for m in ['supervisor'] if m != cls.process_manager]
+        if 'pm2' not in managers and (cls.pm2_installed() if cls.pm2_fallback == None else cls.pm2_fallback):
+            managers += ['pm2']
+        return managers
+
+    pm2_path = None
+    @classmethod
+    def pm2_installed(cls) -> bool:
+        # pm2 status is a shell-out and a table scrape, so it is only asked if it can answer
+        if cls.pm2_path == None:
+            import shutil
+            c.pm2_path = shutil.which('pm2') or ''
+        return c.pm2_path != ''
+
+    @classmethod
+    def process_list(cls, search=None, mode:str = None) -> List[str]:
+        '''
+        The processes of one manager, or of all of them if mode is None. Read only, no daemon is started.
+        '''
+        process_list = []
+        for m in ([mode] if mode else cls.process_managers()):
+            try:
+                process_list += [p for p in getattr(cls, f'{m}_list')(search) if p not in process_list]
+            except Exception:
+                # the manager is not installed or not running
+                continue
+        return process_list
+
+    @classmethod
+    def process_manager_of(cls, name:str, prefix_match:bool = False) -> Optional[str]:
+        '''
+        The first manager running name, asking them in order, None if none does
+        '''
+        for m in cls.process_managers():
+            if cls.process_exists(name, mode=m, prefix_match=prefix_match):
+                return m
+        return None
+
+    @classmethod
+    def process_exists(cls, name:str, mode:str = None, prefix_match:bool = False) -> bool:
+        if mode == None:
+            return cls.process_manager_of(name, prefix_match=prefix_match) != None
+        try:
+            if prefix_match:
+                return any([p.startswith(name) for p in getattr(cls, f'{mode}_list')(name)])
+            return getattr(cls, f'{mode}_exists')(name)
+        except Exception:
+            # the manager is not installed or not running
+            return False
+
+    @classmethod
+    def resolve_process_manager(cls, name:str = None, mode:str = None, prefix_match:bool = False) -> str:
+        '''
+        The manager given, else the one running name, else the default
+        '''
+        if mode != None:
+            return mode
+        if name != None:
+            mode = cls.process_manager_of(name, prefix_match=prefix_match)
+        return mode or cls.process_manager
+
+    @classmethod
+    def supervisor_list(cls, search=None, verbose:bool = False) -> List[str]:
+        module_list = c.module('process.supervisor').ls()
+        if search:
+            if isinstance(search, str):
+                search = [search]
+            assert all([isinstance(s, str) for s in search]), 'search must be a list of strings'
+            module_list = [m for m in module_list if any([s in m for s in search])]
+        return module_list
+
+    @classmethod
+    def supervisor_exists(cls, name:str) -> bool:
+        return c.module('process.supervisor').exists(name)
+
+    @classmethod
+    def supervisor_launch(cls, 
+                   module:str = None,  
+                   fn: str = 'serve',
+                   name:Optional[str]=None, 
+                   tag : str = None,
+                   args : list = None,
+                   kwargs: dict = None,
+                   device:str=None, 
+                   interpreter:str='python3', 
+                   no_autorestart: bool = False,
+                   verbose: bool = False , 
+                   meta_fn: str = 'module_fn',
+                   tag_seperator:str = '::',
+                   refresh:bool=True,
+                   **extra_kwargs):
+
+        if module == None:
+            module = cls.module_path()
+        elif hasattr(module, 'module_path'):
+            module = module.module_path()
+        kwargs =  {
+            'module': module,
+            'fn': fn,
+            'args': args if args else [],
+            'kwargs': kwargs if kwargs else {}
+        }
+        kwargs_str = json.dumps(kwargs).replace('"', "'")
+        name = c.resolve_server_name(module=module, name=name, tag=tag, tag_seperator=tag_seperator) 
+        command = [interpreter, c.module_file(), '--fn', meta_fn, '--kwargs', kwargs_str]
+        env = {}
+        if device != None:
+            if isinstance(device, int):
+                env['CUDA_VISIBLE_DEVICES']=str(device)
+            if isinstance(device, list):
+                env['CUDA_VISIBLE_DEVICES']=','.join(list(map(str, device)))
+        if verbose:
+            c.print(f'Launching {module} with command: {command}', color='green')
+        # starting an existing name replaces it, so refresh needs no extra kill
+        return c.module('process.supervisor').start(name=name, cmd=command, env=env, cwd=c.pwd, autorestart=not no_autorestart)
+
+    @classmethod
+    def supervisor_kill(cls, name:str, verbose:bool = False, prefix_match:bool = True):
+        supervisor = c.module('process.supervisor')
+        supervisor_list = supervisor.ls()
+        if name in supervisor_list:
+            rm_list = [name]
+        else:
+            if prefix_match:
+                rm_list = [ p for p in supervisor_list if p.startswith(name)]
+            else:
+                raise Exception(f'supervisor process {name} not found')
+        if len(rm_list) == 0:
+            if verbose:
+                c.print(f'ERROR: No supervisor processes found for {name}',  color='red')
+            return []
+        for n in rm_list:
+            if verbose:
+                c.print(f'Killing {n}', color='red')
+            supervisor.delete(n)
+            supervisor.rm_logs(n)
+        return rm_list
+
+    @classmethod
+    def supervisor_restart(cls, name:str, verbose:bool = False, prefix_match:bool = True):
+        supervisor = c.module('process.supervisor')
+        supervisor_list = supervisor.ls()
+        if name in supervisor_list:
+            rm_list = [name]
+        else:
+            if prefix_match:
+                rm_list = [ p for p in supervisor_list if p.startswith(name)]
+            else:
+                raise Exception(f'supervisor process {name} not found')
+        for n in rm_list:
+            c.print(f'Restarting {n}', color='cyan')
+            supervisor.restart(n)
+        return rm_list
+
+    @classmethod
+    def supervisor_logs(cls, module:str, tail: int =100, verbose: bool=True, mode: str = None):
+        return c.module('process.supervisor').logs(module, tail=tail)
+
+    @classmethod
+    def supervisor_status(cls, verbose=True):
+        status = c.module('process.supervisor').status()
+        if verbose:
+            c.print(status, color='green')
+        return status
     @classmethod
     def pm2_logs_path_map(cls, name=None):
         pm2_logs_path_map = {}
@@ -4442,7 +4760,8 @@ class c:
 
     @classmethod
     def logs(cls, *args, **kwargs):
-        return cls.pm2_logs(*args, **kwargs)
+        name = args[0] if len(args) > 0 else kwargs.get('module')
+        return getattr(cls, f'{cls.resolve_process_manager(name)}_logs')(*args, **kwargs)
 
 
     @classmethod
@@ -4506,6 +4825,92 @@ class c:
     def log(cls, *args, **kwargs):
         console = cls.resolve_console()
         return cls.console.log(*args, **kwargs)
+
+    log_levels = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40, 'critical': 50}
+    log_level_no = log_levels.get(log_level, 20)
+    log_queue = None
+    log_dropped = 0
+    log_max_queue_size = 10_000
+
+    @classmethod
+    def set_log_level(cls, level:str = 'info'):
+        assert level in c.log_levels, f'level must be one of {list(c.log_levels)}'
+        # set on the root class, so every module shares one level
+        c.log_level, c.log_level_no = level, c.log_levels[level]
+        return {'success': True, 'log_level': level}
+
+    @classmethod
+    def log_enabled(cls, level:str = 'info') -> bool:
+        return c.log_levels[level] >= c.log_level_no
+
+    @classmethod
+    def log_event(cls, level:str, event:str, *args, **fields):
+        """
+        Structured, non-blocking log line: returns immediately when the level is disabled,
+        otherwise queues the event for the writer thread. Formatting is deferred to the writer:
+        event is %-formatted with args, and callable fields are only called there.
+        """
+        if c.log_levels[level] < c.log_level_no:
+            return
+        log_queue = c.log_queue or cls.start_log_writer()
+        try:
+            log_queue.put_nowait((cls.time(), level, event, args, fields))
+        except Exception:
+            # never block the caller on a full queue
+            c.log_dropped += 1
+
+    @classmethod
+    def start_log_writer(cls, stream = None):
+        import queue
+        import threading
+        with cls.get_log_lock():
+            if c.log_queue == None:
+                c.log_queue = queue.Queue(maxsize=c.log_max_queue_size)
+                thread = threading.Thread(target=cls.log_writer_loop, args=(c.log_queue, stream or sys.stderr), daemon=True)
+                thread.start()
+        return c.log_queue
+
+    @classmethod
+    def get_log_lock(cls):
+        if not hasattr(c, '_log_lock'):
+            import threading
+            c._log_lock = threading.Lock()
+        return c._log_lock
+
+    @classmethod
+    def format_log(cls, t:float, level:str, event:str, args:tuple, fields:dict) -> str:
+        import time
+        if len(args) > 0:
+            event = event % args
+        line = f'{time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t))} {level.upper():<8} {event}'
+        for k, v in fields.items():
+            if callable(v):
+                v = v()
+            if isinstance(v, float):
+                v = round(v, 6)
+            line += f' {k}={v}'
+        return line
+
+    @classmethod
+    def log_writer_loop(cls, log_queue, stream):
+        while True:
+            record = log_queue.get()
+            try:
+                stream.write(cls.format_log(*record) + '\n')
+                # flush once the queue drains, not per line
+                if log_queue.empty():
+                    stream.flush()
+            except Exception:
+                # a line that cannot be formatted or written is counted and dropped, stdout stays clean
+                c.log_dropped += 1
+            finally:
+                log_queue.task_done()
+
+    @classmethod
+    def flush_logs(cls):
+        if c.log_queue != None:
+            c.log_queue.join()
+        return {'success': True, 'dropped': c.log_dropped}
        
     @classmethod
     def test(cls, modules=['server', 'key', 'namespace', 'executor'], verbose:bool=False):
@@ -4855,7 +5260,10 @@ class c:
         return self.module('subspace')().auth(*args, key=key, **kwargs)
     
     @classmethod
-    def call(cls,  *args , n: int=1, return_future:bool=False, remote:bool = False,  **kwargs) -> None:
+    def call(cls,  *args , n: int=1, return_future:bool=False, remote:bool = False, mode:str = None,  **kwargs) -> None:
+        if mode != None:
+            # fan out over every server matching the module (see call_pool)
+            return c.call_pool(*args, mode=mode, **kwargs)
         if n == 1:
             futures = c.async_call(*args,**kwargs)
         else:
@@ -4882,15 +5290,29 @@ class c:
 
         kwargs = kwargs or {}
         kwargs.update(extra_kwargs)    
+        balancer, replica, success = None, None, False
         try:
-            module = c.connect(module, prefix_match=prefix_match, network=network, virtual=False, key=key)
-            future =  module.async_forward(fn=fn, kwargs=kwargs, args=args)
+            t = c.time()
+            if prefix_match and isinstance(module, str) and not c.is_address(module):
+                # spread the calls over the replicas of the module
+                balancer = c.balancer(module, network=network)
+                replica = module = balancer.choose()
+            address = balancer.address(module) if balancer != None else module
+            client = c.connect(address, prefix_match=prefix_match, network=network, virtual=False, key=key)
+            future =  client.async_forward(fn=fn, kwargs=kwargs, args=args)
             result = await asyncio.wait_for(future, timeout=timeout)
+            success = c.is_success(result)
+            if isinstance(module, str) and success:
+                c.record_latency(module, c.time() - t)
         except Exception as e:
             if ignore_error:
                 result = c.detailed_error(e)
             else:
                 raise e
+        finally:
+            # also when the call is cancelled, which is not an Exception
+            if replica != None:
+                balancer.release(replica, latency=c.time() - t, success=success)
         
         return result
 
@@ -4898,6 +5320,33 @@ class c:
     def live_modules(cls, **kwargs):
         return cls.call_pool(fn='address', **kwargs)
 
+    endpoint_latencies = {} # server -> recent latencies of its successful calls (seconds)
+    max_latency_history = 100
+
+    @classmethod
+    def record_latency(cls, endpoint:str, latency:float):
+        latencies = c.endpoint_latencies.setdefault(endpoint, [])
+        latencies.append(latency)
+        if len(latencies) > c.max_latency_history:
+            del latencies[0]
+
+    @classmethod
+    def latency_percentile(cls, endpoint:str = None, q:float = 0.5, default:float = None) -> float:
+        """
+        The q-th latency percentile of an endpoint, or of every endpoint if it has no history
+        """
+        latencies = c.endpoint_latencies.get(endpoint) or sum(c.endpoint_latencies.values(), [])
+        if len(latencies) == 0:
+            return default
+        latencies = sorted(latencies)
+        return latencies[min(int(q * len(latencies)), len(latencies) - 1)]
+
+    @classmethod
+    def rank_endpoints(cls, endpoints:List[str]) -> List[str]:
+        # fastest median first, endpoints without history first so they get measured
+        endpoints = cls.shuffle(list(endpoints))
+        return sorted(endpoints, key=lambda e: c.latency_percentile(e, q=0.5, default=0) if e in c.endpoint_latencies else 0)
+
     @classmethod
     def call_pool(cls, 
                     modules, 
@@ -4906,8 +5355,21 @@ class c:
                     network =  'local',
                     timeout = 10,
                     n=None,
+                    mode:str = 'all',
+                    k:int = None,
+                    hedge_quantile:float = 0.95,
+                    hedge_delay:float = None,
                     **kwargs):
-        
+        """
+        Calls fn on every server matching modules.
+        mode:
+            all: wait for every server, returns the list of responses
+            first: returns the first successful response
+            quorum: returns {server: response} of the first k successful responses
+            hedged: calls the fastest server, and the next fastest whenever the last one has taken longer
+                    than hedge_delay (default: its hedge_quantile latency), returns the first success
+        Calls that are still running once first, quorum or hedged are satisfied are cancelled.
+        """
         args = args or []
         kwargs = kwargs or {}
         
@@ -4915,8 +5377,13 @@ class c:
             modules = c.servers(modules, network=network)
         if n == None:
             n = len(modules)
-        modules = cls.shuffle(modules)[:n]
         assert isinstance(modules, list), 'modules must be a list'
+        if mode != 'all':
+            modules = cls.rank_endpoints(modules)[:n]
+            return c.gather(cls.async_call_pool(modules, fn, *args, network=network, timeout=timeout, mode=mode,
+                                                k=k, hedge_quantile=hedge_quantile, hedge_delay=hedge_delay, **kwargs),
+                            timeout=timeout + 1)
+        modules = cls.shuffle(modules)[:n]
         c.print(f'[bold cyan]Calling {fn} on {len(modules)} modules [/bold cyan]', color='yellow')
         jobs = []
         
@@ -4926,6 +5393,80 @@ class c:
             jobs.append(job)
         responses = c.wait(jobs, timeout=timeout)
         return responses
+
+    @classmethod
+    async def async_call_pool(cls,
+                              modules:List[str],
+                              fn:str = 'info',
+                              *args,
+                              network:str = 'local',
+                              timeout:int = 10,
+                              mode:str = 'first',
+                              k:int = None,
+                              hedge_quantile:float = 0.95,
+                              hedge_delay:float = None,
+                              **kwargs):
+        assert mode in ['first', 'quorum', 'hedged'], f'Invalid mode {mode}, must be all, first, quorum or hedged'
+        assert len(modules) > 0, 'No modules to call'
+        needed = k if mode == 'quorum' else 1
+        assert needed != None and 0 < needed <= len(modules), f'k must be between 1 and {len(modules)}, got {k}'
+        deadline = c.time() + timeout
+
+        async def call_module(module):
+            try:
+                response = await c.async_call(module, fn, *args, timeout=timeout, network=network, **kwargs)
+            except Exception as e:
+                response = c.detailed_error(e)
+            if c.is_error(response):
+                # failures count as a timeout, so the endpoint ranks last next time
+                c.record_latency(module, timeout)
+            return response
+
+        remaining = list(modules) # fastest first
+        tasks = {}
+        responses, errors = {}, {}
+        def launch():
+            module = remaining.pop(0)
+            tasks[asyncio.ensure_future(call_module(module))] = module
+            return module
+        # hedged starts with one call, the others with every call at once
+        last_launched = launch()
+        while mode != 'hedged' and len(remaining) > 0:
+            launch()
+
+        try:
+            while len(responses) < needed and c.time() < deadline:
+                pending = [t for t in tasks if not t.done()]
+                if len(pending) == 0:
+                    if len(remaining) == 0:
+                        break
+                    last_launched = launch()
+                    continue
+                wait_time = deadline - c.time()
+                if mode == 'hedged' and len(remaining) > 0:
+                    delay = hedge_delay if hedge_delay != None else c.latency_percentile(last_launched, q=hedge_quantile, default=timeout / 4)
+                    wait_time = min(wait_time, delay)
+                done, _ = await asyncio.wait(pending, timeout=wait_time, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    module = tasks[task]
+                    response = task.result()
+                    if c.is_error(response):
+                        errors[module] = response
+                    else:
+                        responses[module] = response
+                if len(done) == 0 and mode == 'hedged' and len(remaining) > 0:
+                    # the last call is slower than usual, race a duplicate on the next endpoint
+                    last_launched = launch()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+        if len(responses) < needed:
+            return {'success': False, 'error': f'{len(responses)}/{needed} successful responses from {len(tasks)} calls within {timeout}s', 'errors': errors}
+        if mode == 'quorum':
+            return dict(list(responses.items())[:needed])
+        return list(responses.values())[0]
     
     @classmethod
     def resolve_fn(cls,fn, init_kwargs=None ):
@@ -5096,21 +5637,30 @@ class c:
         self.users.pop(key, None)
         
     @classmethod
-    def reserve_port(cls,port:int = None, var_path='reserved_ports' , root=True):
+    def reserve_port(cls,port:int = None, var_path='reserved_ports' , root=True, lock:bool = True):
         if port == None:
-            port = cls.free_port()
+            port = cls.free_port(reserve=True)
+            return {'success':f'reserved port {port}', 'reserved': cls.reserved_ports()}
+        if lock:
+            with cls.port_lock():
+                return cls.reserve_port(port=port, var_path=var_path, root=root, lock=False)
         reserved_ports =  cls.get(var_path, {}, root=root)
+        # drop the expired reservations while we hold the lock
+        reserved_ports = {p:v for p,v in reserved_ports.items() if cls.time() - v['time'] < cls.port_reserve_ttl}
         reserved_ports[str(port)] = {'time': cls.time()}
         cls.put(var_path, reserved_ports, root=root)
         c.print(f'reserving {port}')
-        return {'success':f'reserved port {port}', 'reserved': cls.reserved_ports()}
+        return {'success':f'reserved port {port}', 'reserved': list(map(int, reserved_ports.keys()))}
     
     
     resport = reserve_port
     
     @classmethod
-    def reserved_ports(cls,  var_path='reserved_ports'):
-        return list(map(int, cls.get(var_path, {}, root=True).keys()))
+    def reserved_ports(cls,  var_path='reserved_ports', max_age:int = None):
+        reserved_ports = cls.get(var_path, {}, root=True)
+        if max_age != None:
+            reserved_ports = {p:v for p,v in reserved_ports.items() if cls.time() - v['time'] < max_age}
+        return list(map(int, reserved_ports.keys()))
     resports = reserved_ports
 
     
@@ -5118,7 +5668,11 @@ class c:
     def unreserve_port(cls,port:int, 
                        var_path='reserved_ports' ,
                        verbose:bool = True, 
-                       root:bool = True):
+                       root:bool = True,
+                       lock:bool = True):
+        if lock:
+            with cls.port_lock():
+                return cls.unreserve_port(port=port, var_path=var_path, verbose=verbose, root=root, lock=False)
         reserved_ports =  cls.get(var_path, {}, root=True)
         
         port_info = reserved_ports.pop(port,None)
@@ -5145,15 +5699,16 @@ class c:
                        verbose:bool = True, 
                        root:bool = True):
         output ={}
-        reserved_ports =  cls.get(var_path, {}, root=root)
-        if len(ports) == 0:
-            # if zero then do all fam, tehe
-            ports = list(reserved_ports.keys())
-        elif len(ports) == 1 and isinstance(ports[0],list):
-            ports = ports[0]
-        ports = list(map(str, ports))
-        reserved_ports = {rp:v for rp,v in reserved_ports.items() if not any([p in ports for p in [str(rp), int(rp)]] )}
-        cls.put(var_path, reserved_ports, root=root)
+        with cls.port_lock():
+            reserved_ports =  cls.get(var_path, {}, root=root)
+            if len(ports) == 0:
+                # if zero then do all fam, tehe
+                ports = list(reserved_ports.keys())
+            elif len(ports) == 1 and isinstance(ports[0],list):
+                ports = ports[0]
+            ports = list(map(str, ports))
+            reserved_ports = {rp:v for rp,v in reserved_ports.items() if not any([p in ports for p in [str(rp), int(rp)]] )}
+            cls.put(var_path, reserved_ports, root=root)
         return cls.reserved_ports()
     
     
@@ -7903,10 +8458,19 @@ class c:
 
     @classmethod
     def restart_replicas(cls, network:str=None, **kwargs):
+        balancer = cls.balancer(network=network)
         for m in cls.replicas(network=network, **kwargs):
             c.print(m)
+            # keep traffic off the replica while it restarts, it is probed again after the cooldown
+            balancer.trip(m)
             c.restart(m)
 
+    @classmethod
+    def balancer(cls, module:str = None, network:str = None, **kwargs) -> 'Balancer':
+        from commune.module.balancer import Balancer
+        module = module if module != None else cls.module_path()
+        return Balancer.get(module, network=c.resolve_network(network), **kwargs)
+
     @classmethod
     def restart_many(cls, search:str = None, network = None, **kwargs):
         servers = c.servers(search, network=network)
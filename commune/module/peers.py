@@ -1,150 +1,290 @@
 import commune as c
 from typing import *
+import asyncio
+import random
+import json
+import os
 
 class Peers(c.Module):
-    @classmethod
-    def add_peer(cls, *args, **kwargs)-> List:
-        loop = cls.get_event_loop()
-        peer = loop.run_until_complete(cls.async_add_peer(*args, **kwargs))
-        return peer
-    
-    @classmethod
-    def add_peers(cls, *peer_addresses, **kwargs): 
-        if len(peer_addresses) == 0:
-            peer_addresses = cls.boot_peers()
-            
+    """
+    Peer registry that converges by gossip.
+
+    Every namespace entry is owned by the peer (origin) that serves it, keyed by (origin, name) and
+    versioned and signed by that origin alone. A peer summarizes what it knows as a clock
+    {origin: highest version seen}, so a sync only ships the entries the other side has not seen
+    (push-pull), and each round spreads updates to a random fanout, which reaches every peer in
+    O(log n) rounds. Entries are only merged if signed by the key first seen for their origin.
+    """
+    whitelist = ['sync', 'push', 'clock', 'registry_namespace']
+
+    def __init__(self,
+                 origin:str = None,
+                 fanout:int = 3,
+                 interval:int = 5,
+                 timeout:int = 4,
+                 max_concurrency:int = 16,
+                 network:str = 'local',
+                 gossip:bool = False,
+                 persist:bool = True,
+                 **kwargs):
+        config = self.set_config(kwargs=locals())
+        self.origin = config.origin
+        self.fanout = config.fanout
+        self.interval = config.interval
+        self.timeout = config.timeout
+        self.max_concurrency = config.max_concurrency
+        self.network = config.network
+        self.persist = config.persist
+        self.entries = {} # origin/name -> {'origin', 'name', 'address', 'version', 'deleted', 'key', 'signature'}
+        self.versions = {} # origin -> highest version seen
+        self.origin_keys = {} # origin -> the key that signs its entries
+        self.known_clocks = {} # peer -> last clock it reported, to push without an extra round trip
+        self.stats = {'bytes_sent': 0, 'bytes_received': 0, 'rounds': 0}
+        if self.persist:
+            self.load_registry()
+        if config.gossip:
+            c.thread(self.gossip_loop, tag='peers')
+
+    ############ STATE LAND ###############
+
+    def resolve_origin(self) -> Optional[str]:
+        """
+        The address other peers dial to gossip with us, None until we are served
+        """
+        if self.origin == None and getattr(self, 'address', None) != None:
+            self.origin = self.address.replace(c.default_ip, c.ip())
+        if self.origin != None:
+            self.origin_keys[self.origin] = self.key.ss58_address
+        return self.origin
+
+    def registry_path(self) -> str:
+        return self.resolve_path('peer_registry.json')
+
+    def load_registry(self):
+        state = c.get_json(self.registry_path(), default={})
+        # registries written before entries were signed are dropped, their origins gossip them again
+        self.entries = {k: e for k, e in state.get('entries', {}).items() if 'signature' in e}
+        self.versions = state.get('versions', {})
+        self.origin_keys = state.get('origin_keys', {})
+
+    def save_registry(self):
+        # write to a tmp file and rename, so a crash never leaves a torn registry
+        path = self.registry_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'entries': self.entries, 'versions': self.versions, 'origin_keys': self.origin_keys}, f)
+        os.replace(tmp_path, path)
+
+    def clock(self) -> Dict[str, int]:
+        return dict(self.versions)
+
+    def registry_namespace(self) -> Dict[str, str]:
+        live = sorted([e for e in self.entries.values() if not e['deleted']], key=lambda e: e['origin'], reverse=True)
+        # a name served by several peers resolves to ours, else to the lowest origin, the same on every peer
+        namespace = {e['name']: e['address'] for e in live}
+        namespace.update({e['name']: e['address'] for e in live if e['origin'] == self.origin})
+        return namespace
+
+    def peers(self) -> List[str]:
+        return [p for p in self.versions.keys() if p != self.origin]
+
+    def update_local(self, namespace:Dict[str, str] = None) -> int:
+        """
+        Versions the changes to the namespace we serve, returns the number of changed entries
+        """
+        origin = self.resolve_origin()
+        if origin == None:
+            return 0
+        if namespace == None:
+            ip = origin.split(':')[0]
+            namespace = {k: v.replace(c.default_ip, ip) for k, v in c.namespace(network=self.network).items()}
+        mine = {e['name']: e for e in self.entries.values() if e['origin'] == origin and not e['deleted']}
+        changes = {name: address for name, address in namespace.items() if mine.get(name, {}).get('address') != address}
+        changes.update({name: None for name in mine if name not in namespace})
+        for name, address in changes.items():
+            # only the origin bumps its own counter, so its versions never race with another peer's
+            self.versions[origin] = self.versions.get(origin, 0) + 1
+            entry = {'origin': origin, 'name': name, 'address': address, 'version': self.versions[origin], 'deleted': address == None}
+            self.entries[self.entry_key(origin, name)] = self.sign_entry(entry)
+        if len(changes) > 0 and self.persist:
+            self.save_registry()
+        return len(changes)
+
+    @staticmethod
+    def entry_key(origin:str, name:str) -> str:
+        return f'{origin}/{name}'
+
+    @staticmethod
+    def entry_payload(entry:dict) -> str:
+        return json.dumps([entry['origin'], entry['name'], entry['address'], entry['version'], entry['deleted']])
+
+    def sign_entry(self, entry:dict) -> dict:
+        signature = self.key.sign(self.entry_payload(entry))
+        return {**entry, 'key': self.key.ss58_address, 'signature': signature.hex()}
+
+    def verify_entry(self, entry:dict) -> bool:
+        """
+        Whether the entry is signed by the key of its origin, the first key seen for an origin is bound to it
+        """
+        key = self.origin_keys.get(entry.get('origin'), entry.get('key'))
+        if key == None or entry.get('key') != key or entry.get('signature') == None:
+            return False
+        try:
+            return bool(self.key.verify(self.entry_payload(entry), signature=entry['signature'], public_key=c.ss58_decode(key)))
+        except Exception:
+            return False
+
+    def delta(self, clock:Dict[str, int]) -> Dict[str, dict]:
+        return {k: e for k, e in self.entries.items() if e['version'] > clock.get(e['origin'], 0)}
+
+    def merge(self, entries:Dict[str, dict]) -> int:
+        merged = 0
+        for e in entries.values():
+            if not self.verify_entry(e):
+                c.print(f'Dropping unsigned or forged entry {e.get("name")} from {e.get("origin")}', color='red')
+                continue
+            self.origin_keys.setdefault(e['origin'], e['key'])
+            k = self.entry_key(e['origin'], e['name'])
+            current = self.entries.get(k)
+            # one origin versions each entry, so the higher version is always the newer one
+            if current == None or e['version'] > current['version']:
+                self.entries[k] = e
+                merged += 1
+            self.versions[e['origin']] = max(self.versions.get(e['origin'], 0), e['version'])
+        if merged > 0 and self.persist:
+            self.save_registry()
+        return merged
+
+    ############ GOSSIP LAND ###############
+
+    def sync(self, clock:Dict[str, int], entries:Dict[str, dict] = None) -> dict:
+        """
+        Push-pull exchange: merge what the caller pushed, return what the caller is missing and our clock.
+        The caller becomes a peer once its signed entries reach us, not by claiming an address.
+        """
+        if entries:
+            self.merge(entries)
+        return {'entries': self.delta(clock), 'clock': self.clock()}
+
+    def push(self, entries:Dict[str, dict]) -> dict:
+        return {'merged': self.merge(entries)}
+
+    async def async_gossip_with(self, peer:str, call:Callable = None) -> dict:
+        call = call or (lambda fn, **kwargs: c.async_call(peer, fn, timeout=self.timeout, **kwargs))
+        # push what we think the peer lacks, based on the clock it reported last time
+        pushed = self.delta(self.known_clocks[peer]) if peer in self.known_clocks else {}
+        request = {'clock': self.clock(), 'entries': pushed}
+        response = await call('sync', **request)
+        self.stats['bytes_sent'] += len(json.dumps(request))
+        self.stats['bytes_received'] += len(json.dumps(response))
+        self.merge(response['entries'])
+        self.known_clocks[peer] = response['clock']
+        # the peer may still lack entries we did not know to push
+        missing = self.delta(response['clock'])
+        if len(missing) > 0:
+            await call('push', entries=missing)
+            self.stats['bytes_sent'] += len(json.dumps(missing))
+            self.known_clocks[peer] = {**response['clock'], **{e['origin']: max(e['version'], response['clock'].get(e['origin'], 0)) for e in missing.values()}}
+        return {'peer': peer, 'received': len(response['entries']), 'sent': len(pushed) + len(missing)}
+
+    def gossip(self, peers:List[str] = None) -> List[dict]:
+        """
+        One gossip round with a random fanout of peers, with bounded concurrency
+        """
+        if self.resolve_origin() == None:
+            # nobody can dial us back yet
+            return []
+        peers = peers if peers != None else self.peers()
+        peers = random.sample(peers, min(self.fanout, len(peers)))
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        async def gossip_with(peer):
+            async with semaphore:
+                try:
+                    return await self.async_gossip_with(peer)
+                except Exception as e:
+                    return {'peer': peer, 'error': str(e)}
+        self.stats['rounds'] += 1
+        return c.gather([gossip_with(p) for p in peers], timeout=self.timeout * 2)
+
+    def gossip_loop(self):
+        while self.resolve_origin() == None:
+            c.sleep(self.interval)
+        self.add_peers(self.boot_peers())
+        while True:
+            try:
+                self.update_local()
+                self.gossip()
+            except Exception as e:
+                c.print(f'Gossip round failed: {e}', color='red')
+            c.sleep(self.interval)
+
+    def add_peers(self, *peer_addresses) -> dict:
         if len(peer_addresses) == 1 and isinstance(peer_addresses[0], list):
             peer_addresses = peer_addresses[0]
-        jobs = []
         for peer_address in peer_addresses:
-            job = cls.async_add_peer(peer_address, **kwargs)
-            jobs += [job]
-            
-        loop = cls.get_event_loop()
-        peers = loop.run_until_complete(asyncio.gather(*jobs))
-        peers = [peer for peer in peers if peer != None]
+            self.versions.setdefault(peer_address, 0)
+        results = self.gossip(peers=list(peer_addresses)) if len(peer_addresses) > 0 else []
+        peers = [r['peer'] for r in results if 'error' not in r]
         return {'added_peers': peers, 'msg': f'Added {len(peers)} peers'}
 
-    @classmethod
-    def peer_registry(cls, peers=None, update: bool = False):
-        if update:
-            if peers == None:
-                peers = cls.peers()
-            cls.add_peers(peers)
-        
-        peer_registry = c.get('peer_registry', {})
-        return peer_registry
+    def add_peer(self, peer_address:str) -> dict:
+        return self.add_peers(peer_address)
+
+    def rm_peer(self, peer_address:str):
+        self.versions.pop(peer_address, None)
+        self.known_clocks.pop(peer_address, None)
+        if self.persist:
+            self.save_registry()
+        return peer_address
 
     @classmethod
-    async def async_add_peer(cls, 
-                             peer_address,
-                             network = 'local',
-                             timeout:int=1,
-                             verbose:bool = True,
-                             add_peer = True):
-        
-        peer_registry = await c.async_get_json('peer_registry', default={}, root=True)
-
-
-        peer_info = await C.async_call(module=peer_address, 
-                                              fn='info',
-                                              include_namespace=True, 
-                                              timeout=timeout)
-        
-        if add_peer:
-            await c.async_call(module=peer_address, 
-                                              fn='add_peer',
-                                              args=[cls.root_address],
-                                              include_namespace=True, 
-                                              timeout=timeout)
-        
-
-        if 'error' in peer_info:
-            if verbose:
-                c.print(f'Error adding peer {peer_address} due to {peer_info["error"]}',color='red')
-            return None    
-        else:
-            if verbose:
-                c.print(f'Successfully added peer {peer_address}', color='green')
-        
-            
-        assert isinstance(peer_info, dict)
-        assert 'address' in peer_info
-        assert 'namespace' in peer_info
-        
-        peer_ip = ':'.join(peer_info['address'].split(':')[:-1])
-        peer_port = int(peer_info['address'].split(':')[-1])
-        
-        # relace default local ip with external_ip
-        peer_info['namespace'] = {k:v.replace(c.default_ip,peer_ip) for k,v in peer_info['namespace'].items()}
-
-        peer_registry[peer_address] = peer_info
-            
-        await c.async_put_json('peer_registry', peer_registry, root=True)
-        
-        return peer_registry
-    
-    @classmethod
-    def ls_peers(cls, update=False):
-        peer_registry = cls.get_json('peer_registry', default={})
-        return list(peer_registry.keys())
-      
-    @classmethod
-    def peers(cls, update=False):
-        peer_registry = cls.peer_registry(update=update)
-        return list(peer_registry.keys())
+    def boot_peers(cls) -> List[str]:
+        return cls.get('boot_peers', [])
 
+    ############ SIMULATION LAND ###############
 
     @classmethod
-    def add_peer(cls, *args, **kwargs)-> List:
-        loop = cls.get_event_loop()
-        peer = loop.run_until_complete(cls.async_add_peer(*args, **kwargs))
-        return peer
-    
-    @classmethod
-    def rm_peers(cls, peer_addresses: list = None):
-        rm_peers = []
-        if peer_addresses == None:
-            peer_addresses = cls.peers()
-        if isinstance(peer_addresses, str):
-            peer_addresses = [peer_addresses]
-        for peer_address in peer_addresses:
-            
-            rm_peers.append(cls.rm_peer(peer_address))
-        return rm_peers
-            
+    def simulate(cls, n:int = 64, fanout:int = 3, names_per_peer:int = 4, max_rounds:int = 100, seed:int = 0) -> dict:
+        """
+        Gossip between n in-process peers whose calls go through json, measuring the rounds and
+        bytes until every registry agrees, against each peer pulling every other peer's full namespace
+        """
+        random.seed(seed)
+        origins = [f'10.0.0.{i}:8888' for i in range(n)]
+        nodes = {o: cls(origin=o, fanout=fanout, persist=False) for o in origins}
+        for i, (origin, node) in enumerate(nodes.items()):
+            node.key = c.module('key').create_from_uri(f'//peer{i}')
+            node.update_local({f'module{i}.{j}': f'{origin.split(":")[0]}:{50050 + j}' for j in range(names_per_peer)})
+            # every peer only knows one other peer to start with
+            node.versions.setdefault(origins[(i + 1) % n], 0)
 
-    
-    @classmethod
-    def rm_peer(cls, peer_address: str):
-        peer_registry = c.get_json('peer_registry', default={})
-        result = peer_registry.pop(peer_address, None) 
-        if result != None:
-            result = peer_address      
-            cls.put_json('peer_registry', peer_registry, root=True)
-        return result
+        def rpc(peer):
+            async def call(fn, **kwargs):
+                kwargs = json.loads(json.dumps(kwargs))
+                return json.loads(json.dumps(getattr(nodes[peer], fn)(**kwargs)))
+            return call
 
-    @classmethod
-    def boot_peers(cls) -> List[str]: 
-        return cls.get('boot_peers', [])
-       
+        expected = n * names_per_peer
+        rounds = 0
+        for rounds in range(1, max_rounds + 1):
+            for node in nodes.values():
+                peers = random.sample(node.peers(), min(fanout, len(node.peers())))
+                c.gather([node.async_gossip_with(p, call=rpc(p)) for p in peers])
+            if all(len(node.registry_namespace()) == expected for node in nodes.values()):
+                break
+        gossip_bytes = sum(node.stats['bytes_sent'] + node.stats['bytes_received'] for node in nodes.values())
+        full_namespace_bytes = len(json.dumps(nodes[origins[0]].registry_namespace()))
+        return {'n': n,
+                'rounds': rounds,
+                'converged': all(len(node.registry_namespace()) == expected for node in nodes.values()),
+                'gossip_bytes': gossip_bytes,
+                # every peer fetching every other peer's full namespace once
+                'full_exchange_bytes': n * (n - 1) * full_namespace_bytes}
 
     @classmethod
-    def get_peer_info(cls, peer: Union[str, 'Module']) -> Dict[str, Any]:
-        if isinstance(peer, str):
-            peer = cls.connect(peer)
-            
-        info = peer.info()
-        return info
-    
-        
-    @classmethod
-    def get_peer_addresses(cls, ip:str = None  ) -> List[str]:
-        used_local_ports = cls.get_used_ports() 
-        if ip == None:
-            ip = c.default_ip
-        peer_addresses = []
-        for port in used_local_ports:
-            peer_addresses.append(f'{ip}:{port}')
-            
-        return peer_addresses
\ No newline at end of file
+    def test(cls):
+        results = cls.simulate(n=32)
+        assert results['converged'], results
+        c.print(results)
+        return {'success': True, 'msg': 'peers converged', **results}
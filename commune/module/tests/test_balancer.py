@@ -0,0 +1,112 @@
+import commune
+import asyncio
+import time
+from commune.module.balancer import Balancer
+
+
+def with_replicas(balancer:Balancer, *names) -> Balancer:
+    # a fresh replica set is served until refresh_interval passes, without reading the namespace
+    balancer.replicas = {name: f'0.0.0.0:{8000 + i}' for i, name in enumerate(names)}
+    balancer.stats = {name: balancer.new_stats() for name in names}
+    balancer.last_refresh = time.time()
+    return balancer
+
+
+def test_breaker_opens_after_failure_threshold():
+    balancer = with_replicas(Balancer('model', refresh_interval=3600, failure_threshold=2, cooldown=60), 'model::a', 'model::b')
+    for i in range(2):
+        balancer.stats['model::a']['inflight'] += 1
+        balancer.release('model::a', success=False)
+    assert balancer.stats['model::a']['opened'] != None
+    for i in range(20):
+        name = balancer.choose()
+        assert name == 'model::b'
+        balancer.release(name, latency=0.1)
+
+
+def test_half_open_probe_after_cooldown():
+    balancer = with_replicas(Balancer('model', refresh_interval=3600, failure_threshold=1, cooldown=0.1), 'model::a', 'model::b')
+    balancer.release('model::a', success=False)
+    # keep b busy so a is picked once it is available
+    balancer.stats['model::b']['inflight'] = 100
+    assert balancer.choose(track=False) == 'model::b'
+    time.sleep(0.1)
+    assert balancer.choose() == 'model::a'
+    # a single probe at a time
+    assert balancer.stats['model::a']['probing']
+    assert balancer.choose(track=False) == 'model::b'
+    # a failed probe opens the circuit again
+    balancer.release('model::a', success=False)
+    assert balancer.choose(track=False) == 'model::b'
+    time.sleep(0.1)
+    # a successful probe closes it
+    assert balancer.choose() == 'model::a'
+    balancer.release('model::a', latency=0.1)
+    assert balancer.stats['model::a']['opened'] == None and balancer.stats['model::a']['failures'] == 0
+
+
+def test_release_tracks_inflight_and_latency():
+    balancer = with_replicas(Balancer('model', refresh_interval=3600, alpha=0.5), 'model::a')
+    for i in range(3):
+        balancer.choose()
+    assert balancer.stats['model::a']['inflight'] == 3
+    balancer.release('model::a', latency=1.0)
+    balancer.release('model::a', latency=3.0)
+    balancer.release('model::a', success=False)
+    stats = balancer.stats['model::a']
+    assert stats['inflight'] == 0 and stats['latency'] == 2.0 and stats['failures'] == 1
+    # a replica that is gone is ignored
+    balancer.release('model::gone', success=False)
+
+
+def test_trip_takes_a_replica_out_of_rotation():
+    balancer = with_replicas(Balancer('model', refresh_interval=3600, cooldown=60), 'model::a', 'model::b')
+    balancer.trip('model::a')
+    assert all([balancer.choose(track=False) == 'model::b' for i in range(20)])
+    # with every circuit open, the one that opened longest ago is still tried
+    balancer.trip('model::b')
+    assert balancer.choose(track=False) == 'model::a'
+
+
+def test_async_call_releases_the_replica(monkeypatch):
+    balancer = with_replicas(Balancer('model', refresh_interval=3600), 'model::a')
+    monkeypatch.setitem(Balancer.balancers, ('model', commune.resolve_network(None)), balancer)
+
+    class Client:
+        def __init__(self, delay):
+            self.delay = delay
+
+        async def async_forward(self, fn, kwargs, args):
+            await asyncio.sleep(self.delay)
+            return {'success': True}
+
+    async def cancelled_call():
+        monkeypatch.setattr(commune.Module, 'connect', classmethod(lambda cls, *args, **kwargs: Client(10)))
+        task = asyncio.ensure_future(commune.async_call('model', prefix_match=True))
+        await asyncio.sleep(0.1)
+        assert balancer.stats['model::a']['inflight'] == 1
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(cancelled_call())
+    assert balancer.stats['model::a']['inflight'] == 0
+
+    monkeypatch.setattr(commune.Module, 'connect', classmethod(lambda cls, *args, **kwargs: Client(0)))
+    assert asyncio.run(commune.async_call('model', prefix_match=True)) == {'success': True}
+    assert balancer.stats['model::a']['inflight'] == 0 and balancer.stats['model::a']['latency'] != None
+
+    # no replicas is an error like any other
+    monkeypatch.setattr(commune, 'namespace', lambda *args, **kwargs: {})
+    with_replicas(balancer)
+    result = asyncio.run(commune.async_call('model', prefix_match=True, ignore_error=True))
+    assert 'No replicas' in result['error'], result
+
+
+if __name__ == '__main__':
+    test_breaker_opens_after_failure_threshold()
+    test_half_open_probe_after_cooldown()
+    test_release_tracks_inflight_and_latency()
+    test_trip_takes_a_replica_out_of_rotation()
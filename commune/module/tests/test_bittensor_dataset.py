@@ -0,0 +1,112 @@
+import commune
+import asyncio
+import threading
+import time
+from collections import deque
+from commune.modules.data.text.bittensor.bittensor_dataset import BittensorDataset
+
+
+def offline_dataset(tmp_path, blocks:dict, **kwargs) -> BittensorDataset:
+    """
+    A dataset over the given {cid: bytes}, read through cat without an IPFS node, caching under tmp_path
+    """
+    dataset = BittensorDataset.__new__(BittensorDataset)
+    dataset.__dict__.update(dict(cache_blocks=True, max_block_cache_size=10**9, max_hash_size=10**7,
+                                 hash_dataset_map={cid: 'offline' for cid in blocks}, block_cache_lock=threading.Lock(),
+                                 block_cache_bytes=None, fetch_text_tasks=[], sample_buffer=deque(), buffer_lock=threading.Condition(),
+                                 buffer_size=len(blocks), refill_thread=None, refill_concurrency=4, closed=False, sample_timeout=5,
+                                 sample_count=0, buffer_calls_per_update=100, batch_size=1, min_block_size_bytes=10**6,
+                                 sequence_length=4, no_tokenizer=True, pad_token='[PAD]'), **kwargs)
+    dataset.resolve_path = lambda path: str(tmp_path / path)
+    dataset.suggest_samples = lambda sample_size: [{'Hash': cid} for cid in list(blocks)[:sample_size]]
+    dataset.cat_calls = []
+    async def cat(cid, offset=0, length=None):
+        dataset.cat_calls.append((cid, length))
+        return blocks[cid][offset:offset + length]
+    dataset.cat = cat
+    return dataset
+
+
+def fetch(dataset, cid, length):
+    return asyncio.run(dataset.fetch_text(cid, length=length, save=False))
+
+
+def test_blocks_are_fetched_once(tmp_path):
+    blocks = {'QmA': b'a' * 500, 'QmB': b'b' * 500}
+    dataset = offline_dataset(tmp_path, blocks)
+    assert fetch(dataset, 'QmA', 1000) == 'a' * 500
+    assert fetch(dataset, 'QmA', 1000) == 'a' * 500
+    assert dataset.cat_calls == [('QmA', 1000)]
+    # a new instance starts from the blocks on disk
+    dataset = offline_dataset(tmp_path, blocks)
+    assert fetch(dataset, 'QmA', 1000) == 'a' * 500
+    assert dataset.cat_calls == []
+
+
+def test_background_refill_feeds_samples(tmp_path):
+    blocks = {f'Qm{i}': f'word{i} '.encode() * 10 for i in range(4)}
+    dataset = offline_dataset(tmp_path, blocks)
+    # the first sample waits for the refill, the rest come from the buffer
+    texts = dataset.sample(batch_size=8)['text']
+    assert len(texts) == 8
+    assert all([len(text.split()) == 4 for text in texts])
+    with dataset.buffer_lock:
+        assert dataset.buffer_lock.wait_for(lambda: len(dataset.sample_buffer) == len(blocks), timeout=5)
+    assert sorted(dataset.cat_calls) == sorted([(cid, dataset.max_hash_size) for cid in blocks])
+    dataset.close()
+
+
+def test_truncated_blocks_are_cached_by_length(tmp_path):
+    blocks = {'QmBig': b'a' * 5000, 'QmSmall': b'b' * 500}
+    dataset = offline_dataset(tmp_path, blocks)
+    assert fetch(dataset, 'QmSmall', 1000) == 'b' * 500
+    assert fetch(dataset, 'QmBig', 1000) == 'a' * 1000
+    # the whole small block serves any length, the prefix of the big one only its own
+    assert fetch(dataset, 'QmSmall', 100) == 'b' * 100
+    assert fetch(dataset, 'QmBig', 1000) == 'a' * 1000
+    assert len(dataset.cat_calls) == 2
+    assert fetch(dataset, 'QmBig', 10000) == 'a' * 5000
+    assert dataset.cat_calls[-1] == ('QmBig', 10000)
+
+
+def test_block_cache_is_capped(tmp_path):
+    blocks = {f'Qm{i}': bytes([65 + i]) * 1000 for i in range(10)}
+    dataset = offline_dataset(tmp_path, blocks, max_block_cache_size=5000)
+    for cid in blocks:
+        fetch(dataset, cid, 10000)
+        time.sleep(0.01)
+    assert sum([size for path, size, mtime in dataset.cached_blocks()]) <= 5000
+    # the least recently used blocks went first
+    assert dataset.get_block('Qm9', length=10000) == blocks['Qm9']
+    assert dataset.get_block('Qm0', length=10000) == None
+
+
+def test_async_getitem_does_not_block_the_loop(tmp_path):
+    dataset = offline_dataset(tmp_path, {}, min_block_size_bytes=10)
+    dataset.start_refill = lambda: None
+    ticks = []
+    async def ticker():
+        while len(ticks) < 10:
+            ticks.append(time.time())
+            await asyncio.sleep(0.02)
+    def refill():
+        time.sleep(0.1)
+        with dataset.buffer_lock:
+            dataset.sample_buffer.append('x' * 100)
+            dataset.buffer_lock.notify_all()
+    threading.Thread(target=refill).start()
+    async def main():
+        return await asyncio.gather(dataset.async_generate_sample(), ticker())
+    sample, _ = asyncio.run(main())
+    assert sample == 'x' * 10
+    # the loop kept running while the sample waited for the refill
+    assert len([t for t in ticks if t < ticks[0] + 0.1]) > 2
+
+
+if __name__ == '__main__':
+    import pathlib, tempfile
+    test_blocks_are_fetched_once(pathlib.Path(tempfile.mkdtemp()))
+    test_background_refill_feeds_samples(pathlib.Path(tempfile.mkdtemp()))
+    test_truncated_blocks_are_cached_by_length(pathlib.Path(tempfile.mkdtemp()))
+    test_block_cache_is_capped(pathlib.Path(tempfile.mkdtemp()))
+    test_async_getitem_does_not_block_the_loop(pathlib.Path(tempfile.mkdtemp()))
@@ -0,0 +1,80 @@
+import commune
+import os
+import threading
+import torch
+from torch import nn
+from commune.modules.model.checkpoint import Checkpointer
+
+
+def new_model(seed:int = 0) -> nn.Module:
+    torch.manual_seed(seed)
+    return nn.Sequential(nn.Linear(4, 4), nn.Linear(4, 2))
+
+
+def same_params(a:nn.Module, b:nn.Module) -> bool:
+    return all([torch.equal(x, y) for x, y in zip(a.state_dict().values(), b.state_dict().values())])
+
+
+def test_incremental_save_reuses_unchanged_shards(tmp_path):
+    model = new_model()
+    optimizer = torch.optim.Adam(model.parameters())
+    checkpointer = Checkpointer(str(tmp_path), background=False)
+    first = checkpointer.save(model, optimizer, config={'lr': 1}).result()
+
+    with torch.no_grad():
+        model[0].weight.add_(1)
+    second = checkpointer.save(model, optimizer).result()
+    assert second['version'] == first['version'] + 1
+    # only the tensor modified in place is written again
+    assert second['model']['0.weight'] != first['model']['0.weight']
+    assert all([second['model'][name] == first['model'][name] for name in ['0.bias', '1.weight', '1.bias']])
+    assert second['config'] == {'lr': 1}
+    used = set(second['model'].values()) | set(second['optimizer']['files'].values())
+    assert set(os.listdir(checkpointer.shard_dir)) == used
+
+    loaded = new_model(seed=1)
+    assert Checkpointer(str(tmp_path)).load(loaded, torch.optim.Adam(loaded.parameters()))['version'] == second['version']
+    assert same_params(loaded, model)
+
+    # a full save rewrites everything
+    third = checkpointer.save(model, incremental=False).result()
+    assert all([third['model'][name].startswith(f"{third['version']}-model") for name in third['model']])
+
+
+def test_load_during_save_reads_the_last_committed_checkpoint(tmp_path):
+    model = new_model()
+    checkpointer = Checkpointer(str(tmp_path))
+    checkpointer.save(model).result()
+    committed = new_model()
+    committed.load_state_dict(model.state_dict())
+
+    # hold the next save after its shards are written, before the manifest is replaced
+    written, release = threading.Event(), threading.Event()
+    write_shards = checkpointer.write_shards
+    def held_write_shards(*args, **kwargs):
+        tensor2file = write_shards(*args, **kwargs)
+        written.set()
+        release.wait(10)
+        return tensor2file
+    checkpointer.write_shards = held_write_shards
+    with torch.no_grad():
+        for p in model.parameters():
+            p.mul_(2)
+    future = checkpointer.save(model)
+    assert written.wait(10)
+
+    # another reader (as another process would) sees the previous checkpoint, whole
+    loaded = new_model(seed=1)
+    assert Checkpointer(str(tmp_path)).load(loaded)['version'] == 0
+    assert same_params(loaded, committed)
+
+    release.set()
+    assert future.result(10)['version'] == 1
+    assert Checkpointer(str(tmp_path)).load(loaded)['version'] == 1
+    assert same_params(loaded, model)
+
+
+if __name__ == '__main__':
+    import pathlib, tempfile
+    test_incremental_save_reuses_unchanged_shards(pathlib.Path(tempfile.mkdtemp()))
+    test_load_during_save_reads_the_last_committed_checkpoint(pathlib.Path(tempfile.mkdtemp()))
@@ -0,0 +1,35 @@
+import commune
+import os
+
+
+def test_named_config_follows_a_moved_module(monkeypatch, tmp_path):
+    tree = {}
+    walks = []
+    def module_tree(cls, *args, **kwargs):
+        walks.append(True)
+        return dict(tree)
+    monkeypatch.setattr(commune.Module, 'module_tree', classmethod(module_tree))
+    monkeypatch.setattr(commune.Module, 'config_path_cache', {})
+    def put_module(dirpath, x):
+        os.makedirs(dirpath, exist_ok=True)
+        with open(f'{dirpath}/thing.py', 'w') as f:
+            f.write('')
+        with open(f'{dirpath}/thing.yaml', 'w') as f:
+            f.write(f'x: {x}\n')
+        tree['thing'] = f'{dirpath}/thing.py'
+
+    put_module(str(tmp_path / 'a'), 1)
+    assert commune.Module.load_config('thing') == {'x': 1}
+    assert commune.Module.load_config('thing') == {'x': 1}
+    assert len(walks) == 1
+
+    # the module moved, so the cached path is gone and the tree is walked again
+    os.remove(tree['thing'])
+    put_module(str(tmp_path / 'b'), 2)
+    assert commune.Module.load_config('thing') == {'x': 2}
+    assert len(walks) == 2
+
+
+if __name__ == '__main__':
+    import pytest
+    pytest.main([__file__])
@@ -0,0 +1,98 @@
+import commune
+import numpy as np
+from commune.modules.subspace.module_table import ModuleTable, take_ragged
+
+
+def chain_state() -> dict:
+    keys = ['key_a', 'key_b', 'key_c']
+    return {
+        'uid2key': dict(enumerate(keys)),
+        'names': {0: 'model.a', 1: 'model.b', 2: 'vali'},
+        'addresses': {0: '0.0.0.0:8000', 1: '0.0.0.0:8001', 2: '0.0.0.0:8002'},
+        'emission': {0: 10**9, 1: 2 * 10**9, 2: 0},
+        'incentive': {0: 65535, 1: 0, 2: 0},
+        'dividends': {0: 0, 1: 0, 2: 65535},
+        'trust': {0: 1, 1: 2, 2: 3},
+        'regblock': {0: 100, 1: 200},
+        'last_update': {0: 5, 1: 6, 2: 7},
+        'delegation_fee': {'key_b': 5},
+        'stake_from': {'key_a': [['staker_x', 3 * 10**9], ['staker_y', 10**9]],
+                       'key_c': [['staker_x', 5 * 10**9]]},
+        'weights': {0: [], 1: [[0, 10]], 2: [[0, 1], [1, 2]]},
+        'balances': {'key_a': 7 * 10**9},
+    }
+
+
+def test_from_state_columns():
+    table = ModuleTable.from_state(chain_state(), fmt='j')
+    assert len(table) == 3
+    assert table.columns['stake_from_indptr'].tolist() == [0, 2, 2, 3]
+    assert table.column('stake') == [4.0, 0.0, 5.0]
+    assert table.column('stake_from') == [[('staker_x', 3.0), ('staker_y', 1.0)], [], [('staker_x', 5.0)]]
+    assert table.column('weight') == [[], [[0, 10]], [[0, 1], [1, 2]]]
+    assert table.column('incentive') == [1.0, 0.0, 0.0]
+    # missing regblock, delegation_fee and balance fall back to their defaults
+    assert table.column('regblock') == [100, 200, 0]
+    assert table.column('delegation_fee') == [20, 5, 20]
+    assert table.column('balance') == [7.0, 0.0, 0.0]
+    # the nano table keeps the raw amounts
+    assert ModuleTable.from_state(chain_state()).column('emission') == [10**9, 2 * 10**9, 0]
+
+
+def test_row_and_mapping():
+    table = ModuleTable.from_state(chain_state(), fmt='j')
+    row = table.row('name', 'model.b')
+    assert row['key'] == 'key_b' and row['uid'] == 1 and row['emission'] == 2.0
+    assert table.row('key', 'key_c')['name'] == 'vali'
+    assert table.row('name', 'missing') == None
+    assert table[-1]['name'] == 'vali'
+    assert dict(table[0])['stake_from'] == [('staker_x', 3.0), ('staker_y', 1.0)]
+    assert table.mapping('name', 'key') == {'model.a': 'key_a', 'model.b': 'key_b', 'vali': 'key_c'}
+    assert table.mapping('key', 'stake') == {'key_a': 4.0, 'key_b': 0.0, 'key_c': 5.0}
+
+
+def test_staked_by():
+    table = ModuleTable.from_state(chain_state(), fmt='j')
+    assert table.staked_by('staker_x') == {'model.a': 3.0, 'vali': 5.0}
+    assert table.staked_by('staker_y') == {'model.a': 1.0}
+    assert table.staked_by('nobody') == {}
+
+
+def test_take_and_take_ragged():
+    indptr = np.array([0, 2, 2, 5])
+    values = np.arange(5) * 10
+    new_indptr, (taken,) = take_ragged(indptr, [values], np.array([2, 0]))
+    assert new_indptr.tolist() == [0, 3, 5] and taken.tolist() == [20, 30, 40, 0, 10]
+    new_indptr, (taken,) = take_ragged(indptr, [values], np.array([1]))
+    assert new_indptr.tolist() == [0, 0] and taken.tolist() == []
+
+    table = ModuleTable.from_state(chain_state(), fmt='j')
+    taken = table.take([2, 0])
+    assert taken.column('name') == ['vali', 'model.a']
+    assert taken.column('stake_from') == [[('staker_x', 5.0)], [('staker_x', 3.0), ('staker_y', 1.0)]]
+    assert taken.column('weight') == [[[0, 1], [1, 2]], []]
+    assert taken.staked_by('staker_x') == {'vali': 5.0, 'model.a': 3.0}
+    assert table.search('model').column('name') == ['model.a', 'model.b']
+    assert table.filter_keys(['key_b']).column('weight') == [[[0, 10]]]
+    assert len(table[1:]) == 2 and table[1:].column('uid') == [1, 2]
+
+
+def test_save_and_load(tmp_path):
+    table = ModuleTable.from_state(chain_state(), fmt='j')
+    path = table.save(str(tmp_path / 'modules' / 'table.npz'))
+    loaded = ModuleTable.load(path, fmt='j')
+    assert sorted(loaded.columns) == sorted(table.columns)
+    for k, v in table.columns.items():
+        assert loaded.columns[k].tolist() == v.tolist(), k
+    assert loaded.columns['name'].dtype == object
+    assert loaded.to_dicts() == table.to_dicts()
+    assert loaded.staked_by('staker_x') == table.staked_by('staker_x')
+
+
+if __name__ == '__main__':
+    import pathlib, tempfile
+    test_from_state_columns()
+    test_row_and_mapping()
+    test_staked_by()
+    test_take_and_take_ragged()
+    test_save_and_load(pathlib.Path(tempfile.mkdtemp()))
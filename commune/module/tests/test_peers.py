@@ -0,0 +1,54 @@
+import commune
+from commune.module.peers import Peers
+
+
+def peer(origin, seed):
+    peers = Peers(origin=origin, persist=False)
+    peers.key = commune.module('key').create_from_uri(seed)
+    return peers
+
+
+def test_same_name_on_two_origins():
+    a, b = peer('10.0.0.1:8888', '//a'), peer('10.0.0.2:8888', '//b')
+    a.update_local({'model': '10.0.0.1:50050'})
+    b.update_local({'model': '10.0.0.2:50050'})
+    b.merge(a.delta({}))
+    a.merge(b.delta({}))
+    # both entries survive, each peer resolves the name to its own server
+    assert len(a.entries) == len(b.entries) == 2
+    assert a.registry_namespace()['model'] == '10.0.0.1:50050'
+    assert b.registry_namespace()['model'] == '10.0.0.2:50050'
+
+
+def test_forged_entries_are_dropped():
+    a, b = peer('10.0.0.1:8888', '//a'), peer('10.0.0.2:8888', '//b')
+    a.update_local({'model': '10.0.0.1:50050'})
+    b.merge(a.delta({}))
+    # an entry claiming a's origin but signed by another key
+    mallory = peer('10.0.0.1:8888', '//mallory')
+    mallory.versions['10.0.0.1:8888'] = 10
+    mallory.update_local({'model': '10.6.6.6:50050'})
+    assert b.merge(mallory.delta({})) == 0
+    # a tampered address breaks a's signature
+    entry = dict(a.delta({}).popitem()[1], address='10.6.6.6:50050', version=99)
+    assert b.merge({'x': entry}) == 0
+    assert b.registry_namespace()['model'] == '10.0.0.1:50050'
+
+
+def test_no_gossip_before_served():
+    peers = Peers(persist=False)
+    assert peers.resolve_origin() == None
+    assert peers.update_local({'model': '0.0.0.0:50050'}) == 0
+    assert peers.gossip(peers=['10.0.0.2:8888']) == []
+
+
+def test_simulation_converges():
+    results = Peers.simulate(n=16)
+    assert results['converged'], results
+
+
+if __name__ == '__main__':
+    test_same_name_on_two_origins()
+    test_forged_entries_are_dropped()
+    test_no_gossip_before_served()
+    test_simulation_converges()
@@ -0,0 +1,71 @@
+import commune
+import sys
+import time
+from commune.modules.process.supervisor.supervisor import Supervisor
+
+
+def test_process_exists_stops_at_the_first_manager(monkeypatch):
+    asked = []
+    def pm2_list(*args, **kwargs):
+        asked.append('pm2')
+        return ['model::a']
+    def supervisor_exists(name):
+        asked.append('supervisor')
+        return name == 'model::a'
+    monkeypatch.setattr(commune.Module, 'pm2_list', classmethod(lambda cls, *args, **kwargs: pm2_list()))
+    monkeypatch.setattr(commune.Module, 'pm2_exists', classmethod(lambda cls, name: name in pm2_list()))
+    monkeypatch.setattr(commune.Module, 'supervisor_exists', classmethod(lambda cls, name: supervisor_exists(name)))
+    monkeypatch.setattr(commune.Module, 'pm2_fallback', True)
+    assert commune.Module.process_exists('model::a')
+    assert asked == ['supervisor']
+    assert commune.Module.resolve_process_manager('model::a') == 'supervisor'
+    # a miss falls through to pm2
+    asked.clear()
+    assert not commune.Module.process_exists('model::b')
+    assert asked == ['supervisor', 'pm2']
+
+    # pm2 is not asked when it is not installed, or is turned off
+    monkeypatch.setattr(commune.Module, 'pm2_fallback', None)
+    monkeypatch.setattr(commune.Module, 'pm2_path', '')
+    asked.clear()
+    assert not commune.Module.process_exists('model::b')
+    assert commune.Module.resolve_process_manager('model::b') == 'supervisor'
+    assert 'pm2' not in asked
+    monkeypatch.setattr(commune.Module, 'pm2_fallback', False)
+    monkeypatch.setattr(commune.Module, 'pm2_path', '/usr/bin/pm2')
+    assert commune.Module.process_managers() == ['supervisor']
+
+
+def test_restart_backoff_doubles_up_to_the_cap():
+    supervisor = Supervisor(min_backoff=1.0, max_backoff=5.0, min_uptime=10.0)
+    proc = {'backoff': 0, 'start_time': time.time()}
+    backoffs = []
+    for i in range(5):
+        proc['backoff'] = supervisor.restart_backoff(proc)
+        backoffs.append(proc['backoff'])
+    assert backoffs == [1.0, 2.0, 4.0, 5.0, 5.0]
+    # a process that stayed up past min_uptime starts over
+    proc['start_time'] = time.time() - 11
+    assert supervisor.restart_backoff(proc) == 1.0
+
+
+def test_crashing_process_is_restarted_with_backoff(monkeypatch, tmp_path):
+    monkeypatch.setattr(Supervisor, 'supervisor_dir', str(tmp_path))
+    monkeypatch.setattr(Supervisor, 'log_dir', str(tmp_path / 'logs'))
+    monkeypatch.setattr(Supervisor, 'state_path', str(tmp_path / 'state.json'))
+    supervisor = Supervisor(interval=0.02, min_backoff=0.05, max_backoff=0.2)
+    supervisor.daemon_start('crash', [sys.executable, '-c', 'exit(1)'])
+    commune.thread(supervisor.monitor_loop)
+    try:
+        deadline = time.time() + 10
+        while time.time() < deadline and supervisor.procs['crash']['restarts'] < 4:
+            time.sleep(0.02)
+    finally:
+        supervisor.stopped = True
+    proc = supervisor.daemon_status('crash')
+    assert proc['restarts'] >= 4
+    assert proc['backoff'] == 0.2
+
+
+if __name__ == '__main__':
+    test_restart_backoff_doubles_up_to_the_cap()
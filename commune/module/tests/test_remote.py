@@ -0,0 +1,141 @@
+import commune
+import os
+import select
+import subprocess
+import threading
+
+
+class Channel:
+    """
+    A session channel that runs its command in a local shell, with the reads of a paramiko Channel
+    """
+
+    def __init__(self):
+        self.process = None
+        self.eof = {}
+
+    def exec_command(self, command):
+        self.process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def ready(self, pipe) -> bool:
+        return not self.eof.get(pipe.fileno()) and len(select.select([pipe], [], [], 0)[0]) > 0
+
+    def read(self, pipe, n) -> bytes:
+        data = os.read(pipe.fileno(), n)
+        self.eof[pipe.fileno()] = len(data) == 0
+        return data
+
+    def recv_ready(self):
+        return self.ready(self.process.stdout)
+
+    def recv(self, n):
+        return self.read(self.process.stdout, n)
+
+    def recv_stderr_ready(self):
+        return self.ready(self.process.stderr)
+
+    def recv_stderr(self, n):
+        return self.read(self.process.stderr, n)
+
+    def exit_status_ready(self):
+        return self.process.poll() != None
+
+    def recv_exit_status(self):
+        return self.process.wait()
+
+    def fileno(self):
+        return self.process.stdout.fileno()
+
+    def close(self):
+        if self.process.poll() == None:
+            self.process.kill()
+            self.process.wait()
+
+
+class Transport:
+    def __init__(self):
+        self.sessions = []
+        self.lock = threading.Lock()
+
+    def is_active(self):
+        return True
+
+    def open_session(self, timeout=None):
+        with self.lock:
+            self.sessions.append(timeout)
+        return Channel()
+
+
+class Client:
+    def __init__(self):
+        self.transport = Transport()
+
+    def get_transport(self):
+        return self.transport
+
+    def close(self):
+        pass
+
+
+def connect_hosts(remote, tmp_path, names) -> dict:
+    # pooled clients for the hosts, so commands run over them without a handshake
+    remote.host_data_path = str(tmp_path / 'hosts.yaml')
+    remote.close_ssh()
+    remote.save_hosts({name: {'host': '127.0.0.1', 'port': 22, 'user': 'test', 'pwd': 'test'} for name in names})
+    remote.ssh_clients.update({name: Client() for name in names})
+    return remote.ssh_clients
+
+
+def test_commands_share_the_pooled_connection(tmp_path):
+    remote = commune.module('remote')
+    clients = connect_hosts(remote, tmp_path, ['local'])
+    assert remote.cmd('echo hi', host='local', verbose=False) == {'local': 'hi'}
+    assert remote.cmd('echo again', host='local', verbose=False) == {'local': 'again'}
+    # each command opens a channel on the same transport
+    assert len(clients['local'].transport.sessions) == 2
+    remote.close_ssh()
+
+
+def test_fan_out_streams_every_host(tmp_path):
+    remote = commune.module('remote')
+    names = [f'host{i}' for i in range(6)]
+    connect_hosts(remote, tmp_path, names)
+    items = list(remote.stream_cmd('echo out && echo err 1>&2', hosts=names, max_workers=2))
+    for name in names:
+        lines = {(item['stream'], item['line']) for item in items if item['host'] == name and 'line' in item}
+        assert lines == {('stdout', 'out'), ('stderr', 'err')}, items
+        assert [item['exit_status'] for item in items if item['host'] == name and 'exit_status' in item] == [0]
+    remote.close_ssh()
+
+
+def test_timeout_bounds_connect_not_command(tmp_path):
+    remote = commune.module('remote')
+    clients = connect_hosts(remote, tmp_path, ['local'])
+    # a command outlasting the connect timeout still finishes
+    result = remote.cmd('sleep 1 && echo done', host='local', timeout=0.5, verbose=False)
+    assert result['local'] == 'done', result
+    assert clients['local'].transport.sessions == [0.5]
+    # while an explicit deadline abandons it
+    result = remote.cmd('sleep 2 && echo done', host='local', deadline=0.5, verbose=False)
+    assert 'did not finish' in result['local']['error'], result
+    remote.close_ssh()
+
+
+def test_hosts_loaded_once_per_change(tmp_path):
+    remote = commune.module('remote')
+    connect_hosts(remote, tmp_path, ['local'])
+    hosts = remote.hosts()
+    hosts['local']['port'] = 1
+    # editing what we got back does not touch the cached hosts
+    assert remote.hosts()['local']['port'] == 22
+    remote.add_host(host='127.0.0.2', port=22, user='other', pwd='other', name='other')
+    assert 'other' in remote.hosts()
+    remote.close_ssh()
+
+
+if __name__ == '__main__':
+    import pathlib, tempfile
+    test_commands_share_the_pooled_connection(pathlib.Path(tempfile.mkdtemp()))
+    test_fan_out_streams_every_host(pathlib.Path(tempfile.mkdtemp()))
+    test_timeout_bounds_connect_not_command(pathlib.Path(tempfile.mkdtemp()))
+    test_hosts_loaded_once_per_change(pathlib.Path(tempfile.mkdtemp()))
@@ -0,0 +1,86 @@
+import commune
+import asyncio
+from commune.modules.server.http.response_cache import ResponseCache
+
+
+def counted(response, cacheable:bool = True, delay:float = 0):
+    calls = []
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return response, cacheable
+    return compute, calls
+
+
+def test_concurrent_requests_share_one_computation():
+    cache = ResponseCache(ttls={'info': 60})
+    compute, calls = counted({'name': 'model'}, delay=0.1)
+    async def main():
+        first = asyncio.ensure_future(cache.get('info', [], {}, compute))
+        await asyncio.sleep(0.01)
+        waiters = [asyncio.ensure_future(cache.get('info', [], {}, compute)) for i in range(10)]
+        await asyncio.sleep(0.01)
+        # a waiter that gives up does not cancel the computation the others wait on
+        waiters[0].cancel()
+        return await asyncio.gather(first, *waiters[1:])
+    responses = asyncio.run(main())
+    assert all([r == {'name': 'model'} for r in responses])
+    assert len(calls) == 1
+    assert cache.stats == {'hits': 0, 'misses': 1, 'coalesced': 10}
+    # other arguments are another entry
+    asyncio.run(cache.get('info', [], {'verbose': True}, compute))
+    assert len(calls) == 2
+
+
+def test_entries_expire_after_the_ttl():
+    cache = ResponseCache(ttls={'info': 0.1})
+    compute, calls = counted('v')
+    async def main():
+        await cache.get('info', [], {}, compute)
+        await cache.get('info', [], {}, compute)
+        assert len(calls) == 1 and cache.stats['hits'] == 1
+        await asyncio.sleep(0.15)
+        await cache.get('info', [], {}, compute)
+        assert len(calls) == 2
+    asyncio.run(main())
+
+
+def test_errors_are_not_cached():
+    cache = ResponseCache(ttls={'info': 60})
+    compute, calls = counted({'error': 'busy'}, cacheable=False)
+    for i in range(2):
+        assert asyncio.run(cache.get('info', [], {}, compute)) == {'error': 'busy'}
+    assert len(calls) == 2 and len(cache.entries) == 0
+
+    # an exception reaches every waiter, and the next request computes again
+    async def fail():
+        await asyncio.sleep(0.05)
+        raise ValueError('failed')
+    async def main():
+        return await asyncio.gather(*[cache.get('info', [], {}, fail) for i in range(3)], return_exceptions=True)
+    assert all([isinstance(r, ValueError) for r in asyncio.run(main())])
+    assert len(cache.inflight) == 0
+    compute, calls = counted('ok')
+    assert asyncio.run(cache.get('info', [], {}, compute)) == 'ok'
+    assert len(calls) == 1
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResponseCache(ttls={'info': 60, 'ls': 60}, max_size=2)
+    async def main():
+        for i in range(2):
+            await cache.get('info', [i], {}, counted(i)[0])
+        # a hit makes 0 the most recent, so 1 goes
+        await cache.get('info', [0], {}, counted(0)[0])
+        await cache.get('ls', [], {}, counted([])[0])
+    asyncio.run(main())
+    assert list(cache.entries) == [cache.key('info', [0], {}), cache.key('ls', [], {})]
+    cache.clear('info')
+    assert list(cache.entries) == [cache.key('ls', [], {})]
+
+
+if __name__ == '__main__':
+    test_concurrent_requests_share_one_computation()
+    test_entries_expire_after_the_ttl()
+    test_errors_are_not_cached()
+    test_least_recently_used_entries_are_evicted()
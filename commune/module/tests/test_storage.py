@@ -0,0 +1,147 @@
+import commune
+import asyncio
+import os
+
+
+def test_gc_keeps_nested_replica_chunks(tag='test_gc'):
+    storage = commune.module('storage')(max_shard_size='1kb')
+    storage.refresh_store(tag=tag)
+    commune.rm(storage.chunk_dir(tag=tag))
+    data = 'x' * 5000
+    storage.put_item('item', data, tag=tag)
+    replica_key = f'{storage.replica_prefix}/origin/item_hash'
+    storage.put_item(replica_key, data + 'y', tag=tag)
+    assert replica_key in storage.item_keys(tag=tag)
+
+    # nothing is collected while it is referenced, even with no grace period
+    assert storage.gc_chunks(tag=tag, grace=0)['removed'] == 0
+    assert storage.get_item(replica_key, tag=tag) == data + 'y'
+
+    # an orphan chunk goes, unless it was written within the grace period
+    orphan = storage.write_chunk(b'orphan', tag=tag)
+    assert storage.gc_chunks(tag=tag)['removed'] == 0
+    assert storage.gc_chunks(tag=tag, grace=0)['removed'] == 1
+    assert not os.path.exists(storage.chunk_path(orphan, tag=tag))
+    assert storage.get_item('item', tag=tag) == data
+
+
+def test_gc_skips_chunk_writes_in_flight(tag='test_gc_tmp'):
+    storage = commune.module('storage')()
+    storage.refresh_store(tag=tag)
+    commune.rm(storage.chunk_dir(tag=tag))
+    chunk_dir = storage.chunk_dir(tag=tag)
+    os.makedirs(f'{chunk_dir}/ab', exist_ok=True)
+    tmp_path = f'{chunk_dir}/ab/abcd.123.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(b'partial')
+    assert storage.gc_chunks(tag=tag, grace=0)['removed'] == 0
+    assert os.path.exists(tmp_path)
+    os.remove(tmp_path)
+
+
+def test_merkle_node_and_repair_batches(tag='test_merkle'):
+    storage = commune.module('storage')(merkle_leaf_size=2, repair_batch_size=3, max_repair_batch_size='1kb')
+    storage.refresh_store(tag=tag)
+    keys = [f'item_{i}' for i in range(8)]
+    for k in keys:
+        storage.put_item(k, 'v', tag=tag)
+    root = storage.merkle_node(tag=tag)
+    assert root['n'] == len(keys) and 'children' in root
+    # every child hash matches the node under that prefix, and the children cover every key once
+    children = {p: storage.merkle_node(prefix=p, tag=tag) for p in root['children']}
+    assert all([children[p]['hash'] == h for p, h in root['children'].items()])
+    assert sum([node['n'] for node in children.values()]) == root['n']
+
+    # a put invalidates the cached leaves
+    storage.put_item('item_new', 'v', tag=tag)
+    assert storage.merkle_node(tag=tag)['n'] == len(keys) + 1
+
+    item2metadata = {'a': {'size_bytes': 600}, 'b': {'size_bytes': 600}, 'c': {'size_bytes': 10},
+                     'd': {'size_bytes': 10}, 'e': {'size_bytes': 10}, 'f': {'size_bytes': 5000}}
+    batches = storage.repair_batches(list(item2metadata), item2metadata)
+    assert batches == [['a'], ['b', 'c', 'd'], ['e'], ['f']], batches
+
+
+def test_sync_skips_unreachable_peers(tag='test_sync'):
+    storage = commune.module('storage')(tag=tag)
+    storage.refresh_store(tag=tag)
+    storage.put_item('item', 'v', tag=tag)
+    metadata = storage.get_metadata('item', tag=tag)
+    metadata['replicas'] = ['storage::offline']
+    storage.put_metadata('item', metadata, tag=tag)
+    # a peer that is registered but not listening
+    storage.peers = lambda: {'storage::offline': f'0.0.0.0:{commune.free_port()}'}
+    result = storage.sync_replicas(tag=tag, timeout=10)
+    assert result['unreachable'] == ['storage::offline'], result
+    # an unreachable peer keeps its replicas and gets no repairs
+    assert storage.get_metadata('item', tag=tag)['replicas'] == ['storage::offline']
+    assert result['repaired'] == 0
+
+
+def test_sync_repairs_lost_replicas(monkeypatch, tag='test_sync_repair'):
+    storage = commune.module('storage')(tag=tag, max_replicas=2, merkle_leaf_size=2)
+    peers = {name: commune.module('storage')(tag=f'{tag}_{name}') for name in ['storage::a', 'storage::b']}
+    for s in [storage, *peers.values()]:
+        s.refresh_store()
+    storage.peers = lambda: {name: f'0.0.0.0:{8000 + i}' for i, name in enumerate(peers)}
+    calls = []
+    async def async_call(peer, fn, timeout=None, **kwargs):
+        calls.append((peer, fn))
+        # off the loop, as the peer would answer from its own server
+        return await asyncio.to_thread(getattr(peers[peer], fn), **kwargs)
+    monkeypatch.setattr(commune, 'async_call', async_call)
+    for i in range(6):
+        storage.put_item(f'item_{i}', f'v{i}')
+
+    # every item goes to both peers
+    result = storage.sync_replicas()
+    assert result['repaired'] == 12 and result['lost'] == 0, result
+    assert all([storage.get_item_replicas(f'item_{i}') == ['storage::a', 'storage::b'] for i in range(6)])
+
+    # in sync, one root node per peer and nothing to repair
+    calls.clear()
+    result = storage.sync_replicas()
+    assert result['repaired'] == 0 and result['lost'] == 0, result
+    assert sorted(calls) == [('storage::a', 'merkle_node'), ('storage::b', 'merkle_node')]
+
+    # a replica the peer lost is found by descending the tree, and put back
+    lost = storage.replica_key(storage.get_metadata('item_3'))
+    peers['storage::b'].rm_item(lost)
+    result = storage.sync_replicas()
+    assert result['lost'] == 1 and result['repaired'] == 1, result
+    assert peers['storage::b'].get_item(lost) == 'v3'
+    assert storage.get_item_replicas('item_3') == ['storage::a', 'storage::b']
+
+
+def test_legacy_items_are_read(tag='test_legacy'):
+    storage = commune.module('storage')()
+    storage.refresh_store(tag=tag)
+    data = {'text': 'x' * 500, 'n': 1}
+    serialized = storage.serializer.serialize(data)
+
+    # the layout before chunks, the serialized data in data.json next to the metadata
+    k = storage.resolve_item_path('whole', tag=tag)
+    commune.put_json(k + '/data.json', serialized)
+    commune.put_json(k + '/metadata.json', {'size_bytes': len(serialized), 'path': {'data': k + '/data.json'}, 'shards': []})
+    assert storage.get_item('whole', tag=tag) == data
+
+    # or split across shard items, each with its own data.json
+    k = storage.resolve_item_path('sharded', tag=tag)
+    shards = []
+    for i in range(0, len(serialized), 200):
+        shard_path = f'{k}/shard::{len(shards)}'
+        commune.put_json(shard_path + '/data.json', serialized[i:i + 200])
+        shards += [shard_path]
+    commune.put_json(k + '/metadata.json', {'size_bytes': len(serialized), 'shards': shards})
+    assert storage.get_item('sharded', tag=tag) == data
+    assert storage.get_item_range('sharded', 100, 300, tag=tag) == serialized.encode('utf-8')[100:300]
+
+    assert storage.get_item('missing', tag=tag) == {'success': False, 'error': 'No data found'}
+
+
+if __name__ == '__main__':
+    test_gc_keeps_nested_replica_chunks()
+    test_gc_skips_chunk_writes_in_flight()
+    test_merkle_node_and_repair_batches()
+    test_sync_skips_unreachable_peers()
+    test_legacy_items_are_read()
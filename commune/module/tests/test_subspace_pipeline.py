@@ -0,0 +1,172 @@
+import commune
+import hashlib
+import types
+from commune.modules.subspace.pipeline import TxPipeline
+
+
+class Chain:
+    """
+    The pool a TxPipeline checks connections out of, answering as a chain with a transaction pool
+    and one account nonce per key, producing blocks on demand
+    """
+
+    url = 'ws://chain'
+
+    def __init__(self):
+        self.account_nonces = {}
+        self.signed = {} # data -> (key, nonce)
+        self.pool = {} # data -> (key, nonce, tx_hash)
+        self.blocks = [[]]
+        self.requests = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def compose_call(self, call_module, call_function, call_params):
+        return types.SimpleNamespace(value={'call_module': call_module, 'call_function': call_function, 'call_args': call_params})
+
+    def create_signed_extrinsic(self, call, keypair, nonce):
+        data = '0x' + hashlib.sha256(f'{keypair.ss58_address}:{nonce}:{call.value}'.encode()).hexdigest()
+        self.signed[data] = (keypair.ss58_address, nonce)
+        return types.SimpleNamespace(data=data)
+
+    def rpc_request(self, method, params):
+        self.requests.append(method)
+        if method == 'system_accountNextIndex':
+            nonce = self.account_nonces.get(params[0], 0)
+            ready = sorted([n for k, n, h in self.pool.values() if k == params[0]])
+            while nonce in ready:
+                nonce += 1
+            return {'result': nonce}
+        if method == 'author_submitExtrinsic':
+            key, nonce = self.signed[params[0]]
+            if nonce < self.account_nonces.get(key, 0):
+                return {'error': {'message': 'Invalid Transaction: Transaction is outdated'}}
+            tx_hash = '0x' + hashlib.sha256(params[0].encode()).hexdigest()
+            self.pool[params[0]] = (key, nonce, tx_hash)
+            return {'result': tx_hash}
+        if method == 'author_pendingExtrinsics':
+            return {'result': list(self.pool.keys())}
+        raise ValueError(method)
+
+    def pooled_nonces(self) -> list:
+        return sorted([nonce for key, nonce, tx_hash in self.pool.values()])
+
+    def produce_block(self):
+        """
+        Includes every pooled extrinsic whose nonce is next for its key, like the ready queue
+        """
+        included = []
+        progress = True
+        while progress:
+            progress = False
+            for data, (key, nonce, tx_hash) in list(self.pool.items()):
+                if nonce == self.account_nonces.get(key, 0):
+                    self.account_nonces[key] = nonce + 1
+                    included.append(tx_hash)
+                    del self.pool[data]
+                    progress = True
+        self.blocks.append(included)
+
+    def get_block_header(self):
+        return {'header': {'number': len(self.blocks) - 1}}
+
+    def get_block(self, block_number):
+        extrinsics = [types.SimpleNamespace(extrinsic_hash=bytes.fromhex(h[2:])) for h in self.blocks[block_number]]
+        return {'header': {'hash': f'block{block_number}'}, 'extrinsics': extrinsics}
+
+    def get_block_hash(self, block_number):
+        return f'block{block_number}'
+
+    def get_chain_finalised_head(self):
+        return f'block{len(self.blocks) - 1}'
+
+    def get_block_number(self, block_hash):
+        return int(block_hash[len('block'):])
+
+    def query(self, module, storage_function, params, block_hash=None):
+        return types.SimpleNamespace(value={'nonce': self.account_nonces.get(params[0], 0)})
+
+
+key = types.SimpleNamespace(ss58_address='5Key')
+
+
+def pipeline_on(chain, **kwargs) -> TxPipeline:
+    pipeline = TxPipeline(chain, **kwargs)
+    # the tests step the watcher themselves, and every included extrinsic succeeded
+    pipeline.start_watcher = lambda: None
+    pipeline.receipt = lambda substrate, tx_hash, block_hash: (True, None)
+    return pipeline
+
+
+def transfer(pipeline, amount):
+    return pipeline.submit('transfer', {'dest': '5Dest', 'amount': amount}, key=key)
+
+
+def test_nonces_pipeline_within_a_block():
+    chain = Chain()
+    pipeline = pipeline_on(chain)
+    futures = [transfer(pipeline, i) for i in range(5)]
+    # every extrinsic is in the pool before a block, the nonce was read from the chain once
+    assert chain.pooled_nonces() == [0, 1, 2, 3, 4]
+    assert chain.requests.count('system_accountNextIndex') == 1
+    pipeline.watch_step()
+    chain.produce_block()
+    pipeline.watch_step()
+    assert all([f.result(timeout=0)['success'] for f in futures])
+    assert len(chain.blocks[-1]) == 5
+
+
+def test_outdated_nonce_resyncs():
+    chain = Chain()
+    pipeline = pipeline_on(chain)
+    transfer(pipeline, 0)
+    chain.produce_block()
+    # another client moves the account nonce on
+    chain.account_nonces[key.ss58_address] = 10
+    assert transfer(pipeline, 1).result(timeout=0)['success'] == False
+    transfer(pipeline, 2)
+    assert chain.pooled_nonces() == [10]
+
+
+def test_dropped_nonce_is_reused_and_later_ones_wait():
+    chain = Chain()
+    pipeline = pipeline_on(chain, timeout=0)
+    futures = [transfer(pipeline, i) for i in range(3)]
+    # the pool drops nonce 0, so 1 and 2 cannot be included
+    data = [d for d, (k, n, h) in chain.pool.items() if n == 0][0]
+    del chain.pool[data]
+    chain.produce_block()
+    pipeline.watch_step()
+    assert futures[0].result(timeout=0)['success'] == False
+    # 1 and 2 are past the timeout too, but still in the pool
+    assert not futures[1].done() and not futures[2].done()
+    # the next extrinsic fills the gap and unblocks them
+    future = transfer(pipeline, 3)
+    chain.produce_block()
+    pipeline.watch_step()
+    assert all([f.result(timeout=0)['success'] for f in [future] + futures[1:]])
+    assert chain.account_nonces[key.ss58_address] == 3
+
+
+def test_watcher_scans_every_skipped_block():
+    chain = Chain()
+    pipeline = pipeline_on(chain, max_blocks_per_step=100)
+    pipeline.watch_step()
+    future = transfer(pipeline, 0)
+    chain.produce_block()
+    for i in range(250):
+        chain.produce_block()
+    for i in range(3):
+        pipeline.watch_step()
+    assert future.result(timeout=0)['block_number'] == 1
+
+
+if __name__ == '__main__':
+    test_nonces_pipeline_within_a_block()
+    test_outdated_nonce_resyncs()
+    test_dropped_nonce_is_reused_and_later_ones_wait()
+    test_watcher_scans_every_skipped_block()
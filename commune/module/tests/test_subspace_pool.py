@@ -0,0 +1,98 @@
+import commune
+import threading
+from commune.modules.subspace.pool import SubstratePool, MetadataCache
+
+
+class Connection:
+    """
+    What the pool needs of a SubstrateInterface: queries, rpc requests and close
+    """
+
+    def __init__(self, opened:list):
+        self.closed = False
+        self.broken = False
+        opened.append(self)
+
+    def query(self, module, storage_function, params=None):
+        if self.broken:
+            raise ConnectionError('socket closed')
+        return params
+
+    def rpc_request(self, method, params):
+        if self.broken:
+            raise ConnectionError('socket closed')
+        return {'result': {}}
+
+    def close(self):
+        self.closed = True
+
+
+def test_threads_share_connections(tmp_path):
+    pool = SubstratePool('ws://node', max_connections=3, cache_region=MetadataCache(str(tmp_path)))
+    opened = []
+    pool.connect = lambda: Connection(opened)
+    errors = []
+    def worker():
+        for i in range(20):
+            with pool as substrate:
+                if substrate.query('SubspaceModule', 'N', [i]) != [i]:
+                    errors.append(i)
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    assert errors == []
+    assert 1 <= len(opened) <= 3
+    # direct calls check a connection out too
+    assert pool.query('SubspaceModule', 'N', [1]) == [1]
+
+
+def test_broken_connection_is_replaced(tmp_path):
+    pool = SubstratePool('ws://node', max_connections=1, cache_region=MetadataCache(str(tmp_path)))
+    opened = []
+    pool.connect = lambda: Connection(opened)
+    with pool as substrate:
+        substrate.broken = True
+    try:
+        with pool as substrate:
+            substrate.query('SubspaceModule', 'N')
+        assert False, 'the broken connection should raise'
+    except ConnectionError:
+        pass
+    assert opened[0].closed
+    # the next checkout connects again, and an error from the node keeps the connection
+    try:
+        with pool as substrate:
+            raise ValueError('runtime error from the node')
+    except ValueError:
+        pass
+    with pool as substrate:
+        assert substrate is opened[1]
+    assert len(opened) == 2
+
+
+def test_idle_connections_are_checked(tmp_path):
+    pool = SubstratePool('ws://node', max_connections=1, health_check_interval=0, cache_region=MetadataCache(str(tmp_path)))
+    opened = []
+    pool.connect = lambda: Connection(opened)
+    with pool as substrate:
+        substrate.broken = True
+    # the stale connection fails its health check and is replaced before use
+    with pool as substrate:
+        assert substrate is opened[1]
+    assert opened[0].closed
+
+
+def test_metadata_cache_survives_processes(tmp_path):
+    MetadataCache(str(tmp_path)).set('METADATA_1', {'pallets': ['SubspaceModule']})
+    # a new process starts with an empty memory cache
+    MetadataCache.memory = {}
+    assert MetadataCache(str(tmp_path)).get('METADATA_1') == {'pallets': ['SubspaceModule']}
+    assert MetadataCache(str(tmp_path)).get('METADATA_2') == None
+
+
+if __name__ == '__main__':
+    import pathlib, tempfile
+    test_threads_share_connections(pathlib.Path(tempfile.mkdtemp()))
+    test_broken_connection_is_replaced(pathlib.Path(tempfile.mkdtemp()))
+    test_idle_connections_are_checked(pathlib.Path(tempfile.mkdtemp()))
+    test_metadata_cache_survives_processes(pathlib.Path(tempfile.mkdtemp()))
@@ -0,0 +1,42 @@
+import commune
+import numpy as np
+import tempfile
+
+
+def test_save_load_round_trip(dtype='int8'):
+    path = tempfile.mkdtemp()
+    vectors = np.random.randn(300, 16).astype(np.float32)
+    store = commune.module('storage.vector')(model=None, dtype=dtype, capacity=8)
+    store.add_vectors([str(i) for i in range(300)], vectors)
+    store.train_index(nlist=4)
+    store.save(path)
+
+    loaded = commune.module('storage.vector')(model=None, path=path)
+    assert len(loaded) == 300 and loaded.keys == store.keys
+    assert np.array_equal(np.asarray(loaded.vectors), store.vectors[:300])
+    assert list(loaded.search(vectors[5], top_k=1, exact=True)) == ['5']
+
+
+def test_save_over_loaded_memmap():
+    # the loaded vectors are a memmap of the file that the next save replaces
+    path = tempfile.mkdtemp()
+    vectors = np.random.randn(1000, 32).astype(np.float32)
+    store = commune.module('storage.vector')(model=None, capacity=1000)
+    store.add_vectors([str(i) for i in range(1000)], vectors)
+    store.save(path)
+
+    loaded = commune.module('storage.vector')(model=None, path=path)
+    assert not loaded.vectors.flags.writeable
+    loaded.save(path)
+    assert list(loaded.search(vectors[3], top_k=1)) == ['3']
+    loaded.add_vector('new', np.ones(32))
+    loaded.save(path)
+
+    reloaded = commune.module('storage.vector')(model=None, path=path)
+    assert len(reloaded) == 1001
+    assert list(reloaded.search(vectors[999], top_k=1)) == ['999']
+
+
+if __name__ == '__main__':
+    test_save_load_round_trip()
+    test_save_over_loaded_memmap()
@@ -1,33 +1,60 @@
 import commune as c
 import time
+import os
+import inspect
+import threading
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
 class FileChangeHandler(FileSystemEventHandler):
-    def __init__(self, module):
+    def __init__(self, module, debounce:float = 0.5):
         super().__init__()
         self.module = module
-
+        self.debounce = debounce
+        self.changes = {} # path -> event type, collected until the files stop changing
+        self.lock = threading.Lock()
+        self.timer = None
 
     def on_any_event(self, event):
         if event.is_directory:
             return
-        if event.event_type in ['created', 'modified', 'deleted']:
-            c.print(f'File change detected: {event.src_path}')
-            c.module_tree(update=True, verbose=True)
+        if event.event_type in ['created', 'modified', 'deleted', 'moved']:
+            with self.lock:
+                self.changes[event.src_path] = event.event_type
+                if getattr(event, 'dest_path', None):
+                    self.changes[event.dest_path] = 'created'
+                # editors write a file in several events, so wait until they settle
+                if self.timer != None:
+                    self.timer.cancel()
+                self.timer = threading.Timer(self.debounce, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            changes, self.changes = self.changes, {}
+            self.timer = None
+        if len(changes) > 0:
+            self.module.on_changes(changes)
 
 class WatchdogModule(c.Module, FileSystemEventHandler):
 
 
 
-    def __init__(self, folder_path:str = c.root_path, run:bool = True ):
+    def __init__(self, folder_path:str = c.root_path, run:bool = True, debounce:float = 0.5, hot_reload:bool = True, network:str = 'local', timeout:int = 10):
         super().__init__()
         self.folder_path = folder_path
+        self.debounce = debounce
+        self.hot_reload = hot_reload
+        self.network = network
+        self.timeout = timeout
         self.observer = None
+        self.tree = c.module_tree()
+        self.module2files = {} # module -> files of its class and the classes it inherits from
         if run:
             self.start_server()
     def start_server(self):
-        event_handler = FileChangeHandler(self)
+        event_handler = FileChangeHandler(self, debounce=self.debounce)
         self.observer = Observer()
         self.observer.schedule(event_handler, self.folder_path, recursive=True)
         self.observer.start()
@@ -37,7 +64,7 @@ class WatchdogModule(c.Module, FileSystemEventHandler):
             sleep_period = 5
             while True:
                 c.print(f'Watching for file changes. {lifetime} seconds elapsed.')
-                
+
                 time.sleep(sleep_period)
                 lifetime += sleep_period
         except KeyboardInterrupt:
@@ -52,3 +79,62 @@ class WatchdogModule(c.Module, FileSystemEventHandler):
 
     def log_file_change(self, message):
         c.print(message)
+
+    def on_changes(self, changes:dict):
+        changes = {p: e for p, e in changes.items() if p.endswith('.py') or p.endswith('.yaml')}
+        if len(changes) == 0:
+            return
+        self.log_file_change(f'File changes detected: {list(changes)}')
+        # only a new, moved or deleted file changes the tree
+        if any(e != 'modified' for e in changes.values()):
+            self.tree = c.module_tree(update=True, verbose=True)
+            self.module2files = {}
+        if self.hot_reload:
+            modified = [p for p, e in changes.items() if e == 'modified' and p.endswith('.py')]
+            for server in self.path2servers(modified):
+                self.reload_server(server, paths=modified)
+
+    def path2modules(self, paths:list) -> list:
+        paths = set(os.path.abspath(p) for p in paths)
+        return [name for name, path in self.tree.items() if os.path.abspath(path) in paths]
+
+    def module_files(self, module:str) -> set:
+        """
+        The files of the module class and of the classes it inherits from, except the core module
+        """
+        if module not in self.module2files:
+            files = set()
+            if module in self.tree:
+                files.add(os.path.abspath(self.tree[module]))
+                try:
+                    for base in c.module(module).__mro__:
+                        if base.__module__ != c.Module.__module__ and base.__module__ != 'builtins':
+                            files.add(os.path.abspath(inspect.getfile(base)))
+                except Exception as e:
+                    self.log_file_change(f'Could not resolve the classes of {module} ({e})')
+            self.module2files[module] = files
+        return self.module2files[module]
+
+    def path2servers(self, paths:list) -> list:
+        """
+        The servers whose module, or a class it inherits from (e.g. vali.text from vali), is in paths
+        """
+        paths = set(os.path.abspath(p) for p in paths)
+        if len(paths) == 0:
+            return []
+        servers = c.servers(network=self.network)
+        return [s for s in servers if len(self.module_files(s.split('::')[0]) & paths) > 0]
+
+    def reload_server(self, server:str, paths:list = None) -> dict:
+        """
+        Reloads the module class inside the running server, restarting the process only if that fails
+        """
+        try:
+            response = c.call(server, 'reload_module', paths=paths, timeout=self.timeout)
+            assert isinstance(response, dict) and response.get('success', False), response
+            self.log_file_change(f'Hot reloaded {server}')
+        except Exception as e:
+            self.log_file_change(f'Hot reload of {server} failed ({e}), restarting it')
+            # only this server, not every server whose name starts with it
+            response = c.restart(server, prefix_match=False)
+        return response
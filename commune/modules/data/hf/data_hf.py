@@ -2,6 +2,9 @@ import commune as c
 import datasets
 from datasets import load_dataset
 from typing import Dict, List
+import numpy as np
+import queue
+import threading
 
 
 
@@ -20,10 +23,14 @@ class DataHF(c.Module):
                 path: str = 'super_glue',
                 name: str =  None,
                 streaming: bool= False,
-                split: str = None):
+                split: str = None,
+                batch_size: int = 32,
+                prefetch: int = 0,
+                shuffle_buffer: int = 1000,
+                seed: int = None):
         config = self.set_config(kwargs=locals())
         self.set_dataset(path=config.path, name=config.name, split=config.split, streaming=config.streaming)
-    
+        self.set_sampler(batch_size=config.batch_size, prefetch=config.prefetch, shuffle_buffer=config.shuffle_buffer, seed=config.seed)
 
         
     def set_dataset(self, path:str, name:str = None, split:str = None, streaming:bool=False):
@@ -70,12 +77,104 @@ class DataHF(c.Module):
         return c.random_int(len(self))
     
         
+    def set_sampler(self, batch_size:int = 32, prefetch:int = 0, shuffle_buffer:int = 1000, seed:int = None):
+        # the callers and the prefetch thread each draw from their own generator
+        caller_seed, prefetch_seed = np.random.SeedSequence(seed).spawn(2)
+        self.rng = np.random.default_rng(caller_seed)
+        self.prefetch_rng = np.random.default_rng(prefetch_seed)
+        self.batch_size = batch_size
+        self.stream_iterator = None
+        self.stream_epoch = 0
+        self.stream_lock = threading.Lock()
+        self.shuffle_buffer = shuffle_buffer
+
+        # keep K batches of batch_size ready in the background
+        self.prefetch_queue = None
+        self.prefetched = [] # samples taken off the queue and not returned yet
+        self.prefetch_lock = threading.Lock()
+        if prefetch > 0:
+            self.prefetch_queue = queue.Queue(maxsize=prefetch)
+            self.prefetch_thread = c.thread(self.prefetch_loop, tag='prefetch')
+
+    def prefetch_loop(self):
+        # when prefetching this thread is the only one reading the stream
+        while self.prefetch_queue != None:
+            try:
+                batch = self.read_batch(batch_size=self.batch_size, rng=self.prefetch_rng)
+            except Exception as e:
+                c.print(f'Error prefetching batch: {e}', color='red')
+                c.sleep(1)
+                continue
+            prefetch_queue = self.prefetch_queue
+            if prefetch_queue != None:
+                prefetch_queue.put(batch)
+
+    def take_prefetched(self, batch_size:int) -> List[dict]:
+        with self.prefetch_lock:
+            while len(self.prefetched) < batch_size:
+                self.prefetched += self.prefetch_queue.get()
+            samples, self.prefetched = self.prefetched[:batch_size], self.prefetched[batch_size:]
+        return samples
+
     def sample(self, idx:int=None, batch_size:int = 1):
+        if idx == None and self.prefetch_queue != None:
+            samples = self.take_prefetched(batch_size)
+            return samples[0] if batch_size == 1 else samples
+        if self.config.streaming:
+            samples = self.sample_stream(batch_size=batch_size)
+            return samples[0] if batch_size == 1 else samples
         if batch_size > 1:
-            return [self.sample() for i in range(batch_size)]
+            return self.sample_batch(batch_size=batch_size)
         idx = self.random_idx() if idx == None else idx
         return self.dataset[idx]
-    
+
+    def sample_batch(self, batch_size:int = None, idx_list:List[int] = None) -> List[dict]:
+        batch_size = batch_size if batch_size else self.batch_size
+        if idx_list == None and self.prefetch_queue != None:
+            return self.take_prefetched(batch_size)
+        return self.read_batch(batch_size=batch_size, idx_list=idx_list)
+
+    def read_batch(self, batch_size:int = None, idx_list:List[int] = None, rng:np.random.Generator = None) -> List[dict]:
+        """
+        Reads a batch of samples with a single arrow read
+        """
+        rng = self.rng if rng == None else rng
+        batch_size = batch_size if batch_size else self.batch_size
+        if self.config.streaming:
+            return self.sample_stream(batch_size=batch_size, rng=rng)
+        if idx_list == None:
+            idx_list = rng.integers(0, len(self), size=batch_size).tolist()
+
+        if hasattr(self.dataset, '__getitems__'):
+            return self.dataset.__getitems__(idx_list)
+
+        # older datasets versions return a dict of columns
+        columns = self.dataset[idx_list]
+        return [{k: v[i] for k,v in columns.items()} for i in range(len(idx_list))]
+
+    def sample_stream(self, batch_size:int = 1, rng:np.random.Generator = None) -> List[dict]:
+        """
+        Samples from a streaming dataset through a shuffle buffer, restarting the stream with a new epoch when it runs out
+        """
+        rng = self.rng if rng == None else rng
+        samples = []
+        with self.stream_lock:
+            while len(samples) < batch_size:
+                if self.stream_iterator == None:
+                    seed = int(rng.integers(0, 2**31))
+                    stream = self.dataset.shuffle(buffer_size=self.shuffle_buffer, seed=seed)
+                    stream.set_epoch(self.stream_epoch)
+                    self.stream_iterator = iter(stream)
+                try:
+                    samples.append(next(self.stream_iterator))
+                except StopIteration:
+                    self.stream_iterator = None
+                    self.stream_epoch += 1
+        return samples
+
+    def shutdown(self):
+        self.prefetch_queue = None
+
 
 
 
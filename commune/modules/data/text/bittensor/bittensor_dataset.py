@@ -25,6 +25,9 @@ import json
 from loguru import logger
 import random
 import os
+import time
+import threading
+from collections import deque
 import torch
 from torch.utils.data.dataloader import DataLoader
 from typing import Optional, Union, Dict, List, Any
@@ -63,7 +66,13 @@ class BittensorDataset(Module):
             background: bool = True,
             min_hash_count : int = 850000,
             loop: Optional['asyncio.loop'] = None ,
-            nest_asyncio: bool = True
+            nest_asyncio: bool = True,
+            ipfs_url: str = None,
+            cache_blocks: bool = True,
+            max_block_cache_size: int = 1000000000,
+            background_refill: bool = True,
+            refill_concurrency: int = 8,
+            sample_timeout: int = 60
             
             ):
 
@@ -76,6 +85,7 @@ class BittensorDataset(Module):
             commune.nest_asyncio()
         
         self.__dict__.update(self.kwargs)
+        self.ipfs_url = ipfs_url if ipfs_url else BittensorDataset.ipfs_url
         
         self.buffer_size = self.batch_size * self.buffer_size
         
@@ -87,7 +97,12 @@ class BittensorDataset(Module):
 
         self.datasets = self.datasets[:self.max_datasets]
         self.fetch_text_tasks = []
-        self.sample_buffer = []
+        self.sample_buffer = deque()
+        self.buffer_lock = threading.Condition()
+        self.refill_thread = None
+        self.closed = False
+        self.block_cache_lock = threading.Lock()
+        self.block_cache_bytes = None # counted on the first write
 
 
         self.save_dataset = save_dataset
@@ -95,7 +110,7 @@ class BittensorDataset(Module):
         self.set_tokenizer(tokenizer=self.tokenizer)
 
         # set the buffer
-        self.set_buffer(buffer_size=buffer_size)
+        self.set_buffer(buffer_size=self.buffer_size)
 
         # TODO: currently the number of batches is inert as this loop runs forever
         self.sample_count = 0
@@ -103,6 +118,8 @@ class BittensorDataset(Module):
 
         self.construct_text_corpus(datasets=self.datasets, load=self.load_dataset, save=self.save_dataset)
 
+        if self.background_refill:
+            self.start_refill()
         
         if download:
             # Build the text corpus by fetching the hashes of the textfiles (Current Heirarchy)
@@ -282,63 +299,87 @@ class BittensorDataset(Module):
                 The size of the sample buffer.
         """
         if not hasattr(self, 'sample_buffer'):
-            self.sample_buffer = []
+            self.sample_buffer = deque()
 
         self.buffer_size = buffer_size 
 
         # If the buffer is smaller than the current buffer, trim it to match the new size.
-        if len(self.sample_buffer) > self.buffer_size:
-            self.sample_buffer = self.sample_buffer[:self.buffer_size]
+        with self.buffer_lock:
+            while len(self.sample_buffer) > self.buffer_size:
+                self.sample_buffer.pop()
+            self.buffer_lock.notify_all()
             
             
     def suggest_samples(self, sample_size:int, loaded_fraction = 1.0):
-        suggest_samples = []
-        suggest_samples += random.sample(self.saved_hashes, int(sample_size * loaded_fraction))
-        return suggest_samples
-    
-    async def async_generate_sample(self)-> List[str]:
-        '''
-        Checks the sample buffer, and builds it if it is empty
-
-        Returns:
-            self.sample_buffer (List[str]): 
-                The sample buffer.
-        '''
-        # See if there is free space, if so, add jobs to fill the free space with samples.
-        buffer_free_space = self.buffer_size - len(self.sample_buffer) 
-                
-        if buffer_free_space > 0  :
-            
-            # Sample the file_metas randomly.
-            sample_cat_params_list = self.suggest_samples(buffer_free_space)
-   
+        # prefer the hashes we have saved, fetching new ones only if there are not enough
+        population = self.saved_hashes if len(self.saved_hashes) >= sample_size else self.all_text_file_metas
+        return random.sample(population, min(int(sample_size * loaded_fraction), len(population)))
 
-            # Build the asyncio jobs.
-            self.fetch_text_tasks += [asyncio.create_task(self.fetch_text(file_meta=sample_cat_params, offset=0, length=self.max_hash_size, load=True, save=False)) for sample_cat_params in sample_cat_params_list]
-            
-            # This currently synchronytes on all of the self.fetch_text_tasks, completing when they all are finished.
-            finished_tasks, running_tasks  = await asyncio.wait(self.fetch_text_tasks) 
-            
-            self.fetch_text_tasks = list(running_tasks)
-            finished_tasks = list(finished_tasks)
-
-            # Add the finished task results into the buffer.
-            for finished_task in finished_tasks:
-                sample = finished_task.result()
-                if sample == None:
-                    continue
-                self.sample_buffer += [sample]
-
-        # Randomly sample the text file from the buffer.
-        random_idx = random.randint(0,len(self.sample_buffer)-1)
-
-        raw_chunk = self.sample_buffer[random_idx]
-
-
-        # Increment the counters.
-        self.sample_count += 1
-        self.batch_count += self.sample_count //  self.batch_size
+    def start_refill(self) -> threading.Thread:
+        if self.refill_thread == None or not self.refill_thread.is_alive():
+            self.refill_thread = threading.Thread(target=self.refill_loop, daemon=True, name='IPFS Refill')
+            self.refill_thread.start()
+        return self.refill_thread
 
+    def refill_loop(self):
+        '''
+        Keeps the sample buffer full in the background, on its own event loop,
+        so the sample path never waits on a fetch unless the buffer is empty.
+        '''
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        while not self.closed:
+            with self.buffer_lock:
+                self.buffer_lock.wait_for(lambda: self.closed or len(self.sample_buffer) < self.buffer_size)
+                buffer_free_space = self.buffer_size - len(self.sample_buffer)
+            if self.closed:
+                break
+            try:
+                added = loop.run_until_complete(self.async_refill(buffer_free_space))
+            except Exception as e:
+                self.print(f'Error refilling the sample buffer {e}', color='red')
+                added = 0
+            if added == 0:
+                time.sleep(1)
+        loop.close()
+
+    async def async_refill(self, buffer_free_space:int) -> int:
+        semaphore = asyncio.Semaphore(self.refill_concurrency)
+        async def fetch(file_meta):
+            async with semaphore:
+                try:
+                    text = await self.fetch_text(file_meta=file_meta, offset=0, length=self.max_hash_size, load=True, save=False)
+                except Exception as e:
+                    return 0
+            if not text:
+                return 0
+            with self.buffer_lock:
+                self.sample_buffer.append(text)
+                self.buffer_lock.notify_all()
+            return 1
+        return sum(await asyncio.gather(*[fetch(file_meta) for file_meta in self.suggest_samples(buffer_free_space)]))
+
+    def generate_sample(self) -> str:
+        '''
+        Returns a random block of min_block_size_bytes from a random text in the sample buffer
+        '''
+        with self.buffer_lock:
+            if len(self.sample_buffer) == 0:
+                self.start_refill()
+                if not self.buffer_lock.wait_for(lambda: len(self.sample_buffer) > 0, timeout=self.sample_timeout):
+                    raise TimeoutError(f'No samples buffered after {self.sample_timeout}s')
+
+            # Randomly sample the text file from the buffer.
+            raw_chunk = self.sample_buffer[random.randint(0, len(self.sample_buffer)-1)]
+
+            # After buffer_calls_per_update batches, rotate out the oldest texts for the refill to replace,
+            # keeping half of the buffer so sampling carries on while it does.
+            self.sample_count += 1
+            if self.sample_count >= self.buffer_calls_per_update * self.batch_size:
+                self.sample_count = 0
+                for _ in range(min(self.buffer_calls_per_update * self.batch_size, len(self.sample_buffer) // 2)):
+                    self.sample_buffer.popleft()
+                self.buffer_lock.notify_all()
 
         if self.min_block_size_bytes < len(raw_chunk):
             start_idx = random.randint(0, len(raw_chunk) - self.min_block_size_bytes)
@@ -346,29 +387,63 @@ class BittensorDataset(Module):
             start_idx = 0
         
         end_idx = start_idx + self.min_block_size_bytes
-        sample = raw_chunk[start_idx:end_idx]
+        return raw_chunk[start_idx:end_idx]
+
+    async def async_generate_sample(self, poll_interval:float = 0.05) -> str:
+        # wait for the refill without blocking the event loop, generate_sample then returns at once
+        deadline = time.time() + self.sample_timeout
+        while len(self.sample_buffer) == 0:
+            self.start_refill()
+            if time.time() > deadline:
+                raise TimeoutError(f'No samples buffered after {self.sample_timeout}s')
+            await asyncio.sleep(poll_interval)
+        return self.generate_sample()
+
+    def pad_words(self, raw_text:str, sequence_length:int) -> str:
+        # the first sequence_length words, left padded with the pad token
+        output = raw_text.split()[:sequence_length]
+        remainder = sequence_length - len(output)
+        if remainder > 0:
+            output = [self.pad_token]*remainder + output 
+        return ' '.join(output)
+
+    def tokenize(self, text:Union[str, List[str]], sequence_length:int) -> torch.Tensor:
+        return self.tokenizer(text, max_length=sequence_length, truncation=True, padding="max_length", return_tensors="pt")["input_ids"]
+
+    def __getitem__(self, idx: Optional[int] = None, sequence_length:int=None, no_tokenizer:bool = None) -> Union[List[str], torch.tensor]:
+        '''
+        Sample from the sample_buffer via self.generate_sample. This returns a random block of text
+        with a size of self.min_block_size_bytes in bytes.
+        Args:
+            idx (int):
+                Sample index of dataset.
+            
+        Returns:
+            output (Union[str, torch.tensor])
+        '''
+        return self.format_sample(self.generate_sample(), sequence_length=sequence_length, no_tokenizer=no_tokenizer)
 
-        if (self.batch_count) >= self.buffer_calls_per_update:
-            self.sample_count = 0 
-            self.sample_buffer = self.sample_buffer[self.buffer_calls_per_update*self.batch_size:]
-            self.batch_count = 0
-        
-        return sample
+    def format_sample(self, raw_text:str, sequence_length:int=None, no_tokenizer:bool = None) -> Union[str, torch.tensor]:
+        sequence_length = sequence_length if sequence_length else self.sequence_length
+        no_tokenizer = no_tokenizer if no_tokenizer else self.no_tokenizer
 
-    def __getitem__(self, idx: Optional[int] = None, *args, **kwargs) -> Union[List[str], torch.tensor]:
-        return asyncio.run(self.__async_getitem__(idx=idx, *args, **kwargs))
+        # If there is no tokenizer specified return text with the seqeunce length being the number of " " split elements.
+        if no_tokenizer:
+            return self.pad_words(raw_text, sequence_length)
+        return self.tokenize(raw_text, sequence_length).to(torch.long).squeeze(0) #  [1,seq_len] -> [seq_len]
 
     def sample(self, batch_size:int=None, sequence_length:int = None, no_tokenizer:bool = None, task:str = None):
         batch_size = batch_size if batch_size else self.batch_size
         sequence_length = sequence_length if sequence_length else self.sequence_length
         no_tokenizer = no_tokenizer if no_tokenizer else self.no_tokenizer
-        getitem_jobs = asyncio.gather(*[self.__async_getitem__(sequence_length=sequence_length, no_tokenizer=True) for i in range(batch_size)])
-        sample_text = asyncio.run(getitem_jobs)
+        sample_text = [self.pad_words(self.generate_sample(), sequence_length) for i in range(batch_size)]
         output = {}
+        input_ids = None
         if no_tokenizer:
             output['text'] =sample_text
         else:
-            output['input_ids'] =self.tokenizer(sample_text, max_length=sequence_length, truncation=True, padding="max_length", return_tensors="pt")["input_ids"]
+            # one tokenizer call for the whole batch
+            output['input_ids'] = input_ids = self.tokenize(sample_text, sequence_length)
         
         # include the targets for causal language modeling
         if task == True:
@@ -376,49 +451,14 @@ class BittensorDataset(Module):
         if task == None:
             pass
         elif task in ['causallm']:
-            output['targets'] = self.tokenizer(sample_text, max_length=sequence_length, truncation=True, padding="max_length", return_tensors="pt")["input_ids"]
+            output['targets'] = input_ids.clone() if input_ids is not None else self.tokenize(sample_text, sequence_length)
             
         return output
 
     __next__ = sample
     async def __async_getitem__(self, idx: Optional[int] = None, sequence_length:int=None, no_tokenizer:bool = None) -> Union[List[str], torch.tensor]:
-        '''
-        Sample from the sample_buffer via self.async_generate_sample. This fetches a random block of text
-        with a size of self.min_block_size_bytes in bytes.
-        Args:
-            idx (int):
-                Sample index of dataset.
-            
-        Returns:
-            output (Union[str, torch.tensor])
-        '''
-        sequence_length = sequence_length if sequence_length else self.sequence_length
-        no_tokenizer = no_tokenizer if no_tokenizer else self.no_tokenizer
-
-        # only sample if the buffer is less than the buffer_size
-
         raw_text = await self.async_generate_sample()
-
-        # Decode the bytes into a string.
-
-
-        # If there is no tokenizer specified return text with the seqeunce length being the number of " " split elements.
-
-        if no_tokenizer:
-            raw_text =raw_text.split()
-            output = raw_text[:sequence_length]
-            remainder = sequence_length - len(output)
-
-            if remainder > 0:
-                # left side padding
-                output = [self.pad_token]*remainder + output 
-
-            output = ' '.join(output)
-        else:
-            output = self.tokenizer(raw_text, max_length=sequence_length, truncation=True, padding="max_length", return_tensors="pt")["input_ids"]
-            output = output.to(torch.long).squeeze(0) #  [1,seq_len] -> [seq_len]
-
-        return output
+        return self.format_sample(raw_text, sequence_length=sequence_length, no_tokenizer=no_tokenizer)
     
     
     async def get_dataset_hashes(self)-> List[dict]:
@@ -619,20 +659,85 @@ class BittensorDataset(Module):
         if 'text'in response:
             return response['text']
         
-        else:
-            #   print(f'Fetching {cid}')
+        # blocks are cached by cid, which is the hash of their content
+        cacheable = self.cache_blocks and offset == 0
+        response = self.get_block(cid, length=length) if cacheable and load else None
+        if response == None:
             response  = await self.cat(cid=cid, offset=offset, length=length)
+            if cacheable:
+                self.put_block(cid, response, length=length)
+        try:
+            # decode the response.
+            response = response.decode()
+        except UnicodeDecodeError as e:
+            # fixes the issue with the ipfs cat endpoint returning a non utf-8 encoded string.
+            response = str(response[2:-1])
+        if save:
+            file_meta['text'] = response
+            self.put_json(path=path, data= file_meta)
+    
+        return response
+
+    def block_path(self, cid:str, length:int = None) -> str:
+        # a whole block is stored under its cid, the first length bytes of a larger one under cid.length
+        name = cid if length == None else f'{cid}.{length}'
+        return self.resolve_path(f'blocks/{cid[-2:]}/{name}')
+
+    def get_block(self, cid:str, length:int = None) -> Optional[bytes]:
+        for path in [self.block_path(cid), self.block_path(cid, length=length)]:
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            # the mtime orders the blocks for eviction, least recently used first
+            os.utime(path)
+            return data if length == None else data[:length]
+        return None
+
+    def put_block(self, cid:str, data:bytes, length:int = None) -> str:
+        # fewer bytes than asked for means we have the whole block, else only its first length bytes
+        path = self.block_path(cid, length=None if length == None or len(data) < length else length)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a tmp file and rename, so a reader never sees a partial block
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self.block_cache_lock:
+            if self.block_cache_bytes == None:
+                self.block_cache_bytes = sum([size for path, size, mtime in self.cached_blocks()])
+            else:
+                self.block_cache_bytes += len(data)
+            if self.block_cache_bytes > self.max_block_cache_size:
+                self.evict_blocks()
+        return path
+
+    def cached_blocks(self) -> List[tuple]:
+        blocks = []
+        for root, dirs, files in os.walk(self.resolve_path('blocks')):
+            for file in files:
+                if not file.endswith('.tmp'):
+                    try:
+                        stat = os.stat(os.path.join(root, file))
+                    except FileNotFoundError:
+                        continue
+                    blocks.append((os.path.join(root, file), stat.st_size, stat.st_mtime))
+        return blocks
+
+    def evict_blocks(self, target:float = 0.9):
+        # drop the least recently used blocks down to target of max_block_cache_size, so eviction is not on every write
+        blocks = sorted(self.cached_blocks(), key=lambda block: block[2])
+        total = sum([size for path, size, mtime in blocks])
+        for path, size, mtime in blocks:
+            if total <= self.max_block_cache_size * target:
+                break
             try:
-                # decode the response.
-                response = response.decode()
-            except UnicodeDecodeError as e:
-                # fixes the issue with the ipfs cat endpoint returning a non utf-8 encoded string.
-                response = str(response[2:-1])
-            if save:
-                file_meta['text'] = response
-                self.put_json(path=path, data= file_meta)
-        
-            return response
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.block_cache_bytes = total
     
     
     
@@ -660,9 +765,10 @@ class BittensorDataset(Module):
         headers = headers if headers else {}
         
         
-        params = dict(arg=cid, offset=int(offset),lenght=int(length))
+        params = dict(arg=cid, offset=int(offset),length=int(length))
         headers = {}
-        response = await self.api_post('cat', params=params, headers=headers, chunk_size=10000000, num_chunks=1)
+        # read to the end (or length bytes), a single chunk is only what has arrived so far
+        response = await self.api_post('cat', params=params, headers=headers, chunk_size=1000000, max_bytes=int(length))
         
 
         return response
@@ -740,6 +846,7 @@ class BittensorDataset(Module):
                     content_type:Optional[str] = None, 
                     chunk_size:Optional[int] = 1024, 
                     num_chunks:Optional[int] = None, 
+                    max_bytes:Optional[int] = None, 
                     sock_connect:Optional[int]=2, 
                     sock_read:Optional[int]=2) -> Union[Dict, 'aiohttp.Response', bytes]:
         '''
@@ -760,6 +867,8 @@ class BittensorDataset(Module):
                 Chunk size of streaming endpoint.
             num_chunks (int, optional):
                 Number of chunks to stream.
+            max_bytes (int, optional):
+                Stream the body until it ends or max_bytes have been read.
             sock_connect (int, optional):
                 The timeout for connecting to a socket.
             sock_read (int, optional):
@@ -784,8 +893,15 @@ class BittensorDataset(Module):
                 else:
                     return_result = res
 
+                if max_bytes:
+                    return_result = b''
+                    async for data in res.content.iter_chunked(chunk_size):
+                        return_result += data
+                        if len(return_result) >= max_bytes:
+                            break
+                    return_result = return_result[:max_bytes]
                 # If num_chunks is not None, iterate through the chunks of chunk_size.
-                if num_chunks:
+                elif num_chunks:
                     return_result = b''
                     async for data in res.content.iter_chunked(chunk_size):
                         return_result += data
@@ -869,6 +985,11 @@ class BittensorDataset(Module):
             self.download_thread.join()
 
     def close(self) -> None:
+        # Stop the refill thread.
+        self.closed = True
+        if hasattr(self, 'buffer_lock'):
+            with self.buffer_lock:
+                self.buffer_lock.notify_all()
         # Cancel sample tasks.
         if len(self.fetch_text_tasks)> 0:
             for t in self.fetch_text_tasks:
@@ -1,43 +1,84 @@
 import commune as c
+import os
+import random
+from collections import OrderedDict
 
 class DataFolder(c.Module):
-    def __init__(self, folder_path: str = './', suffix: str = '.py'):
+    def __init__(self, folder_path: str = './', suffix: str = '.py', cache_size:int = 0):
         config = self.set_config(kwargs=locals())
         self.folder_path = self.resolve_path(config.folder_path)
-        self.filepaths = sorted([f for f in self.walk(self.folder_path) if f.endswith('.py')])
-
-    def random_idx(self):
+        self.set_index(self.folder_path, suffix=config.suffix)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+
+    def set_index(self, folder_path:str, suffix:str='.py'):
+        """
+        indexes the corpus once at startup so that sampling never has to read a file to check its length
+        """
+        self.filepaths = sorted([f for f in self.walk(folder_path) if f.endswith(suffix)])
+        self.filesizes = [os.path.getsize(f) for f in self.filepaths]
+        # window size -> idxs of files that are large enough for the window
+        self.eligible_idxs = {}
+        return {'n': len(self.filepaths), 'size': sum(self.filesizes)}
+
+    def get_eligible_idxs(self, window_size:int):
+        if window_size not in self.eligible_idxs:
+            self.eligible_idxs[window_size] = [i for i, size in enumerate(self.filesizes) if size >= window_size]
+        eligible_idxs = self.eligible_idxs[window_size]
+        assert len(eligible_idxs) > 0, f'No files in {self.folder_path} with at least {window_size} chars'
+        return eligible_idxs
+
+    def random_idx(self, window_size:int = 0):
+        if window_size > 0:
+            return random.choice(self.get_eligible_idxs(window_size))
         return self.random_int(0, len(self.filepaths)-1)
+
+    def read_bytes(self, idx:int, start_index:int, size:int) -> bytes:
+        """
+        reads bytes [start_index, start_index + size) from the file at idx with a positioned read, 
+        using the lru cache of whole file contents if it is enabled (cache_size > 0)
+        """
+        filepath = self.filepaths[idx]
+        if self.cache_size > 0:
+            if filepath in self.cache:
+                self.cache.move_to_end(filepath)
+            else:
+                with open(filepath, 'rb') as f:
+                    self.cache[filepath] = f.read()
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            window = self.cache[filepath][start_index:start_index + size]
+        else:
+            fd = os.open(filepath, os.O_RDONLY)
+            try:
+                window = os.pread(fd, size, start_index)
+            finally:
+                os.close(fd)
+        return window
+
+    def read_window(self, idx:int, start_index:int, size:int) -> str:
+        return self.read_bytes(idx, start_index, size).decode(errors='ignore')
     
     def sample(self, idx=None, 
                input_chars:int = 500,
                output_chars: int = 500,
-            w   start_index: int = None,
+               start_index: int = None,
                 real_prob:float=0.5):
-        
+        window_size = input_chars + output_chars
         if idx == None:
-            while True:
-                idx = self.random_idx()
-                filepath =  self.filepaths[idx]
-                file_text = c.get_text(filepath)
-                if len(file_text) >= input_chars + output_chars:
-                    break
-                else:
-                    idx = None
-        else:
-            filepath =  self.filepaths[idx]
-            file_text = c.get_text(filepath)
+            idx = self.random_idx(window_size)
+        filepath =  self.filepaths[idx]
 
         if start_index == None:
-            start_index = c.random_int(0, len(file_text) - input_chars - output_chars )
+            start_index = c.random_int(0, max(self.filesizes[idx] - window_size, 0))
 
         #   we need to make sure that the input and output are not the same
-        input_bounds = [start_index, start_index + input_chars]
-        output_bounds = [start_index + input_chars, start_index + input_chars + output_chars]
+        # offsets are in bytes, so split the raw window before decoding it
+        window = self.read_bytes(idx, start_index, window_size)
         
         sample = {
-                'input_text': file_text[input_bounds[0]:input_bounds[1]], 
-                'output_text': file_text[output_bounds[0]:output_bounds[1]], 
+                'input_text': window[:input_chars].decode(errors='ignore'), 
+                'output_text': window[input_chars:].decode(errors='ignore'), 
                 'filepath': filepath,
                 'idx': idx,
                 'start_index': start_index,
@@ -51,18 +92,22 @@ class DataFolder(c.Module):
 
         sample['real'] = int(real)
 
-        #  then we need to sample a different file
+        #  then we need to sample the output from a different file
         if sample['real'] == 0 :
-            other_sample = self.sample( input_chars=input_chars, real_prob = 1, output_chars=output_chars)
-            sample['output_text'] = other_sample['output_text']
+            other_idx = self.random_idx(output_chars)
+            other_start_index = c.random_int(0, self.filesizes[other_idx] - output_chars)
+            sample['output_text'] = self.read_window(other_idx, other_start_index, output_chars)
     
         return sample
 
 
     def test(self, n=100):
-        sample = self.sample()
-        msg = {'samples_per_second': i / (c.time() - t)}
+        t = c.time()
+        for i in range(n):
+            sample = self.sample()
+        msg = {'samples_per_second': n / (c.time() - t)}
         c.print(msg)
+        return msg
 
     @classmethod
     def validate(cls, *objs):
@@ -8,6 +8,7 @@ import threading
 import queue
 import os
 import torch
+import numpy as np
 
 
 class Pile(commune.Module):
@@ -21,8 +22,12 @@ class Pile(commune.Module):
         config = self.set_config(config)
         self.url = self.config.url
         self.set_shards(config.shards)
-        self.set_tokenizer(config.tokenizer)
-        self.start_text_generator()
+        if config.mmap:
+            # serve windows from pre-tokenized shards, no tokenizer needed
+            self.set_token_shards(config.shards, split=config.split)
+        else:
+            self.set_tokenizer(config.tokenizer)
+            self.start_text_generator()
     
     
     def set_shards(self, shards):
@@ -103,6 +108,9 @@ class Pile(commune.Module):
         with open(path, 'r') as f:
             # Move the file pointer to the starting position
             f.seek(start_pos)
+            if start_pos > 0:
+                # skip the partial line we landed in
+                f.readline()
             cnt = 0
             for line in f:
                 # print(line)
@@ -148,6 +156,7 @@ class Pile(commune.Module):
 
     def shutdown(self, wait=True):
         self.stop_threads = True
+        self.token_shards = []
         # if wait:
         #     for t in self.threads:
         #         try:
@@ -159,6 +168,8 @@ class Pile(commune.Module):
         return self.queue.get()
     
     def sample(self, batch_size:int=32, sequence_length:int=256, idx_list:List[int] = None, tokenize:bool= True)->dict:
+        if self.config.mmap:
+            return self.sample_tokens(batch_size=batch_size, sequence_length=sequence_length, tokenize=tokenize)
         
         sample_dict = {'text': [self.sample_text() for i in range(batch_size)]}
             
@@ -168,6 +179,124 @@ class Pile(commune.Module):
         return sample_dict
     
     forward = sample
+
+
+    ############ PRE-TOKENIZED SHARDS ###############
+
+    @classmethod
+    def get_token_shard_path(cls, shard:int, split:str='train') -> str:
+        filename = f'{shard}' if shard >= 10 else f'0{shard}'
+        return cls.resolve_path(f'tokens/{split}/{filename}')
+
+    @classmethod
+    def token_shard_exists(cls, shard:int, split:str='train') -> bool:
+        path = cls.get_token_shard_path(shard, split)
+        return os.path.exists(path + '.meta.json')
+
+    @classmethod
+    def tokenize_shard(cls, 
+                       shard:int = 1,
+                       split:str = 'train',
+                       tokenizer:str = None,
+                       batch_size:int = 1000,
+                       refresh:bool = False) -> dict:
+        '''
+        Tokenizes a jsonl shard once into a flat token file ({path}.bin),
+        a document offsets index ({path}.idx.npy) and a meta file ({path}.meta.json)
+        '''
+        from transformers import AutoTokenizer
+        tokenizer = tokenizer if tokenizer else cls.config().tokenizer
+        path = cls.get_token_shard_path(shard, split)
+        if cls.token_shard_exists(shard, split) and not refresh:
+            cls.print(f'THE PILE: token shard {shard} for split {split} exists', color='yellow')
+            return cls.get_json(path + '.meta.json')
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tokenizer_name = tokenizer
+        tokenizer = AutoTokenizer.from_pretrained(tokenizer_name, use_fast=True)
+        dtype = np.uint16 if len(tokenizer) <= np.iinfo(np.uint16).max + 1 else np.uint32
+        eos_token_id = tokenizer.eos_token_id
+
+        offsets = [0]
+        num_tokens = 0
+        
+        def write_batch(texts, f):
+            nonlocal num_tokens
+            for ids in tokenizer(texts, add_special_tokens=False)['input_ids']:
+                if eos_token_id != None:
+                    ids = ids + [eos_token_id]
+                np.asarray(ids, dtype=dtype).tofile(f)
+                num_tokens += len(ids)
+                offsets.append(num_tokens)
+
+        shard_path = cls.get_shard_path(shard=shard, split=split)
+        # write to a tmp file so a crashed run never leaves a partial shard behind
+        with open(shard_path, 'r') as src, open(path + '.bin.tmp', 'wb') as f:
+            texts = []
+            for line in src:
+                texts.append(json.loads(line)['text'])
+                if len(texts) >= batch_size:
+                    write_batch(texts, f)
+                    texts = []
+            if len(texts) > 0:
+                write_batch(texts, f)
+
+        os.replace(path + '.bin.tmp', path + '.bin')
+        np.save(path + '.idx.npy', np.asarray(offsets, dtype=np.int64))
+        meta = {
+            'shard': shard,
+            'split': split,
+            'tokenizer': tokenizer_name,
+            'dtype': np.dtype(dtype).name,
+            'num_tokens': num_tokens,
+            'num_docs': len(offsets) - 1,
+        }
+        cls.put_json(path + '.meta.json', meta)
+        return meta
+
+    @classmethod
+    def tokenize_shards(cls, shards:List[int] = 29, split:str='train', **kwargs) -> List[dict]:
+        shards = cls.resolve_shards(shards)
+        return [cls.tokenize_shard(shard=s, split=split, **kwargs) for s in shards if cls.shard_exists(s, split)]
+
+    def set_token_shards(self, shards:List[int], split:str='train'):
+        shards = self.resolve_shards(shards)
+        self.token_shards = []
+        for s in shards:
+            if not self.token_shard_exists(s, split):
+                continue
+            path = self.get_token_shard_path(s, split)
+            meta = self.get_json(path + '.meta.json')
+            tokens = np.memmap(path + '.bin', dtype=np.dtype(meta['dtype']), mode='r', shape=(meta['num_tokens'],))
+            self.token_shards.append(tokens)
+
+        assert len(self.token_shards) > 0, f'no token shards found for split {split}, run tokenize_shard first'
+        # sample shards proportionally to their size so every token is equally likely
+        shard_sizes = np.array([len(t) for t in self.token_shards], dtype=np.float64)
+        self.token_shard_weights = shard_sizes / shard_sizes.sum()
+        return self.token_shards
+
+    def sample_tokens(self, batch_size:int=32, sequence_length:int=256, tokenize:bool=True) -> dict:
+        '''
+        Reads random contiguous windows of sequence_length tokens from the memory mapped shards.
+        '''
+        shard_idxs = np.random.choice(len(self.token_shards), size=batch_size, p=self.token_shard_weights)
+        input_ids = np.zeros((batch_size, sequence_length), dtype=np.int64)
+        attention_mask = np.zeros((batch_size, sequence_length), dtype=np.int64)
+        for i, shard_idx in enumerate(shard_idxs):
+            tokens = self.token_shards[shard_idx]
+            start = np.random.randint(0, max(len(tokens) - sequence_length, 0) + 1)
+            window = tokens[start:start+sequence_length]
+            input_ids[i, :len(window)] = window
+            attention_mask[i, :len(window)] = 1
+
+        if not tokenize:
+            return {'input_ids': input_ids.tolist()}
+
+        return dict(
+            input_ids= torch.from_numpy(input_ids).to(self.device),
+            attention_mask= torch.from_numpy(attention_mask).to(self.device)
+        )
     
     
     def tokenize(self, text: str = 'Whadup',
@@ -86,7 +86,7 @@ class Task(c.Module):
 
         self.status = 'running'
         try:
-            c.print(f'Calling {self.fn}', self.kwargs)
+            c.log_event('debug', 'task', fn=getattr(self.fn, '__name__', self.fn), kwargs=lambda: list(self.kwargs.keys()))
             data = self.fn(*self.args, **self.kwargs)
             
             self.status = 'done'
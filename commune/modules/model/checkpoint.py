@@ -0,0 +1,217 @@
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Any, Dict, List, Optional
+import torch
+from torch import nn
+import commune as c
+
+
+class Checkpointer:
+    """
+    Sharded safetensors checkpoints for a model, its optimizer and config.
+
+    A save copies the tensors to cpu (the only part that blocks the caller) and writes the shards
+    on a background thread. manifest.json maps every tensor to its shard and is replaced atomically
+    once all shards are on disk, so a crash mid save leaves the previous checkpoint intact.
+    Tensors that were not modified in place since the last save (same storage, same torch version
+    counter) keep pointing at their old shard. Loading reads the shards through safetensors' mmap
+    one tensor at a time, copying each straight into the live parameter.
+    """
+    manifest_name = 'manifest.json'
+
+    def __init__(self, path:str, max_shard_size:int = 2 * 1024**3, background:bool = True):
+        self.path = path
+        self.shard_dir = os.path.join(path, 'shards')
+        self.max_shard_size = max_shard_size
+        self.background = background
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='checkpoint')
+        self.pending = None
+        self.saved_versions = {} # tensor name -> (data_ptr, _version) when it was last written
+        self.manifest = self.read_manifest()
+
+    def read_manifest(self) -> Optional[dict]:
+        path = os.path.join(self.path, self.manifest_name)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def exists(self) -> bool:
+        return self.read_manifest() != None
+
+    def wait(self, timeout:float = None) -> Optional[dict]:
+        """
+        Waits for the save in flight (if any) and returns its manifest
+        """
+        if self.pending != None:
+            return self.pending.result(timeout=timeout)
+        return self.manifest
+
+    ############ SAVE LAND ###############
+
+    def save(self,
+             model:nn.Module = None,
+             optimizer:'torch.optim.Optimizer' = None,
+             config:dict = None,
+             keys:List[str] = None,
+             trainable_only:bool = True,
+             incremental:bool = True) -> Future:
+        """
+        Snapshots the state and writes it in the background, returns a future of the new manifest
+        keys: which of model, optimizer and config to save, the others carry over from the last save
+        trainable_only: only save parameters with requires_grad
+        incremental: only write the tensors that changed since the last save
+        """
+        keys = ['model', 'optimizer', 'config'] if keys == None else keys
+        # at most one snapshot in memory, and saves land in order
+        self.wait()
+        previous = self.manifest or {}
+        model_tensors, reused, versions = {}, {}, {}
+        if 'model' in keys and model != None:
+            trainable = {name for name, p in model.named_parameters() if p.requires_grad}
+            previous_model = previous.get('model', {})
+            for name, tensor in model.state_dict(keep_vars=True).items():
+                if trainable_only and name not in trainable:
+                    continue
+                version = (tensor.data_ptr(), tensor._version)
+                if incremental and name in previous_model and self.saved_versions.get(name) == version:
+                    reused[name] = previous_model[name]
+                else:
+                    model_tensors[name] = self.snapshot_tensor(tensor)
+                    versions[name] = version
+        else:
+            reused = dict(previous.get('model', {}))
+        optimizer_state = None
+        if 'optimizer' in keys and optimizer != None:
+            optimizer_state = self.flatten_optimizer(optimizer.state_dict())
+        config = c.munch2dict(config) if 'config' in keys and config != None else previous.get('config')
+        version = previous.get('version', -1) + 1
+
+        job = lambda: self.write(version, model_tensors, reused, versions, optimizer_state, config, previous)
+        if self.background:
+            self.pending = self.executor.submit(job)
+        else:
+            self.pending = Future()
+            self.pending.set_result(job())
+        return self.pending
+
+    def snapshot_tensor(self, tensor:torch.Tensor) -> torch.Tensor:
+        return tensor.detach().to('cpu', copy=True).contiguous()
+
+    def flatten_optimizer(self, state_dict:dict):
+        # tensors go to the shards, everything else (param groups, python scalars) to the manifest
+        tensors, state = {}, {}
+        for idx, param_state in state_dict['state'].items():
+            state[str(idx)] = {}
+            for k, v in param_state.items():
+                if torch.is_tensor(v):
+                    tensors[f'{idx}.{k}'] = self.snapshot_tensor(v)
+                else:
+                    state[str(idx)][k] = v
+        return tensors, {'state': state, 'param_groups': state_dict['param_groups']}
+
+    def shards(self, tensors:Dict[str, torch.Tensor]) -> List[Dict[str, torch.Tensor]]:
+        shards, shard, shard_size = [], {}, 0
+        for name, tensor in tensors.items():
+            size = tensor.numel() * tensor.element_size()
+            if len(shard) > 0 and shard_size + size > self.max_shard_size:
+                shards.append(shard)
+                shard, shard_size = {}, 0
+            shard[name] = tensor
+            shard_size += size
+        if len(shard) > 0:
+            shards.append(shard)
+        return shards
+
+    def write_shards(self, tensors:Dict[str, torch.Tensor], prefix:str) -> Dict[str, str]:
+        from safetensors.torch import save_file
+        os.makedirs(self.shard_dir, exist_ok=True)
+        tensor2file = {}
+        shards = self.shards(tensors)
+        for i, shard in enumerate(shards):
+            filename = f'{prefix}-{i+1:05d}-of-{len(shards):05d}.safetensors'
+            path = os.path.join(self.shard_dir, filename)
+            save_file(shard, path)
+            with open(path, 'rb') as f:
+                os.fsync(f.fileno())
+            tensor2file.update({name: filename for name in shard})
+        return tensor2file
+
+    def write(self, version:int, model_tensors:dict, reused:dict, versions:dict, optimizer_state, config:dict, previous:dict) -> dict:
+        t = time.time()
+        manifest = {'version': version, 'timestamp': t, 'config': config}
+        manifest['model'] = {**reused, **self.write_shards(model_tensors, prefix=f'{version}-model')}
+        if optimizer_state != None:
+            tensors, meta = optimizer_state
+            manifest['optimizer'] = {**meta, 'files': self.write_shards(tensors, prefix=f'{version}-optimizer')}
+        else:
+            manifest['optimizer'] = previous.get('optimizer')
+
+        # the rename commits the checkpoint
+        path = os.path.join(self.path, self.manifest_name)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        self.manifest = manifest
+        self.saved_versions.update(versions)
+        self.remove_unused_shards(manifest)
+        c.print(f'Saved checkpoint {version} ({len(model_tensors)} tensors written, {len(reused)} reused) in {time.time() - t:.2f}s')
+        return manifest
+
+    def remove_unused_shards(self, manifest:dict):
+        used = set(manifest['model'].values())
+        if manifest.get('optimizer') != None:
+            used.update(manifest['optimizer']['files'].values())
+        for filename in os.listdir(self.shard_dir):
+            if filename not in used:
+                os.remove(os.path.join(self.shard_dir, filename))
+
+    ############ LOAD LAND ###############
+
+    def load(self, model:nn.Module = None, optimizer:'torch.optim.Optimizer' = None, strict:bool = False) -> Optional[dict]:
+        """
+        Loads the last committed checkpoint into the model and optimizer in place, returns the manifest
+        """
+        from safetensors import safe_open
+        self.wait()
+        manifest = self.read_manifest()
+        if manifest == None:
+            return None
+
+        if model != None:
+            targets = model.state_dict(keep_vars=True)
+            missing = [name for name in manifest['model'] if name not in targets]
+            assert not strict or len(missing) == 0, f'Checkpoint tensors missing from the model: {missing}'
+            file2names = {}
+            for name, filename in manifest['model'].items():
+                if name in targets:
+                    file2names.setdefault(filename, []).append(name)
+            with torch.no_grad():
+                for filename, names in file2names.items():
+                    device = str(targets[names[0]].device)
+                    with safe_open(os.path.join(self.shard_dir, filename), framework='pt', device=device) as f:
+                        for name in names:
+                            target = targets[name]
+                            target.copy_(f.get_tensor(name))
+                            self.saved_versions[name] = (target.data_ptr(), target._version)
+
+        if optimizer != None and manifest.get('optimizer') != None:
+            tensors = {}
+            for filename in set(manifest['optimizer']['files'].values()):
+                with safe_open(os.path.join(self.shard_dir, filename), framework='pt', device='cpu') as f:
+                    tensors.update({name: f.get_tensor(name) for name in f.keys()})
+            state = {int(idx): dict(param_state) for idx, param_state in manifest['optimizer']['state'].items()}
+            for name, tensor in tensors.items():
+                idx, k = name.split('.', 1)
+                state.setdefault(int(idx), {})[k] = tensor
+            # load_state_dict moves the state onto the device of each param
+            optimizer.load_state_dict({'state': state, 'param_groups': manifest['optimizer']['param_groups']})
+
+        self.manifest = manifest
+        return manifest
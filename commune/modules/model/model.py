@@ -1,10 +1,14 @@
 import os
+import time
+from collections import deque
+from contextlib import nullcontext
 from typing import Union, Optional
 from typing import *
 import torch
 import glob
 from torch import nn
 import commune as c
+from commune.modules.model.checkpoint import Checkpointer
 
  
 """
@@ -14,6 +18,8 @@ Examples fdef
 
 """
 class Model( nn.Module, c.Module):
+    inference = False # see set_inference
+    profile = False # see set_profile
 
     def __init__(self,
                  config = None,
@@ -21,7 +27,7 @@ class Model( nn.Module, c.Module):
                 ):
         
         
-        self.init_model(self)
+        self.init_model()
         # sets to self.config (with kwargs injected)
         config = self.set_config(config, kwargs=kwargs)
 
@@ -68,44 +74,118 @@ class Model( nn.Module, c.Module):
     set_learning_rate = set_lr
         
     def forward(self,  **kwargs) -> Union[Dict, torch.Tensor]:
-        # import ipdb; ipdb.set_trace()
         no_grad = kwargs.pop('no_grad', True)
         autocast = kwargs.pop('autocast', True)
-        empty_cache = kwargs.pop('empty_cache', True)
+        empty_cache = kwargs.pop('empty_cache', False)
         #should the model learn from the input in this forward pass
         train = kwargs['train'] = kwargs.get('train', False)
 
+        if self.inference and not train:
+            return self.inference_forward(**kwargs)
+
         # set the model to train mode
         if train:
             no_grad = False
             if self.training == False:
                 self.train()
-                self.training = True
         else:
             if self.training == True:
                 self.eval()
             no_grad = True
-            
-            
-        if no_grad:
-            with torch.no_grad():
-                if autocast: 
-                    with torch.cuda.amp.autocast():
-                        result = self._forward(**kwargs)
-                else:
-                    result = self._forward(**kwargs)
-        else:
-            if autocast:
-                with torch.cuda.amp.autocast():
-                    result = self._forward(**kwargs)
-            else:
-                result = self._forward(**kwargs)
-        
+
+        # autocast only does anything on cuda
+        autocast = autocast and torch.cuda.is_available()
+        with torch.no_grad() if no_grad else nullcontext():
+            with torch.cuda.amp.autocast() if autocast else nullcontext():
+                result = self.profile_call(self._forward, **kwargs) if self.profile else self._forward(**kwargs)
         
+        # flushing the allocator cache is slow and global, so only on request
         if empty_cache:
             torch.cuda.empty_cache()
         return result
 
+    def set_inference(self, inference:bool = True, compile:bool = False) -> Dict[str, bool]:
+        """
+        Switches forward to the inference fast path: eval mode once, torch.inference_mode per call,
+        no per call mode switching, autocast or cache flushes. compile wraps _forward with
+        torch.compile (torch >= 2), falling back to eager if it fails.
+        """
+        self.inference = inference
+        self.inference_fn = self._forward
+        self.compiled = False
+        if inference:
+            self.eval()
+            if compile:
+                if hasattr(torch, 'compile'):
+                    self.inference_fn = torch.compile(self._forward)
+                    self.compiled = True
+                else:
+                    self.print(f'torch {torch.__version__} has no torch.compile, running eager', color='yellow')
+        return {'inference': self.inference, 'compiled': self.compiled}
+
+    def inference_forward(self, **kwargs):
+        # a forward(train=True) since set_inference leaves the model in train mode
+        if self.training:
+            self.eval()
+        with torch.inference_mode():
+            try:
+                if self.profile:
+                    return self.profile_call(self.inference_fn, **kwargs)
+                return self.inference_fn(**kwargs)
+            except Exception as e:
+                if not self.compiled:
+                    raise e
+                self.print(f'Compiled forward failed ({e}), running eager', color='red')
+                self.inference_fn, self.compiled = self._forward, False
+                return self.inference_forward(**kwargs)
+
+    def set_profile(self, profile:bool = True, max_stats:int = 1000, hooks:List[Callable] = None):
+        """
+        Records the latency and memory of every forward in self.forward_stats, calling each hook
+        with the record. On gpu that is the cuda allocator peak of the call (peak_memory), on cpu
+        the change in the rss of the process over the call (rss_delta), as cpu has no per call peak.
+        """
+        self.profile = profile
+        self.forward_stats = deque(maxlen=max_stats)
+        self.profile_hooks = hooks if hooks != None else []
+        if not torch.cuda.is_available():
+            import psutil
+            self.process = psutil.Process()
+        return {'profile': self.profile}
+
+    def profile_call(self, fn:Callable, **kwargs):
+        cuda = torch.cuda.is_available()
+        if cuda:
+            torch.cuda.reset_peak_memory_stats()
+        else:
+            rss = self.process.memory_info().rss
+        t = time.perf_counter()
+        result = fn(**kwargs)
+        if cuda:
+            torch.cuda.synchronize()
+            stats = {'latency': time.perf_counter() - t, 'peak_memory': torch.cuda.max_memory_allocated()}
+        else:
+            stats = {'latency': time.perf_counter() - t, 'rss_delta': self.process.memory_info().rss - rss}
+        stats['timestamp'] = time.time()
+        self.forward_stats.append(stats)
+        for hook in self.profile_hooks:
+            hook(stats)
+        return result
+
+    def forward_profile(self) -> Dict[str, float]:
+        latencies = sorted(s['latency'] for s in self.forward_stats)
+        if len(latencies) == 0:
+            return {}
+        profile = {'calls': len(latencies),
+                'latency_mean': sum(latencies) / len(latencies),
+                'latency_p50': latencies[len(latencies) // 2],
+                'latency_p99': latencies[int(len(latencies) * 0.99)]}
+        for k in ['peak_memory', 'rss_delta']:
+            values = [s[k] for s in self.forward_stats if k in s]
+            if len(values) > 0:
+                profile[k] = max(values)
+        return profile
+
     def set_device(self, device:str = None, resolve_device: bool = True):
         '''
         Sets the device for the model and returns the device
@@ -123,41 +203,45 @@ class Model( nn.Module, c.Module):
         
     
 
+    def checkpointer(self, tag:str = None) -> Checkpointer:
+        path = self.resolve_state_path(self.resolve_tag(tag))
+        if not hasattr(self, 'checkpointers'):
+            self.checkpointers = {}
+        if path not in self.checkpointers:
+            self.checkpointers[path] = Checkpointer(path,
+                                                    max_shard_size=self.config.get('max_shard_size', 2 * 1024**3),
+                                                    background=self.config.get('background_save', True))
+        return self.checkpointers[path]
+
     def save(self, 
              tag:str = None,  
              trainable_only:bool = True,
              verbose:bool = False,
-             keys = None):
+             keys = None,
+             incremental:bool = True,
+             wait:bool = False):
+        """
+        Checkpoints the model, optimizer and config as safetensors shards (see Checkpointer).
+        The write happens in the background unless wait is set, checkpointer(tag).wait() waits for it.
+        """
         tag = self.resolve_tag(tag)
         path = self.resolve_state_path(tag)
-
-        model_state_dict = self.state_dict()
-        
-        if trainable_only:
-            model_state_dict = {k:v for k,v in model_state_dict.items() if v.requires_grad} 
-    
-        
-        os.makedirs(path, exist_ok=True)
-        state_dict = {
-            'model': model_state_dict,
-            'optimizer': self.optimizer.state_dict(),
-            'config': self.config,
-            }
         
-        if keys == None:
-            keys = list(state_dict.keys())
-        else:
+        if keys != None:
             assert isinstance(keys, list), f'keys must be a list, got {keys}'
-            assert all([isinstance(k, str) for k in keys]), f'keys must be a list of strings, got {keys}'
-            assert all([k in state_dict for k in keys]), f'keys must be a list of strings, got {keys}'
-            keys = keys
-        state_path_dict = {}
-        for k in keys:
-            state_path_dict[k] = os.path.join(path, f'{k}.pt')
-        self.config['state_path_dict']= {**self.config.get('state_path_dict', {}), **state_path_dict}
-        
-        for k in keys:
-            torch.save(state_dict[k], state_path_dict[k])        
+            assert all([k in ['model', 'optimizer', 'config'] for k in keys]), f'keys must be a list of model, optimizer or config, got {keys}'
+
+        checkpointer = self.checkpointer(tag)
+        checkpointer.save(model=self,
+                          optimizer=getattr(self, 'optimizer', None),
+                          config=self.config,
+                          keys=keys,
+                          trainable_only=trainable_only,
+                          incremental=incremental)
+        if wait:
+            checkpointer.wait()
+        if verbose:
+            self.print(f'Saving checkpoint to {path}')
 
         return path
     
@@ -220,7 +304,18 @@ class Model( nn.Module, c.Module):
         if not os.path.exists(path):
             self.print(f'Couldnt find {path}')
             return 
-        
+
+        checkpointer = self.checkpointer(tag)
+        if checkpointer.exists():
+            keys = keys if keys != None else ['model', 'optimizer', 'config']
+            manifest = checkpointer.load(model=self if 'model' in keys else None,
+                                         optimizer=getattr(self, 'optimizer', None) if 'optimizer' in keys else None)
+            if 'config' in keys and manifest.get('config') != None:
+                self.check_config(manifest['config'])
+                self.set_config(manifest['config'])
+            return manifest
+
+        # checkpoints saved with torch.save before the safetensors checkpoints
         path_list = glob.glob(os.path.join(path, '*.pt'))
         loaded_state_dict = {}
         
@@ -230,7 +325,7 @@ class Model( nn.Module, c.Module):
             if not os.path.exists(path):
                 self.print('No saved model found at {path}')
                 return
-            loaded_state_dict[key] = torch.load(path)
+            loaded_state_dict[key] = torch.load(path, map_location=map_location)
         
         if 'config' in loaded_state_dict:
             config = loaded_state_dict['config']
@@ -256,9 +351,7 @@ class Model( nn.Module, c.Module):
         
     def update_state_dict(self, state_dict:dict):
         assert isinstance(state_dict, dict), f'state_dict must be a dict, got {type(state_dict)}'
-        state_dict = self.state_dict()
-        state_dict.update(state_dict)
-        self.load_state_dict(state_dict)
+        self.load_state_dict({**self.state_dict(), **state_dict})
         
         
         
@@ -381,6 +474,42 @@ class Model( nn.Module, c.Module):
         return cls.base_model().test(*args, **kwargs)
     # train = test
 
+    @classmethod
+    def benchmark_forward(cls, calls:int = 2000, dim:int = 64, batch_size:int = 8, compile:bool = False) -> Dict[str, float]:
+        """
+        Per call cost of forward on a small cpu model: the bare layer, the old default wrapper
+        (no_grad, autocast and empty_cache on every call) and the inference fast path, in microseconds
+        """
+        model = cls()
+        model.layer = nn.Linear(dim, dim)
+        model._forward = lambda x, train=False: model.layer(x)
+        x = torch.randn(batch_size, dim)
+
+        def per_call(fn):
+            fn() # warmup
+            t = time.perf_counter()
+            for _ in range(calls):
+                fn()
+            return (time.perf_counter() - t) / calls * 1e6
+
+        def legacy_forward(**kwargs):
+            # what forward did on every call before the fast path
+            if model.training == True:
+                model.eval()
+            with torch.no_grad():
+                with torch.cuda.amp.autocast():
+                    result = model._forward(**kwargs)
+            torch.cuda.empty_cache()
+            return result
+
+        with torch.inference_mode():
+            compute = per_call(lambda: model.layer(x))
+        legacy = per_call(lambda: legacy_forward(x=x, train=False))
+        model.set_inference(True, compile=compile)
+        fast = per_call(lambda: model.forward(x=x))
+        return {'compute_us': compute, 'legacy_us': legacy, 'fast_us': fast,
+                'overhead_removed_us': legacy - fast}
+
     @classmethod
     def sandbox(cls, *args,**kwargs):
         self = cls(*args,**kwargs)
@@ -8,8 +8,8 @@ from langchain.vectorstores import Chroma
 from typing import Union, List, Any, Dict
 import sqlite3
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from sentence_transformers import SentenceTransformer
+import json
+import re
 
 __import__('pysqlite3')
 import sys
@@ -24,71 +24,190 @@ DATABASES = {
 
 class DatabaseManager:
     def __init__(self, db_name):
-        self.conn = sqlite3.connect(db_name)
+        self.conn = sqlite3.connect(db_name, check_same_thread=False)
         self.cursor = self.conn.cursor()
         self.create_table()
 
     def create_table(self):
-        self.cursor.execute('''CREATE TABLE IF NOT EXISTS embeddings
-                     (sentence text, embedding text)''')
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS vectors
+                     (sentence text PRIMARY KEY, embedding blob)''')
+        self.migrate_text_embeddings()
 
-    def insert_embedding(self, sentence, embedding):
-        self.cursor.execute("INSERT INTO embeddings VALUES (?,?)", (sentence, str(list(embedding))))
+    def migrate_text_embeddings(self):
+        # older stores kept the embedding as the text of a python list
+        self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='embeddings'")
+        if self.cursor.fetchone() == None:
+            return
+        rows = self.cursor.execute('SELECT sentence, embedding FROM embeddings').fetchall()
+        skipped = 0
+        for sentence, embedding in rows:
+            values = self.parse_text_embedding(embedding)
+            if values == None:
+                # left in the old table rather than lost
+                skipped += 1
+                continue
+            self.cursor.execute("INSERT OR REPLACE INTO vectors VALUES (?,?)", (sentence, self.to_blob(values)))
+            self.cursor.execute("DELETE FROM embeddings WHERE sentence = ?", (sentence,))
+        if skipped == 0:
+            self.cursor.execute('DROP TABLE embeddings')
+        else:
+            c.print(f'Could not parse {skipped} of {len(rows)} text embeddings, kept in the embeddings table', color='red')
+        self.conn.commit()
+
+    number_pattern = re.compile(r'[-+]?(?:nan|inf|(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)')
+
+    @classmethod
+    def parse_text_embedding(cls, text) -> Union[List[float], None]:
+        """
+        The numbers of str(list(embedding)), whatever wrapped them: [1.0, ...] (json),
+        [np.float32(1.0), ...] (numpy 2) or [tensor(1.), ...] (torch). None if there are none.
+        """
+        if not isinstance(text, str):
+            return None
+        # drop keyword arguments (dtype=torch.float16) and wrapper names, whose digits are not values
+        text = re.sub(r',\s*\w+\s*=[^,\]\)]*', '', text)
+        text = re.sub(r'[A-Za-z_][\w\.]*\(', '(', text)
+        try:
+            values = [float(v) for v in cls.number_pattern.findall(text)]
+        except ValueError:
+            return None
+        return values if len(values) > 0 else None
+
+    @staticmethod
+    def to_blob(embedding) -> bytes:
+        return np.asarray(embedding, dtype=np.float32).tobytes()
+
+    @staticmethod
+    def from_blob(blob:bytes) -> np.ndarray:
+        return np.frombuffer(blob, dtype=np.float32)
+
+    def insert_embeddings(self, sentences, embeddings):
+        self.cursor.executemany("INSERT OR REPLACE INTO vectors VALUES (?,?)",
+                                [(s, self.to_blob(e)) for s, e in zip(sentences, embeddings)])
         self.conn.commit()
 
+    def insert_embedding(self, sentence, embedding):
+        self.insert_embeddings([sentence], [embedding])
+
     def update_embedding(self, sentence, new_embedding):
-        self.cursor.execute("UPDATE embeddings SET embedding = ? WHERE sentence = ?", (str(list(new_embedding)), sentence))
+        self.cursor.execute("UPDATE vectors SET embedding = ? WHERE sentence = ?", (self.to_blob(new_embedding), sentence))
         self.conn.commit()
 
     def delete_embedding(self, sentence):
-        self.cursor.execute("DELETE FROM embeddings WHERE sentence = ?", (sentence,))
+        self.cursor.execute("DELETE FROM vectors WHERE sentence = ?", (sentence,))
         self.conn.commit()
 
     def fetch_embedding(self, sentence):
-        self.cursor.execute("SELECT * FROM embeddings WHERE sentence = ?", (sentence,))
-        return self.cursor.fetchone()
+        self.cursor.execute("SELECT * FROM vectors WHERE sentence = ?", (sentence,))
+        row = self.cursor.fetchone()
+        return None if row == None else (row[0], self.from_blob(row[1]))
 
     def fetch_all_embeddings(self):
-        self.cursor.execute('SELECT * FROM embeddings')
-        return self.cursor.fetchall()
+        rows = self.cursor.execute('SELECT * FROM vectors').fetchall()
+        return [(sentence, self.from_blob(blob)) for sentence, blob in rows]
 
 class EmbeddingModel:
     def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
         self.model = SentenceTransformer(model_name)
 
+    def get_embeddings(self, sentences):
+        return np.asarray(self.model.encode(sentences), dtype=np.float32)
+
     def get_embedding(self, sentence):
-        return self.model.encode([sentence])[0]
+        return self.get_embeddings([sentence])[0]
 
 class SentenceManager:
     def __init__(self, db_manager, embedding_model):
         self.db_manager = db_manager
         self.embedding_model = embedding_model
+        self.load_matrix()
+
+    def load_matrix(self):
+        """
+        Loads every embedding once into a contiguous matrix of unit vectors, kept in sync with the db
+        """
+        rows = self.db_manager.fetch_all_embeddings()
+        self.sentences = [sentence for sentence, _ in rows]
+        self.sentence2idx = {sentence: i for i, sentence in enumerate(self.sentences)}
+        self.matrix = self.normalize(np.stack([e for _, e in rows])) if len(rows) > 0 else None
+
+    @staticmethod
+    def normalize(embeddings):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        return embeddings / np.maximum(np.linalg.norm(embeddings, axis=-1, keepdims=True), 1e-12)
+
+    def add_sentences(self, sentences):
+        sentences = list(dict.fromkeys(sentences))
+        embeddings = self.embedding_model.get_embeddings(sentences)
+        self.db_manager.insert_embeddings(sentences, embeddings)
+        embeddings = self.normalize(embeddings)
+        new_rows = []
+        for i, sentence in enumerate(sentences):
+            if sentence in self.sentence2idx:
+                self.matrix[self.sentence2idx[sentence]] = embeddings[i]
+            else:
+                self.sentence2idx[sentence] = len(self.sentences)
+                self.sentences.append(sentence)
+                new_rows.append(i)
+        if len(new_rows) > 0:
+            new_rows = embeddings[new_rows]
+            self.matrix = new_rows if self.matrix is None else np.concatenate([self.matrix, new_rows])
+        return {'msg': f"{len(sentences)} sentences are added to local vector store.", 'success': True}
 
     def add_sentence(self, sentence):
-        embedding = self.embedding_model.get_embedding(sentence)
-        self.db_manager.insert_embedding(sentence, embedding)
+        self.add_sentences([sentence])
         return {'msg': f"Sentence is added to local vector store.", 'success': True}
 
     def update_sentence(self, sentence):
-        new_embedding = self.embedding_model.get_embedding(sentence)
-        self.db_manager.update_embedding(sentence, new_embedding)
-        return {'msg': f"Sentence is updated from local vector store.", 'success': True}
+        return self.add_sentences([sentence])
 
     def delete_sentence(self, sentence):
         self.db_manager.delete_embedding(sentence)
+        idx = self.sentence2idx.pop(sentence, None)
+        if idx != None:
+            # swap the last row into the hole
+            last_idx = len(self.sentences) - 1
+            if idx != last_idx:
+                last_sentence = self.sentences[last_idx]
+                self.matrix[idx] = self.matrix[last_idx]
+                self.sentences[idx] = last_sentence
+                self.sentence2idx[last_sentence] = idx
+            self.sentences.pop()
+            self.matrix = self.matrix[:last_idx] if last_idx > 0 else None
         return {'msg': f"Sentence is deleted from local vector store.", 'success': True}
 
     def get_sentence_embedding(self, sentence):
         return self.db_manager.fetch_embedding(sentence)
 
+    def search(self, queries, top_k=1):
+        """
+        Top k (sentence, cosine similarity) pairs for each query, with one model call for the batch
+        """
+        if self.matrix is None:
+            return [[] for _ in queries]
+        scores = self.normalize(self.embedding_model.get_embeddings(queries)) @ self.matrix.T
+        top_k = min(top_k, len(self.sentences))
+        idxs = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+        results = []
+        for row_scores, row_idxs in zip(scores, idxs):
+            row_idxs = row_idxs[np.argsort(-row_scores[row_idxs])]
+            results.append([(self.sentences[i], float(row_scores[i])) for i in row_idxs])
+        return results
+
     def prompt(self, query):
-        query_embedding = self.embedding_model.get_embedding(query)
-        rows = self.db_manager.fetch_all_embeddings()
-        return max(rows, key=lambda row: cosine_similarity([query_embedding], [np.array(eval(row[1]))]))[0]
+        results = self.search([query], top_k=1)[0]
+        assert len(results) > 0, 'No sentences in the local vector store'
+        return results[0][0]
+
+sentence_manager = None
 
-db_manager = DatabaseManager('embeddings.db')
-embedding_model = EmbeddingModel('all-MiniLM-L6-v2')
-sentence_manager = SentenceManager(db_manager, embedding_model)
+def get_sentence_manager(db_name='embeddings.db', model_name='all-MiniLM-L6-v2'):
+    # built on first use, so importing the module does not load a model or open the db
+    global sentence_manager
+    if sentence_manager == None:
+        sentence_manager = SentenceManager(DatabaseManager(db_name), EmbeddingModel(model_name))
+    return sentence_manager
 
 class ModelVectorstore(c.Module):
     def __init__(self, config = None, **kwargs):
@@ -162,8 +281,17 @@ class ModelVectorstore(c.Module):
         return {'msg': f"Saved API Keys", 'success': True}
 
     def add_sentence(self, sentence):
-        return sentence_manager.add_sentence(sentence)
+        return get_sentence_manager().add_sentence(sentence)
+
+    def add_sentences(self, sentences:List[str]):
+        return get_sentence_manager().add_sentences(sentences)
+
+    def rm_sentence(self, sentence):
+        return get_sentence_manager().delete_sentence(sentence)
 
     def prompt(self, query):
-        result = sentence_manager.prompt(query)
+        result = get_sentence_manager().prompt(query)
         return {'result': result, 'success': True}
+
+    def search_sentences(self, queries:List[str], top_k:int = 5):
+        return {'results': get_sentence_manager().search(queries, top_k=top_k), 'success': True}
@@ -0,0 +1,414 @@
+import commune as c
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import threading
+import subprocess
+import socketserver
+from typing import *
+
+
+class Supervisor(c.Module):
+    """
+    Native replacement for pm2. One daemon per box spawns, monitors, restarts (with backoff)
+    and captures the logs of module servers, and answers requests over a local unix socket,
+    so status checks are dict lookups instead of scraping `pm2 status`.
+
+    The classmethods (start, stop, restart, delete, ls, status, logs, kill_all) mirror the pm2 verbs
+    and talk to the daemon, starting it if it is not running.
+    """
+    supervisor_dir = os.path.expanduser('~/.commune/supervisor')
+    sock_path = supervisor_dir + '/supervisor.sock'
+    log_dir = supervisor_dir + '/logs'
+    state_path = supervisor_dir + '/state.json'
+    # the functions the daemon exposes over the socket
+    daemon_fns = ['ping', 'start', 'stop', 'restart', 'delete', 'ls', 'status', 'exists', 'kill_all', 'shutdown']
+    # these wait on processes to exit, so the client gives them longer than a lookup
+    kill_fns = ['start', 'stop', 'restart', 'delete', 'kill_all']
+
+    def __init__(self,
+                 interval:float = 0.5, # seconds between checks of the processes
+                 min_backoff:float = 1.0, # seconds before the first restart of a crashed process
+                 max_backoff:float = 60.0, # the backoff doubles on every crash up to this
+                 min_uptime:float = 10.0, # a process that stays up this long resets its backoff
+                 kill_timeout:float = 5.0): # seconds between SIGTERM and SIGKILL
+        self.set_config(kwargs=locals())
+        self.procs = {}
+        self.popens = {}
+        self.lock = threading.RLock()
+        self.stopped = False
+        os.makedirs(self.log_dir, exist_ok=True)
+
+    ############ DAEMON ###############
+
+    def serve_daemon(self):
+        """
+        Runs the daemon in the foreground, adopting the processes of a previous daemon.
+        """
+        import fcntl
+        # only one daemon per box, a second one exits instead of stealing the socket
+        self.lock_file = open(self.supervisor_dir + '/supervisor.lock', 'w')
+        try:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            c.print('Supervisor daemon already running', color='yellow')
+            return
+        if os.path.exists(self.sock_path):
+            os.remove(self.sock_path)
+        self.load_state()
+        supervisor = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                line = self.rfile.readline()
+                if not line:
+                    return
+                response = supervisor.forward(**json.loads(line))
+                self.wfile.write((json.dumps(response) + '\n').encode())
+
+        self.server = socketserver.ThreadingUnixStreamServer(self.sock_path, Handler)
+        self.server.daemon_threads = True
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *args: self.daemon_shutdown())
+        c.thread(self.monitor_loop, tag='supervisor')
+        c.print(f'Supervisor listening on {self.sock_path}', color='green')
+        self.server.serve_forever()
+
+    def forward(self, fn:str, kwargs:dict = None) -> dict:
+        kwargs = kwargs or {}
+        if fn not in self.daemon_fns:
+            return {'error': f'fn {fn} not in {self.daemon_fns}'}
+        try:
+            # the daemon functions take the lock themselves, and never hold it while waiting on a process
+            return {'data': getattr(self, f'daemon_{fn}')(**kwargs)}
+        except Exception as e:
+            return {'error': str(e)}
+
+    def monitor_loop(self):
+        while not self.stopped:
+            with self.lock:
+                changed = False
+                for name, proc in self.procs.items():
+                    if proc['status'] == 'online':
+                        exit_code = self.poll(name)
+                        if exit_code == None:
+                            continue
+                        proc['exit_code'] = exit_code
+                        changed = True
+                        if not proc['autorestart']:
+                            proc['status'] = 'stopped'
+                            continue
+                        proc['backoff'] = self.restart_backoff(proc)
+                        proc['status'] = 'waiting'
+                        proc['next_start'] = time.time() + proc['backoff']
+                    elif proc['status'] == 'waiting' and time.time() >= proc['next_start']:
+                        proc['restarts'] += 1
+                        self.spawn(name)
+                        changed = True
+                if changed:
+                    self.save_state()
+            time.sleep(self.config.interval)
+
+    def restart_backoff(self, proc:dict) -> float:
+        """
+        Seconds before restarting a crashed process, doubling while it keeps crashing quickly
+        """
+        uptime = time.time() - proc['start_time']
+        if uptime > self.config.min_uptime or proc['backoff'] == 0:
+            return self.config.min_backoff
+        return min(proc['backoff'] * 2, self.config.max_backoff)
+
+    @classmethod
+    def log_path(cls, name:str, mode:str = 'out') -> str:
+        name = name.replace('/', '-').replace(':', '-')
+        return f'{cls.log_dir}/{name}-{mode}.log'
+
+    def spawn(self, name:str):
+        proc = self.procs[name]
+        with open(self.log_path(name, 'out'), 'ab') as out, open(self.log_path(name, 'error'), 'ab') as err:
+            # a new session per process lets us signal the whole process group
+            popen = subprocess.Popen(proc['cmd'],
+                                     stdout=out,
+                                     stderr=err,
+                                     cwd=proc['cwd'],
+                                     env={**os.environ, **proc['env']},
+                                     start_new_session=True)
+        self.popens[name] = popen
+        proc.update(pid=popen.pid, status='online', start_time=time.time(), exit_code=None)
+        return proc
+
+    def poll(self, name:str) -> Optional[int]:
+        if name in self.popens:
+            return self.popens[name].poll()
+        # adopted from a previous daemon, so we cannot wait on it
+        return None if self.pid_alive(self.procs[name]['pid']) else -1
+
+    @staticmethod
+    def pid_alive(pid:int) -> bool:
+        if pid == None:
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def terminate(self, name:str):
+        """
+        Stops a process, SIGTERM then SIGKILL. The wait happens outside the lock, so the monitor
+        and the other clients are not blocked by a slow process.
+        """
+        with self.lock:
+            proc = self.procs[name]
+            online = proc['status'] == 'online'
+            # the monitor leaves stopping processes alone
+            proc['status'] = 'stopping'
+            popen = self.popens.pop(name, None)
+            pid = proc['pid']
+        if online:
+            self.kill_pid(pid, popen)
+        with self.lock:
+            proc['status'] = 'stopped'
+
+    def kill_pid(self, pid:int, popen:subprocess.Popen = None):
+        exited = lambda: popen.poll() != None if popen != None else not self.pid_alive(pid)
+        if exited():
+            return
+        for sig in [signal.SIGTERM, signal.SIGKILL]:
+            try:
+                os.killpg(pid, sig)
+            except ProcessLookupError:
+                break
+            deadline = time.time() + self.config.kill_timeout
+            while time.time() < deadline and not exited():
+                time.sleep(0.05)
+            if exited():
+                break
+
+    def save_state(self):
+        with self.lock:
+            state = {name: {k:v for k,v in proc.items()} for name, proc in self.procs.items()}
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def load_state(self):
+        if not os.path.exists(self.state_path):
+            return self.procs
+        with open(self.state_path, 'r') as f:
+            self.procs = json.load(f)
+        for name, proc in self.procs.items():
+            if proc['status'] == 'online' and not self.pid_alive(proc['pid']):
+                # died while no daemon was watching
+                proc['status'] = 'waiting' if proc['autorestart'] else 'stopped'
+                proc['next_start'] = time.time()
+        return self.procs
+
+    def daemon_ping(self) -> bool:
+        return True
+
+    def daemon_start(self, name:str, cmd:List[str], env:dict = None, cwd:str = None, autorestart:bool = True) -> dict:
+        if name in self.procs:
+            self.terminate(name)
+        with self.lock:
+            self.procs[name] = {
+            'name': name,
+            'cmd': cmd,
+            'env': env or {},
+            'cwd': cwd,
+            'autorestart': autorestart,
+            'pid': None,
+            'status': 'stopped',
+            'restarts': 0,
+            'backoff': 0,
+            'start_time': None,
+            'next_start': None,
+            'exit_code': None,
+            }
+            proc = self.spawn(name)
+            self.save_state()
+            return dict(proc)
+
+    def daemon_stop(self, name:str) -> dict:
+        self.terminate(name)
+        self.save_state()
+        with self.lock:
+            return dict(self.procs[name])
+
+    def daemon_restart(self, name:str) -> dict:
+        self.terminate(name)
+        with self.lock:
+            self.procs[name]['restarts'] += 1
+            proc = self.spawn(name)
+            self.save_state()
+            return dict(proc)
+
+    def daemon_delete(self, name:str) -> str:
+        self.terminate(name)
+        with self.lock:
+            self.procs.pop(name, None)
+            self.save_state()
+        return name
+
+    def daemon_ls(self) -> List[str]:
+        with self.lock:
+            return list(self.procs.keys())
+
+    def daemon_status(self, name:str = None) -> dict:
+        with self.lock:
+            if name != None:
+                return dict(self.procs[name]) if name in self.procs else None
+            return {n: dict(proc) for n, proc in self.procs.items()}
+
+    def daemon_exists(self, name:str) -> bool:
+        with self.lock:
+            return name in self.procs
+
+    def daemon_kill_all(self) -> List[str]:
+        # stop them side by side, so the total wait is that of the slowest process
+        from concurrent.futures import ThreadPoolExecutor
+        names = self.daemon_ls()
+        if len(names) == 0:
+            return []
+        with ThreadPoolExecutor(max_workers=len(names)) as executor:
+            return list(executor.map(self.daemon_delete, names))
+
+    def daemon_shutdown(self) -> bool:
+        # the managed processes keep running and are adopted by the next daemon
+        self.stopped = True
+        c.thread(self.server.shutdown)
+        return True
+
+    ############ CLIENT ###############
+
+    @classmethod
+    def request(cls, fn:str, timeout:float = None, ensure_daemon:bool = True, **kwargs) -> Any:
+        if timeout == None:
+            timeout = 60 if fn in cls.kill_fns else 10
+        if ensure_daemon:
+            cls.ensure_daemon()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(timeout)
+            s.connect(cls.sock_path)
+            s.sendall((json.dumps({'fn': fn, 'kwargs': kwargs}) + '\n').encode())
+            response = b''
+            while not response.endswith(b'\n'):
+                chunk = s.recv(65536)
+                if not chunk:
+                    break
+                response += chunk
+        response = json.loads(response)
+        if 'error' in response:
+            raise Exception(f'Supervisor {fn} failed: {response["error"]}')
+        return response['data']
+
+    @classmethod
+    def daemon_running(cls) -> bool:
+        try:
+            return cls.request('ping', timeout=1, ensure_daemon=False)
+        except (OSError, ValueError):
+            return False
+
+    @classmethod
+    def ensure_daemon(cls, timeout:float = 10):
+        if cls.daemon_running():
+            return True
+        os.makedirs(cls.log_dir, exist_ok=True)
+        kwargs_str = json.dumps({'module': cls.module_path(), 'fn': 'serve_daemon', 'args': [], 'kwargs': {}}).replace('"', "'")
+        cmd = [sys.executable, c.module_file(), '--fn', 'module_fn', '--kwargs', kwargs_str]
+        with open(f'{cls.log_dir}/supervisor-out.log', 'ab') as out:
+            subprocess.Popen(cmd, stdout=out, stderr=subprocess.STDOUT, start_new_session=True)
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if cls.daemon_running():
+                return True
+            time.sleep(0.1)
+        raise TimeoutError(f'Supervisor daemon did not start within {timeout}s, see {cls.log_dir}/supervisor-out.log')
+
+    @classmethod
+    def kill_daemon(cls) -> bool:
+        if not cls.daemon_running():
+            return False
+        return cls.request('shutdown', ensure_daemon=False)
+
+    @classmethod
+    def start(cls, name:str, cmd:Union[str, List[str]], env:dict = None, cwd:str = None, autorestart:bool = True) -> dict:
+        if isinstance(cmd, str):
+            import shlex
+            cmd = shlex.split(cmd)
+        return cls.request('start', name=name, cmd=cmd, env=env, cwd=cwd, autorestart=autorestart)
+
+    @classmethod
+    def stop(cls, name:str) -> dict:
+        return cls.request('stop', name=name)
+
+    @classmethod
+    def restart(cls, name:str) -> dict:
+        return cls.request('restart', name=name)
+
+    @classmethod
+    def delete(cls, name:str) -> str:
+        return cls.request('delete', name=name)
+
+    @classmethod
+    def read(cls, fn:str, default:Any = None, **kwargs) -> Any:
+        """
+        A lookup that never starts the daemon, a daemon that is not running manages nothing
+        """
+        try:
+            return cls.request(fn, ensure_daemon=False, **kwargs)
+        except (OSError, ValueError):
+            return default
+
+    @classmethod
+    def ls(cls, search:str = None) -> List[str]:
+        names = cls.read('ls', default=[])
+        if search != None:
+            names = [n for n in names if search in n]
+        return names
+
+    @classmethod
+    def status(cls, name:str = None) -> dict:
+        return cls.read('status', default=None if name != None else {}, name=name)
+
+    @classmethod
+    def exists(cls, name:str) -> bool:
+        return cls.read('exists', default=False, name=name)
+
+    @classmethod
+    def kill_all(cls) -> List[str]:
+        return cls.request('kill_all')
+
+    @classmethod
+    def logs(cls, name:str, tail:int = 100, mode:str = None) -> str:
+        text = ''
+        for m in ([mode] if mode else ['out', 'error']):
+            path = cls.log_path(name, m)
+            if os.path.exists(path):
+                text += c.get_text(path, tail=tail)
+        return text
+
+    @classmethod
+    def rm_logs(cls, name:str):
+        for m in ['out', 'error']:
+            path = cls.log_path(name, m)
+            if os.path.exists(path):
+                os.remove(path)
+
+    @classmethod
+    def test(cls):
+        name = 'supervisor.test'
+        proc = cls.start(name, [sys.executable, '-c', 'import time; print("hey"); time.sleep(100)'])
+        assert proc['status'] == 'online', proc
+        assert name in cls.ls()
+        assert cls.exists(name)
+        cls.delete(name)
+        assert not cls.exists(name)
+        cls.rm_logs(name)
+        return {'success': True, 'msg': 'started and deleted a process'}
@@ -1,22 +1,80 @@
 import commune as c
 from typing import *
+import threading
+import select
+import socket
+import os
+import copy
 
 class Remote(c.Module):
     filetype = 'yaml'
     host_data_path = f'{c.datapath}/hosts.{filetype}'
     host_url = 'https://raw.githubusercontent.com/communeai/commune/main/hosts.yaml'
     executable_path='commune/bin/c'
-    @classmethod
-    def ssh_cmd(cls, *cmd_args, host:str= None,  cwd:str=None, verbose=True, sudo=False, key=None, timeout=10,  **kwargs ):
-        """s
-        Run a command on a remote server using Remote.
+    ssh_clients = {} # host name -> connected paramiko.SSHClient, reused across commands
+    ssh_lock = threading.Lock()
+    ssh_host_locks = {}
+    hosts_cache = {} # (path, filetype) -> (mtime, hosts)
 
-        :param host: Hostname or IP address of the remote machine.
-        :param port: Remote port (typically 22).
-        :param username: Remote username.
-        :param password: Remote password.
-        :param command: Command to be executed on the remote machine.
-        :return: Command output.
+    @classmethod
+    def ssh_client(cls, host:str = None, timeout:int = 10, refresh:bool = False):
+        """
+        Returns a pooled, authenticated client for the host, connecting only if there is no live transport.
+        Commands open their own channels on the shared transport, so they can run concurrently.
+        """
+        import paramiko
+        hosts = cls.hosts()
+        host_name = list(hosts.keys())[0] if host == None else host
+        if host_name not in hosts:
+            raise Exception(f'Host {host_name} not found')
+        with cls.ssh_lock:
+            host_lock = cls.ssh_host_locks.setdefault(host_name, threading.Lock())
+        # lock per host, so handshakes to different hosts run in parallel
+        with host_lock:
+            client = cls.ssh_clients.get(host_name)
+            transport = client.get_transport() if client != None else None
+            if refresh or transport == None or not transport.is_active():
+                if client != None:
+                    client.close()
+                host = hosts[host_name]
+                client = paramiko.SSHClient()
+                # Automatically add the server's host key (this is insecure and used for demonstration; 
+                # in production, you should have the remote server's public key in known_hosts)
+                client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+                client.connect(host['host'],
+                               port=host['port'], 
+                               username=host['user'], 
+                               password=host['pwd'],
+                               timeout=timeout,
+                               banner_timeout=timeout,
+                               auth_timeout=timeout)
+                transport = client.get_transport()
+                transport.set_keepalive(30)
+                # small channel requests otherwise stall on nagle + delayed acks
+                transport.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                cls.ssh_clients[host_name] = client
+        return client
+
+    @classmethod
+    def close_ssh(cls, host:str = None):
+        host_names = list(cls.ssh_clients.keys()) if host == None else [host]
+        for host_name in host_names:
+            client = cls.ssh_clients.pop(host_name, None)
+            if client != None:
+                client.close()
+        return {'status': 'success', 'msg': f'Closed {len(host_names)} ssh connections'}
+
+    @classmethod
+    def ssh_stream(cls, *cmd_args, host:str= None,  cwd:str=None, sudo=False, timeout=10, deadline:float=None, poll_interval=0.05, **kwargs):
+        """
+        Run a command on a remote server, yielding output lines as they arrive.
+
+        :param host: Name of the host in the hosts file.
+        :param cwd: Directory to run the command in.
+        :param sudo: Run the command with sudo.
+        :param timeout: Seconds to wait for the connection and the channel.
+        :param deadline: Seconds before the command is abandoned (raises TimeoutError), None waits for it to finish.
+        :return: Generator of {'stream': 'stdout'|'stderr', 'line': str}, ending with {'exit_status': int}.
         """
         command = ' '.join(cmd_args).strip()
         
@@ -26,72 +84,78 @@ class Remote(c.Module):
         if cwd != None:
             command = f'cd {cwd} && {command}'
 
-        
-
-
-        import paramiko
         hosts = cls.hosts()
-        host_name = host
-        if host_name == None:
-            host = list(hosts.keys())[0]
+        host_name = list(hosts.keys())[0] if host == None else host
         if host_name not in hosts:
             raise Exception(f'Host {host_name} not found')
         host = hosts[host_name]
-
-        # Create an Remote client instance.
-        client = paramiko.SSHClient()
-
-
-        # Automatically add the server's host key (this is insecure and used for demonstration; 
-        # in production, you should have the remote server's public key in known_hosts)
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                
-
-
-        # Connect to the remote server
-        client.connect(host['host'],
-                       port=host['port'], 
-                       username=host['user'], 
-                       password=host['pwd'])
-        
         if sudo and host['user'] != "root":
             command = "sudo -S -p '' %s" % command
-        stdin, stdout, stderr = client.exec_command(command)
-
-
 
+        client = cls.ssh_client(host_name, timeout=timeout)
+        try:
+            channel = client.get_transport().open_session(timeout=timeout)
+        except Exception:
+            # the pooled transport went stale, reconnect once
+            client = cls.ssh_client(host_name, timeout=timeout, refresh=True)
+            channel = client.get_transport().open_session(timeout=timeout)
 
+        end_time = c.time() + deadline if deadline != None else None
         try:
+            channel.exec_command(command)
             if sudo:
-                stdin.write(host['pwd'] + "\n")
-                stdin.flush()
-            color = c.random_color()
-            # Print the output of ls command
-            outputs = {'error': '', 'output': ''}
-
-            for line in stdout.readlines():
-                if verbose:
-                    c.print(f'[bold]{host_name}[/bold]', line.strip('\n'), color=color)
-                outputs['output'] += line
+                channel.sendall((host['pwd'] + "\n").encode())
+            buffers = {'stdout': b'', 'stderr': b''}
+            readers = {'stdout': (channel.recv_ready, channel.recv), 'stderr': (channel.recv_stderr_ready, channel.recv_stderr)}
+            while True:
+                received = False
+                for stream, (ready, recv) in readers.items():
+                    while ready():
+                        buffers[stream] += recv(32768)
+                        received = True
+                    *lines, buffers[stream] = buffers[stream].split(b'\n')
+                    for line in lines:
+                        yield {'stream': stream, 'line': line.decode(errors='replace')}
+                if not received and channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+                    break
+                if end_time != None and c.time() > end_time:
+                    raise TimeoutError(f'Command on {host_name} did not finish within {deadline}s')
+                if not received:
+                    # wake up as soon as the channel has data (or closes)
+                    select.select([channel], [], [], poll_interval)
+            for stream, buffer in buffers.items():
+                if len(buffer) > 0:
+                    yield {'stream': stream, 'line': buffer.decode(errors='replace')}
+            yield {'exit_status': channel.recv_exit_status()}
+        finally:
+            channel.close()
+
+    @classmethod
+    def ssh_cmd(cls, *cmd_args, host:str= None,  cwd:str=None, verbose=True, sudo=False, key=None, timeout=10, deadline:float=None,  **kwargs ):
+        """
+        Run a command on a remote server over its pooled connection.
 
-            for line in stderr.readlines():
+        :param host: Name of the host in the hosts file.
+        :param cwd: Directory to run the command in.
+        :param sudo: Run the command with sudo.
+        :return: Command output, or {'output', 'error'} if anything was written to stderr.
+        """
+        host_name = list(cls.hosts().keys())[0] if host == None else host
+        color = c.random_color()
+        outputs = {'error': '', 'output': ''}
+        try:
+            for item in cls.ssh_stream(*cmd_args, host=host_name, cwd=cwd, sudo=sudo, timeout=timeout, deadline=deadline):
+                if 'line' not in item:
+                    continue
                 if verbose:
-                    c.print(f'[bold]{host_name}[/bold]', line.strip('\n'))
-                outputs['error'] += line
-        
-
-            if len(outputs['error']) == 0:
-                outputs = outputs['output']
-
-                
-            stdin.close()
-            stdout.close()
-            stderr.close()
-            client.close()
+                    c.print(f'[bold]{host_name}[/bold]', item['line'], color=color if item['stream'] == 'stdout' else None)
+                outputs['output' if item['stream'] == 'stdout' else 'error'] += item['line'] + '\n'
         except Exception as e:
             c.print(e)
-            pass
+            outputs['error'] += str(e)
 
+        if len(outputs['error']) == 0:
+            outputs = outputs['output']
 
         return outputs
 
@@ -136,16 +200,28 @@ class Remote(c.Module):
             cls.put_json(path, hosts)
         elif filetype == 'yaml':
             cls.put_yaml(path, hosts)
+        cls.hosts_cache.pop((path, filetype), None)
 
         return {'status': 'success', 'msg': f'Hosts saved', 'hosts': hosts, 'path': cls.host_data_path, 'filetype': filetype}
     @classmethod
     def load_hosts(cls, path = None, filetype=filetype):
         if path == None:
             path = cls.host_data_path
-        if filetype == 'json':
-            return cls.get_json(path, {})
-        elif filetype == 'yaml':
-            return cls.get_yaml(path, {})
+        # parsed again only when the file changes, every command looks its host up
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        cached = cls.hosts_cache.get((path, filetype))
+        if cached == None or mtime == None or cached[0] != mtime:
+            if filetype == 'json':
+                hosts = cls.get_json(path, {})
+            elif filetype == 'yaml':
+                hosts = cls.get_yaml(path, {})
+            cached = (mtime, hosts)
+            cls.hosts_cache[(path, filetype)] = cached
+        # callers edit the hosts they get before saving them
+        return copy.deepcopy(cached[1])
     
     @classmethod
     def switch_hosts(cls, path):
@@ -226,36 +302,72 @@ class Remote(c.Module):
 
 
     @classmethod
-    def cmd(cls, *commands, hosts:Union[list, dict, str] = None, cwd=None, host:str=None,  timeout=5 , verbose:bool = True, num_trials=1, **kwargs):
-
-        output = {}
+    def resolve_hosts(cls, hosts:Union[list, dict, str] = None, host:str = None) -> dict:
         if hosts == None:
             hosts = cls.hosts()
             if host != None:
                 hosts = {host:hosts[host]}
         if isinstance(hosts, list):
-            hosts = {h:hosts[h] for h in hosts}
+            all_hosts = cls.hosts()
+            hosts = {h:all_hosts[h] for h in hosts}
         elif isinstance(hosts, str):
-            hosts = {hosts:cls.hosts(hosts)}
+            hosts = cls.hosts(hosts)
 
         assert isinstance(hosts, dict), f'Hosts must be a dict, got {type(hosts)}'
+        return hosts
 
-        results = {}
-        for host in hosts:
-            result_future = c.submit(cls.ssh_cmd, args=commands, kwargs=dict(host=host, cwd=cwd, verbose=verbose,**kwargs), return_future=True)
-            results[host] = result_future
-
-        result_values = c.wait(list(results.values()), timeout=timeout)
-        results =  dict(zip(results.keys(), result_values))
-        results =  {k:v for k,v in results.items()}
+    @classmethod
+    def stream_cmd(cls, *commands, hosts:Union[list, dict, str] = None, cwd=None, host:str=None, timeout=5, deadline:float=None, max_workers:int = 32, sudo=False, **kwargs):
+        """
+        Runs the command on every host with at most max_workers in flight, 
+        yielding {'host', 'stream', 'line'} as lines arrive and one {'host', 'exit_status' | 'error'} per host.
+        timeout bounds the connection to each host and deadline (if set) each command, so a slow host only times out itself.
+        """
+        import queue
+        from concurrent.futures import ThreadPoolExecutor
+        hosts = cls.resolve_hosts(hosts=hosts, host=host)
+        results = queue.Queue()
+
+        def run(host_name):
+            try:
+                for item in cls.ssh_stream(*commands, host=host_name, cwd=cwd, sudo=sudo, timeout=timeout, deadline=deadline):
+                    results.put({'host': host_name, **item})
+            except Exception as e:
+                results.put({'host': host_name, 'error': str(e)})
+            finally:
+                results.put({'host': host_name, 'done': True})
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, max(len(hosts), 1))) as executor:
+            for host_name in hosts:
+                executor.submit(run, host_name)
+            pending = len(hosts)
+            while pending > 0:
+                item = results.get()
+                if item.pop('done', False):
+                    pending -= 1
+                    continue
+                yield item
 
-        if all([v == None for v in results.values()]):
-            raise Exception(f'all results are None')
-        
+    @classmethod
+    def cmd(cls, *commands, hosts:Union[list, dict, str] = None, cwd=None, host:str=None,  timeout=5 , deadline:float=None, verbose:bool = True, num_trials=1, max_workers:int = 32, **kwargs):
+        hosts = cls.resolve_hosts(hosts=hosts, host=host)
+        host2color = {h: c.random_color() for h in hosts}
+        outputs = {h: {'error': '', 'output': ''} for h in hosts}
+        for item in cls.stream_cmd(*commands, hosts=hosts, cwd=cwd, timeout=timeout, deadline=deadline, max_workers=max_workers, **kwargs):
+            host = item['host']
+            if 'line' in item:
+                if verbose:
+                    c.print(f'[bold]{host}[/bold]', item['line'], color=host2color[host] if item['stream'] == 'stdout' else None)
+                outputs[host]['output' if item['stream'] == 'stdout' else 'error'] += item['line'] + '\n'
+            elif 'error' in item:
+                outputs[host]['error'] += item['error']
 
-        for k,v in results.items():
-            if isinstance(v, str):
-                results[k] = v.strip('\n')
+        results = {}
+        for host, output in outputs.items():
+            if len(output['error']) == 0:
+                results[host] = output['output'].strip('\n')
+            else:
+                results[host] = output
 
         return results 
 
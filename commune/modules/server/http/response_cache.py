@@ -0,0 +1,93 @@
+import json
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+
+class ResponseCache:
+    """
+    Cache of serialized and signed responses for functions a module marks as idempotent.
+
+    Entries are keyed by the function and a hash of its arguments, expire after the ttl of the
+    function and are evicted least recently used past max_size. Requests that arrive while the
+    same response is being computed wait on that computation instead of running it again.
+    """
+
+    def __init__(self, ttls:Dict[str, float] = None, max_size:int = 1024):
+        self.ttls = dict(ttls or {})
+        self.max_size = max_size
+        self.entries = OrderedDict() # key -> (expires, response)
+        self.inflight = {} # key -> future of the response being computed
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0}
+
+    @classmethod
+    def module_ttls(cls, module:Any, cache_fns:Union[List[str], Dict[str, float]] = None, default_ttl:float = 10) -> Dict[str, float]:
+        """
+        {fn: ttl} from the functions decorated with c.cache_response, the module's cache_fns and
+        the cache_fns passed to the server (a list uses default_ttl)
+        """
+        ttls = {}
+        for module_class in reversed(type(module).__mro__):
+            for fn, obj in vars(module_class).items():
+                ttl = getattr(getattr(obj, '__func__', obj), '__cache_ttl__', None)
+                if ttl != None:
+                    ttls[fn] = ttl
+        for fns in [getattr(module, 'cache_fns', None), cache_fns]:
+            if isinstance(fns, dict):
+                ttls.update(fns)
+            elif fns != None:
+                ttls.update({fn: default_ttl for fn in fns})
+        return ttls
+
+    def cached(self, fn:str) -> bool:
+        return fn in self.ttls
+
+    def key(self, fn:str, args:list, kwargs:dict) -> str:
+        params = json.dumps([args, kwargs], sort_keys=True, default=str)
+        return f'{fn}:{hashlib.sha256(params.encode()).hexdigest()}'
+
+    async def get(self, fn:str, args:list, kwargs:dict, compute:Callable[[], Awaitable[Tuple[Any, bool]]]) -> Any:
+        """
+        The cached response of fn(*args, **kwargs), else the one computed by compute, which
+        returns (response, cacheable)
+        """
+        key = self.key(fn, args, kwargs)
+        entry = self.entries.get(key)
+        if entry != None:
+            if entry[0] > time.time():
+                self.entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry[1]
+            del self.entries[key]
+        if key in self.inflight:
+            self.stats['coalesced'] += 1
+            # shielded, a waiter that is cancelled does not cancel the computation
+            return await asyncio.shield(self.inflight[key])
+
+        self.stats['misses'] += 1
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            response, cacheable = await compute()
+        except BaseException as e:
+            future.set_exception(e)
+            # retrieved here, so no warning when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self.inflight[key]
+        if cacheable:
+            self.entries[key] = (time.time() + self.ttls[fn], response)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        future.set_result(response)
+        return response
+
+    def clear(self, fn:str = None):
+        if fn == None:
+            self.entries.clear()
+        else:
+            for key in [k for k in self.entries if k.split(':', 1)[0] == fn]:
+                del self.entries[key]
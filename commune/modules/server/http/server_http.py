@@ -4,6 +4,7 @@ import commune as c
 import torch 
 import traceback
 import json
+import asyncio
 
 
 
@@ -24,11 +25,16 @@ class ServerHTTP(c.Module):
         timeout: int = 256,
         access_module: str = 'server.access',
         public: bool = False,
+        cache_fns: Union[List[str], Dict[str, float]] = None,
+        cache_size: int = 1024,
         ) -> 'Server':
         
         self.serializer = c.module('serializer')()
         self.ip = c.default_ip # default to '0.0.0.0'
-        self.port = int(port) if port != None else c.free_port()
+        # bind now and hand the socket to uvicorn, so no other server can take the port in between
+        self.sock = c.bind_port(port=int(port) if port != None else None, ip=self.ip)
+        self.port = self.sock.getsockname()[1]
+        c.unreserve_port(self.port)
         self.address = f"{self.ip}:{self.port}"
         self.max_request_staleness = max_request_staleness
         self.chunk_size = chunk_size
@@ -51,7 +57,6 @@ class ServerHTTP(c.Module):
                 name = module.__class__.__name__
         
         self.module = module 
-        c.print(self.module, type(self.module), module.key)
         self.key = module.key      
         # register the server
         self.name = name
@@ -63,8 +68,10 @@ class ServerHTTP(c.Module):
             self.access_module = c.module(access_module)(module=module)
         else:
             self.access_module = module.access_module
-        c.print('fam')
 
+        # responses of idempotent functions (c.cache_response, module.cache_fns or cache_fns={fn: ttl})
+        from commune.modules.server.http.response_cache import ResponseCache
+        self.response_cache = ResponseCache(ttls=ResponseCache.module_ttls(module, cache_fns), max_size=cache_size)
         self.set_api(ip=self.ip, port=self.port)
 
 
@@ -87,6 +94,8 @@ class ServerHTTP(c.Module):
 
         @self.app.post("/{fn}")
         async def forward_api(fn:str, input:dict):
+            start_time = c.time()
+            input.setdefault('address', None)
             try:
 
                 input['fn'] = fn
@@ -98,24 +107,32 @@ class ServerHTTP(c.Module):
                 kwargs = data.get('kwargs', {})
                 
                 input_kwargs = dict(fn=fn, args=args, kwargs=kwargs)
-                fn_name = f"{self.name}::{fn}"
-                c.print(f'🚀 Forwarding {input["address"]} --> {fn_name} 🚀\033', color='yellow')
 
-                result = self.forward(**input_kwargs)
+                if self.response_cache.cached(fn) and not self.sse:
+                    # the signed response is cached, so hits skip the call, the serializer and the signature
+                    result = await self.response_cache.get(fn, args, kwargs, lambda: self.async_forward_signed(**input_kwargs))
+                    signed = True
+                else:
+                    result = self.forward(**input_kwargs)
+                    signed = False
                 # if the result is a future, we need to wait for it to finish
                 if isinstance(result, dict) and 'error' in result:
                     success = False 
                 success = True
             except Exception as e:
                 success = False
+                signed = False
                 result = c.detailed_error(e)
 
-            if success:
-                c.print(f'✅ Success: {self.name}::{fn} --> {input["address"]}... ✅\033 ', color='green')
-            else:
-                c.print(f'🚨 Error: {self.name}::{fn} --> {input["address"]}... 🚨\033', color='red')
-            result = self.process_result(result)
-            c.print(result)
+            if not signed:
+                result = self.process_result(result)
+            # structured and queued, the payload itself is never rendered
+            c.log_event('info' if success else 'error', 'forward',
+                        fn=f'{self.name}::{fn}',
+                        caller=input['address'],
+                        latency=c.time() - start_time,
+                        bytes=lambda: len(result['data']) if isinstance(result, dict) and 'data' in result else None,
+                        success=success)
             return result
         
         self.serve()
@@ -198,7 +215,8 @@ class ServerHTTP(c.Module):
             c.print(f'\033🚀 Serving {self.name} on {self.address} 🚀\033')
             c.register_server(name=self.name, address = self.address, network=self.network)
             c.print(f'\033🚀 Registered {self.name} on {self.ip}:{self.port} 🚀\033')
-            uvicorn.run(self.app, host=c.default_ip, port=self.port)
+            config = uvicorn.Config(self.app, host=c.default_ip, port=self.port)
+            uvicorn.Server(config).run(sockets=[self.sock])
         except Exception as e:
             c.print(e, color='red')
             c.deregister_server(self.name, network=self.network)
@@ -220,6 +238,18 @@ class ServerHTTP(c.Module):
         return response
 
 
+    async def async_forward_signed(self, fn: str, args: List = None, kwargs: Dict = None):
+        """
+        Runs the call off the event loop and returns (signed response, whether it can be cached)
+        """
+        def forward_signed():
+            result = self.forward(fn=fn, args=args, kwargs=kwargs)
+            if c.is_generator(result):
+                result = list(result)
+            return self.process_result(result), not c.is_error(result)
+        return await asyncio.to_thread(forward_signed)
+
+
     def __del__(self):
         c.deregister_server(self.name)
 
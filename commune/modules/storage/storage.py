@@ -2,18 +2,28 @@ import commune as c
 from typing import *
 import streamlit as st
 import json
+import os
+import asyncio
+import hashlib
+import threading
+import bisect
 
 class Storage(c.Module):
-    whitelist: List = ['put_item', 'get_item', 'hash_item', 'items']
+    whitelist: List = ['put_item', 'put_items', 'get_item', 'get_item_range', 'hash_item', 'items', 'merkle_node']
     replica_prefix = 'replica'
-    shard_prefix = 'shard::'
 
     def __init__(self, 
                  max_replicas:int = 2, 
                 network='local',
                 validate:bool = False,
                 match_replica_prefix : bool = False,
-                max_shard_size:str = 200,
+                max_shard_size:str = '4mb',
+                max_io_workers:int = 16,
+                max_peer_concurrency:int = 8,
+                repair_batch_size:int = 32,
+                max_repair_batch_size:str = '64mb',
+                merkle_leaf_size:int = 32,
+                merkle_cache_ttl:float = 30,
                 min_check_interval:str = 100,
                 tag = None,
                 **kwargs):
@@ -21,14 +31,21 @@ class Storage(c.Module):
         config = self.set_config(kwargs=locals()) 
 
         self.network = config.network
-        self.max_shard_size = config.max_shard_size
+        self.max_shard_size = c.resolve_memory(config.max_shard_size)
+        self.max_io_workers = config.max_io_workers
         self.max_replicas = config.max_replicas 
         self.min_check_interval = config.min_check_interval       
+        self.max_peer_concurrency = config.max_peer_concurrency
+        self.repair_batch_size = config.repair_batch_size
+        self.max_repair_batch_size = c.resolve_memory(config.max_repair_batch_size)
+        self.merkle_leaf_size = config.merkle_leaf_size
+        self.merkle_cache_ttl = config.merkle_cache_ttl
+        self.merkle_cache = {} # (search, tag) -> {'time', 'digests', 'digest2key'}
         self.serializer = c.module('serializer')()
 
         if validate:
             self.match_replica_prefix = match_replica_prefix
-            c.thread(self.validate_loop)
+            c.thread(self.validate_loop, tag='storage')
 
     def resolve_tag(self, tag=None):
         tag = tag if tag != None else self.tag
@@ -107,6 +124,92 @@ class Storage(c.Module):
         path = k + '/metadata.json'
         return self.put_json(path, metadata)
     
+    ############ CHUNK LAND ###############
+    # items are split into raw byte chunks named by their sha256,
+    # so identical chunks across items are stored once
+
+    def chunk_dir(self, tag=None) -> str:
+        tag = self.resolve_tag(tag)
+        if tag == None:
+            tag = 'base'
+        path = self.resolve_path(f'{tag}/chunks')
+        if not c.exists(path):
+            c.mkdir(path)
+        return path
+
+    def chunk_path(self, chunk_hash:str, tag=None) -> str:
+        return f'{self.chunk_dir(tag=tag)}/{chunk_hash[:2]}/{chunk_hash}'
+
+    @staticmethod
+    def hash_chunk(chunk:bytes) -> str:
+        return hashlib.sha256(chunk).hexdigest()
+
+    def write_chunk(self, chunk:bytes, tag=None) -> str:
+        chunk_hash = self.hash_chunk(chunk)
+        path = self.chunk_path(chunk_hash, tag=tag)
+        if os.path.exists(path):
+            # dedup, the name is the content. the touch tells gc_chunks that a put is using it
+            os.utime(path)
+            return chunk_hash
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # unique per writer, identical chunks of one item are written concurrently
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(chunk)
+        os.replace(tmp_path, path)
+        return chunk_hash
+
+    def read_chunk(self, chunk_hash:str, start:int = 0, end:int = None, tag=None) -> bytes:
+        with open(self.chunk_path(chunk_hash, tag=tag), 'rb') as f:
+            f.seek(start)
+            return f.read() if end == None else f.read(end - start)
+
+    def run_io(self, fn:Callable, jobs:List[dict], timeout:int = 600) -> List:
+        """
+        Runs fn(**job) for every job on a bounded async pool of threads
+        """
+        semaphore = asyncio.Semaphore(self.max_io_workers)
+        async def run_job(job):
+            async with semaphore:
+                return await asyncio.to_thread(fn, **job)
+        return c.gather([run_job(job) for job in jobs], timeout=timeout)
+
+    def put_chunks(self, data:bytes, tag=None) -> List[str]:
+        chunk_size = self.max_shard_size
+        jobs = [{'chunk': data[i:i+chunk_size], 'tag': tag} for i in range(0, max(len(data), 1), chunk_size)]
+        return self.run_io(self.write_chunk, jobs)
+
+    def get_chunks(self, chunks:List[str], tag=None) -> bytes:
+        return b''.join(self.run_io(self.read_chunk, [{'chunk_hash': h, 'tag': tag} for h in chunks]))
+
+    def chunks(self, tag=None) -> List[str]:
+        # skips the tmp files of writes in flight
+        return [os.path.basename(p) for p in c.glob(self.chunk_dir(tag=tag)) if not p.endswith('.tmp')]
+
+    def gc_chunks(self, tag=None, grace:float = 60) -> dict:
+        """
+        Removes the chunks that no item manifest (nested replicas included) references.
+        Chunks written or reused within grace seconds of the start of the pass are kept, 
+        as a put_item in flight writes its chunks before its manifest.
+        """
+        start_time = c.time()
+        referenced = set()
+        for item in self.item_keys(tag=tag):
+            referenced.update(self.get_metadata(item, tag=tag).get('chunks', []))
+        removed = []
+        for chunk_hash in self.chunks(tag=tag):
+            if chunk_hash in referenced:
+                continue
+            path = self.chunk_path(chunk_hash, tag=tag)
+            try:
+                if os.path.getmtime(path) > start_time - grace:
+                    continue
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            removed += [chunk_hash]
+        return {'success': True, 'removed': len(removed)}
+
     def refresh_store(self, tag=None):
         tag = self.resolve_tag(tag)
         path = self.store_dir(tag=tag)
@@ -116,7 +219,6 @@ class Storage(c.Module):
         timestamp = c.timestamp()
         k = self.resolve_item_path(k, tag=tag)    
         path = {
-            'data': k +'/data.json',
             'metadata': k + '/metadata.json'
         }    
 
@@ -124,56 +226,43 @@ class Storage(c.Module):
 
         if serialize:
             data = self.serializer.serialize(data)
-
-        if isinstance(data, str):
-            size_bytes = len(data) 
-        else:
-            size_bytes = c.sizeof(data)
+        if not isinstance(data, str):
+            data = json.dumps(data)
+        # encrypt it if you want
+        if encrypt:
+            data = self.key.encrypt(data)   
+        data = data.encode('utf-8')
+
+        size_bytes = len(data) 
         c.print(f'Putting {k} with {size_bytes} bytes', color='green')
 
-        is_shard = bool(self.shard_prefix in k)
-
-        shards = []
-        if size_bytes > self.max_shard_size and not is_shard:               
-            # split it along the bytes
-            # round up to the nearest shard size
-            num_shards = (size_bytes // self.max_shard_size) + (1 if size_bytes % self.max_shard_size != 0 else 0)
-            for i in range(num_shards):
-                shard_path = f'{k}/{self.shard_prefix}{i}'
-                # split it along the bytes
-                shard = data[i*self.max_shard_size:(i+1)*self.max_shard_size]
-                assert len(shard) <= self.max_shard_size, f'Shard must be less than {self.max_shard_size} bytes, got {len(shard)}'
-                self.put_item(k=shard_path, v=shard, encrypt=encrypt, tag=tag, serialize=False)
-                shards += [shard_path]
-
-        else:
+        chunks = self.put_chunks(data, tag=tag)
+        data_hash = self.hash_chunk(data)
 
-            self.put_json(path['data'], data)
-            # encrypt it if you want
-            if encrypt:
-                data = self.key.encrypt(data)   
-            # sign it for verif
-            data = self.key.sign(data, return_json=True)
-
-       
-
-        # SAVE METADATA 
+        # SAVE METADATA (the manifest)
         metadata = {
             'size_bytes': size_bytes,
             'timestamp': timestamp,
             'encrypt': encrypt,
             'key': self.key.ss58_address ,
             'path': path,
-            'shards': shards
+            'hash': data_hash,
+            # sign it for verif
+            'signature': self.key.sign(data_hash, return_json=True),
+            'chunk_size': self.max_shard_size,
+            'chunks': chunks,
         }
-
+        if not c.exists(k):
+            c.mkdir(k)
         self.put_json(path['metadata'], metadata)
+        self.merkle_cache.clear()
 
         return {'success': True, 'key': k,  'metadata': metadata}
     
 
     def rm_item(self, k):
         k = self.resolve_item_path(k)
+        self.merkle_cache.clear()
         return c.rm(k)
 
 
@@ -195,38 +284,71 @@ class Storage(c.Module):
         k = self.resolve_item_path(k, tag=tag)
         metadata = self.get_json(k+'/metadata.json', {})
 
-        shards = metadata.get('shards', [])
-        if len(shards) > 0:
-            data = ''
-            for shard_path in metadata['shards']:
-                c.print(f'Getting shard {shard_path}')
-                shard = self.get_item(shard_path, deserialize=False)
-                c.print(f'Got shard {shard_path}, {shard}')
-                data += shard
-            data = self.serializer.deserialize(data)
+        if 'chunks' in metadata:
+            data = self.get_chunks(metadata['chunks'], tag=tag).decode('utf-8')
+            if metadata.get('encrypt', False):
+                data = self.key.decrypt(data)
         else:
-            data = self.get_json(k+'/data.json', {})
-
-
-        if isinstance(data, dict):
-            if 'data' not in data:
+            data = self.get_legacy_data(k, metadata=metadata, tag=tag)
+            if data == None:
                 return {'success': False, 'error': 'No data found'}
-            if 'encrypted' in metadata and metadata['encrypted']:
-                data['data'] = self.key.decrypt(data['data'])
-
-            if deserialize:
-                data['data'] = self.serializer.deserialize(data['data'])
-
-            data = data['data']
+            data = data.decode('utf-8')
+        if deserialize:
+            data = self.serializer.deserialize(data)
 
         # include
         if include_metadata:
-            data['metadata'] = metadata
-            return data
+            return {'data': data, 'metadata': metadata}
         else:
             return data
+
+    def get_item_range(self, k:str, start:int = 0, end:int = None, tag=None) -> bytes:
+        """
+        Reads bytes [start, end) of the stored item, touching only the chunks that overlap the range
+        """
+        k = self.resolve_item_path(k, tag=tag)
+        metadata = self.get_json(k+'/metadata.json', {})
+        if 'chunks' not in metadata:
+            data = self.get_legacy_data(k, metadata=metadata, tag=tag)
+            assert data != None, f'No data found for {k}'
+            return data[start:end]
+        assert not metadata.get('encrypt', False), 'range reads are not supported for encrypted items'
+        size_bytes = metadata['size_bytes']
+        chunk_size = metadata['chunk_size']
+        end = size_bytes if end == None else min(end, size_bytes)
+        if start >= end:
+            return b''
+        jobs = []
+        for i in range(start // chunk_size, (end - 1) // chunk_size + 1):
+            chunk_start = i * chunk_size
+            jobs += [{'chunk_hash': metadata['chunks'][i],
+                      'start': max(start - chunk_start, 0),
+                      'end': min(end - chunk_start, chunk_size),
+                      'tag': tag}]
+        return b''.join(self.run_io(self.read_chunk, jobs))
     
 
+    def get_legacy_data(self, k:str, metadata:dict = None, tag=None) -> Optional[bytes]:
+        """
+        The serialized bytes of an item written before chunking, as a data.json or a list of
+        data.json shards, None if there are none. These were stored unencrypted.
+        """
+        metadata = metadata if metadata != None else self.get_json(k+'/metadata.json', {})
+        shards = metadata.get('shards', [])
+        if len(shards) > 0:
+            shards = [self.get_legacy_data(self.resolve_item_path(shard, tag=tag), metadata={}, tag=tag) for shard in shards]
+            if None in shards:
+                return None
+            return b''.join(shards)
+        if not c.exists(k + '/data.json'):
+            return None
+        data = self.get_json(k + '/data.json', None)
+        if isinstance(data, dict) and 'data' in data:
+            data = data['data']
+        if not isinstance(data, str):
+            data = json.dumps(data)
+        return data.encode('utf-8')
+
     def hash_item(self, k: str = None, seed : int= None , seed_sep:str = '<SEED>', data=None, tag=None) -> str:
         """
         Hash a string
@@ -246,6 +368,7 @@ class Storage(c.Module):
     def rm(self, k , tag=None) -> bool:
         assert self.exists(k, tag=tag), f'Key {k} does not exist with {tag}'
         path = self.resolve_item_path(k, tag=tag)
+        self.merkle_cache.clear()
         return c.rm(path)
     
 
@@ -279,7 +402,7 @@ class Storage(c.Module):
         return c.rm(path)
     
     def validate(self, item_key:str = None):
-        items = self.items()
+        items = [k for k in self.item_keys() if not k.startswith(self.replica_prefix)]
         if len(items) == 0:
             return {'success': False, 'msg': 'No items to validate'}
         item_key = c.choice(items) if item_key == None else item_key
@@ -291,13 +414,6 @@ class Storage(c.Module):
             msg = {'success': False, 'msg': f'Not enough time since last check {time_since_checked}/{self.min_check_interval}'}
             c.print(msg, color='red')
             return msg
-        shards = self.get_shards(item_key, metadata=metadata)
-
-        if len(shards) > 0:
-            responses = []
-            for shard_item in shards:
-                responses += [self.validate(shard_item)]
-            return responses
         # get the peers 
         peers = list(self.peers().keys())
         max_replicas = min(self.max_replicas, len(peers)) 
@@ -305,7 +421,7 @@ class Storage(c.Module):
         has_enough_replicas = bool(len(replica_peers) >= max_replicas)
 
         # get the remote replica key
-        remote_item_key = f'{self.replica_prefix}/{c.hash(item_data)}'
+        remote_item_key = self.replica_key(metadata)
 
         seed = c.timestamp()
 
@@ -361,25 +477,220 @@ class Storage(c.Module):
         return {'success': True, 'metadata': metadata, 'msg': f'Validated {item_key}'}
    
 
-    def validate_loop(self, tag=None, interval=0.1, vote_inteval=1, init_timeout = 1):
+    ############ REPLICATION LAND ###############
+
+    def replica_key(self, metadata:dict) -> str:
+        # replicas live under the owner's key, so a peer can summarize exactly the replicas it holds for us
+        return f'{self.replica_prefix}/{self.key.ss58_address}/{metadata["hash"]}'
+
+    def item_keys(self, search:str = None, tag=None) -> List[str]:
+        """
+        All item keys (including nested replica keys) under the store
+        """
+        store_dir = self.store_dir(tag=tag)
+        keys = []
+        for root, dirs, files in os.walk(store_dir):
+            if 'metadata.json' in files:
+                keys += [os.path.relpath(root, store_dir)]
+                dirs.clear()
+        if search != None:
+            keys = [k for k in keys if k.startswith(search)]
+        return keys
+
+    @staticmethod
+    def key_digest(key:str) -> str:
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def merkle_children(self, digests:List[str], prefix:str = '') -> Dict[str, str]:
+        children = {}
+        for d in digests:
+            children.setdefault(d[:len(prefix)+1], []).append(d)
+        return {p: self.key_digest(''.join(ds)) for p, ds in children.items()}
+
+    def merkle_leaves(self, search:str = None, tag=None) -> Tuple[List[str], Dict[str, str]]:
+        """
+        The sorted key digests (and digest -> key) under search. A sync pass asks for one node per
+        tree level, so the store is walked once and reused for merkle_cache_ttl seconds or until a put.
+        """
+        cache_key = (search, self.resolve_tag(tag))
+        cached = self.merkle_cache.get(cache_key)
+        if cached == None or c.time() - cached['time'] > self.merkle_cache_ttl:
+            digest2key = {self.key_digest(k): k for k in self.item_keys(search=search, tag=tag)}
+            cached = {'time': c.time(), 'digests': sorted(digest2key), 'digest2key': digest2key}
+            self.merkle_cache[cache_key] = cached
+        return cached['digests'], cached['digest2key']
+
+    def merkle_node(self, prefix:str = '', search:str = None, tag=None) -> dict:
+        """
+        A node of the hash tree over the item keys, bucketed by the hex digits of each key's digest.
+        Small nodes return their keys, larger ones the hashes of their children.
+        """
+        all_digests, digest2key = self.merkle_leaves(search=search, tag=tag)
+        # the digests under the prefix are a contiguous run of the sorted list
+        start = bisect.bisect_left(all_digests, prefix)
+        end = bisect.bisect_left(all_digests, prefix + 'g')
+        digests = all_digests[start:end]
+        node = {'prefix': prefix, 'n': len(digests), 'hash': self.key_digest(''.join(digests))}
+        if len(digests) <= self.merkle_leaf_size:
+            node['keys'] = [digest2key[d] for d in digests]
+        else:
+            node['children'] = self.merkle_children(digests, prefix=prefix)
+        return node
+
+    async def async_peer_missing_keys(self, peer:str, keys:List[str], semaphore:asyncio.Semaphore) -> List[str]:
+        """
+        Compares the peer's hash tree of our replicas with the keys we expect it to hold,
+        descending only into the subtrees that differ (one round of calls per level).
+        """
+        search = f'{self.replica_prefix}/{self.key.ss58_address}'
+        digest2key = {self.key_digest(k): k for k in keys}
+        digests = sorted(digest2key)
+        missing = []
+        prefixes = ['']
+        while len(prefixes) > 0:
+            async def get_node(prefix):
+                async with semaphore:
+                    return await c.async_call(peer, 'merkle_node', prefix=prefix, search=search)
+            remote_nodes = await asyncio.gather(*[get_node(p) for p in prefixes])
+            next_prefixes = []
+            for prefix, remote_node in zip(prefixes, remote_nodes):
+                local_digests = [d for d in digests if d.startswith(prefix)]
+                if len(local_digests) == 0 or remote_node['hash'] == self.key_digest(''.join(local_digests)):
+                    continue
+                if 'keys' in remote_node:
+                    remote_keys = set(remote_node['keys'])
+                    missing += [digest2key[d] for d in local_digests if digest2key[d] not in remote_keys]
+                    continue
+                remote_children = remote_node['children']
+                local_children = self.merkle_children(local_digests, prefix=prefix)
+                next_prefixes += [p for p, h in local_children.items() if remote_children.get(p) != h]
+            prefixes = next_prefixes
+        return missing
+
+    def put_items(self, items:Dict[str, Any], tag=None) -> Dict[str, bool]:
+        """
+        Batched put_item, so a peer can be repaired with one call per batch
+        """
+        results = {}
+        for k, v in items.items():
+            try:
+                results[k] = self.put_item(k, v, tag=tag)['success']
+            except Exception as e:
+                c.print(f'Failed to put {k}: {e}', color='red')
+                results[k] = False
+        return results
+
+    def repair_batches(self, items:List[str], item2metadata:Dict[str, dict]) -> List[List[str]]:
+        """
+        Splits items into batches of at most repair_batch_size items and max_repair_batch_size bytes
+        (an item larger than that goes alone)
+        """
+        batches, batch, batch_size = [], [], 0
+        for item in items:
+            size = item2metadata[item].get('size_bytes', 0)
+            if len(batch) > 0 and (len(batch) >= self.repair_batch_size or batch_size + size > self.max_repair_batch_size):
+                batches.append(batch)
+                batch, batch_size = [], 0
+            batch.append(item)
+            batch_size += size
+        if len(batch) > 0:
+            batches.append(batch)
+        return batches
+
+    def sync_replicas(self, tag=None, timeout:int = 600) -> dict:
+        """
+        One replication pass:
+        1. compare hash trees with every peer (bounded concurrency) to find replicas the peer lost
+        2. drop those replicas and order the items by how under replicated they are
+        3. repair with batched put_items per peer
+        """
+        my_name = getattr(self, 'server_name', None)
+        peers = [p for p in self.peers().keys() if p != my_name]
+        max_replicas = min(self.max_replicas, len(peers))
+        items = [k for k in self.item_keys(tag=tag) if not k.startswith(self.replica_prefix)]
+        item2metadata = {k: self.get_metadata(k, tag=tag) for k in items}
+        item2metadata = {k: m for k, m in item2metadata.items() if 'hash' in m}
+        key2item = {self.replica_key(m): k for k, m in item2metadata.items()}
+
+        peer2keys = {peer: [] for peer in peers}
+        for k, metadata in item2metadata.items():
+            metadata['replicas'] = [p for p in metadata.get('replicas', []) if p in peer2keys]
+            for peer in metadata['replicas']:
+                peer2keys[peer] += [self.replica_key(metadata)]
+
+        semaphore = asyncio.Semaphore(self.max_peer_concurrency)
+        async def find_missing(peer):
+            try:
+                return await self.async_peer_missing_keys(peer, peer2keys[peer], semaphore)
+            except Exception as e:
+                # unreachable is not the same as lost, leave this peer for the next pass
+                c.print(f'Failed to sync with {peer}, skipping it this pass: {e}', color='red')
+                return None
+        peers_to_check = [p for p in peers if len(peer2keys[p]) > 0]
+        missing = c.gather([find_missing(p) for p in peers_to_check], timeout=timeout)
+        unreachable = [p for p, m in zip(peers_to_check, missing) if m == None]
+        missing = [m for m in missing if m != None]
+
+        changed = set()
+        for peer, missing_keys in zip([p for p in peers_to_check if p not in unreachable], missing):
+            for key in missing_keys:
+                item = key2item[key]
+                item2metadata[item]['replicas'].remove(peer)
+                changed.add(item)
+
+        # the least replicated items get repaired first
+        under_replicated = [k for k, m in item2metadata.items() if len(m['replicas']) < max_replicas]
+        under_replicated = sorted(under_replicated, key=lambda k: len(item2metadata[k]['replicas']))
+        peer2batch = {peer: [] for peer in peers}
+        for item in under_replicated:
+            metadata = item2metadata[item]
+            candidates = [p for p in peers if p not in metadata['replicas'] and p not in unreachable]
+            # spread the load over the peers with the smallest batches
+            candidates = sorted(candidates, key=lambda p: len(peer2batch[p]))
+            for peer in candidates[:max_replicas - len(metadata['replicas'])]:
+                peer2batch[peer] += [item]
+
+        async def repair(peer, batch):
+            added = []
+            for chunk in self.repair_batches(batch, item2metadata):
+                payload = {self.replica_key(item2metadata[item]): self.get_item(item, tag=tag) for item in chunk}
+                async with semaphore:
+                    try:
+                        results = await c.async_call(peer, 'put_items', items=payload, timeout=timeout)
+                    except Exception as e:
+                        c.print(f'Failed to repair {peer}: {e}', color='red')
+                        break
+                added += [item for item in chunk if results.get(self.replica_key(item2metadata[item]), False)]
+            return added
+
+        repair_peers = [p for p in peers if len(peer2batch[p]) > 0]
+        repaired = c.gather([repair(p, peer2batch[p]) for p in repair_peers], timeout=timeout)
+        for peer, added in zip(repair_peers, repaired):
+            for item in added:
+                item2metadata[item]['replicas'] += [peer]
+                changed.add(item)
+
+        for item in items:
+            if item in item2metadata:
+                item2metadata[item]['last_checked'] = c.timestamp()
+                self.put_metadata(item, item2metadata[item], tag=tag)
+
+        return {'success': True, 
+                'items': len(item2metadata), 
+                'lost': sum([len(m) for m in missing]), 
+                'unreachable': unreachable,
+                'repaired': sum([len(a) for a in repaired]), 
+                'changed': len(changed)}
+
+    def validate_loop(self, tag=None, interval=10, init_timeout = 1):
         c.sleep(init_timeout)
-        import time
         tag = self.tag if tag == None else tag
         while True:
             try:
-                items = self.items(tag=tag)
-                if len(items) == 0:
-                    c.print('No items to validate', color='red')
-                    time.sleep(1.0)
-                    continue
-                item_key = c.choice(items)
-                metadata = self.get_metadata(item_key)
-                num_replicas = len(metadata.get('replicas', []))
-                c.print(f'Validating {item_key} key with {num_replicas} replicas -->', color='green')
-                self.validate(item_key)
-                time.sleep(interval)
+                c.print(self.sync_replicas(tag=tag), color='green')
             except Exception as e:
                 c.print(e, color='red')
+            c.sleep(interval)
 
 
     @classmethod
@@ -412,13 +723,6 @@ class Storage(c.Module):
         return {'success': True, 'msg': 'its all done fam'}
 
 
-    def get_shards(self, k:str, tag=None, metadata=None) -> List:
-        metadata = self.get_metadata(k, tag=tag) if metadata == None else metadata
-        store_dir = self.store_dir(tag=tag) 
-        shards = metadata.get('shards', [])
-        return [x.replace(store_dir, '') for x in shards]
-
-
     def put_dummies(self, tag=None):
         tag = self.resolve_tag(tag)
         for i in range(10):
@@ -1,120 +1,383 @@
 import commune as c
+from typing import *
+import numpy as np
 import torch
+import os
+import json
 
 class VectorStore(c.Module):
-    def __init__(self, 
-                    config = None,
+    metrics = ['cosine', 'dot', 'l2']
+    dtypes = ['float32', 'float16', 'int8']
+
+    def __init__(self,
+                    model = 'model.llama',
+                    dim:int = None,
+                    metric:str = 'cosine',
+                    dtype:str = 'float32',
+                    capacity:int = 1024,
+                    nlist:int = None,
+                    nprobe:int = 8,
+                    block_size:int = 65536,
+                    path:str = None,
                     **kwargs
                  ):
-        self.set_config(config=config, kwargs=kwargs)
-        self.k2index = {}
-        self.index2k = {}
-        self.vectors = []
-        self.example_vector = None
-        config = self.set_config(config)
-        self.set_model(config.model)
-        
-        
+        config = self.set_config(kwargs=locals())
+        assert config.metric in self.metrics, f'metric must be one of {self.metrics}'
+        assert config.dtype in self.dtypes, f'dtype must be one of {self.dtypes}'
+        self.metric = config.metric
+        self.dtype = config.dtype
+        self.nprobe = config.nprobe
+        self.block_size = config.block_size
+        self.set_index(dim=config.dim, capacity=config.capacity)
+        if config.path != None and c.exists(config.path + '/meta.json'):
+            self.load(config.path)
+        if config.model != None:
+            self.set_model(config.model)
 
     def set_model(self, model='model'):
         self.model = c.connect(model)
-        
-        
-    def encode(self, text:str, **kwargs):
-        return self.model.encode(text, **kwargs)
-    
-
-    def resolve_vector(self, v:torch.Tensor):
-        
-        if isinstance(v, list):
-            v = torch.tensor(v)
-        elif isinstance(v, np.ndarray):
-            v = torch.from_numpy(v)
-            
-        assert isinstance(v, torch.Tensor), f'Expected a torch.Tensor, got {type(v)}'
-        if self.example_vector == None:
-            self.example_vector = v
-        assert self.example_vector.shape == v.shape, f'Expected a vector of shape {self.example_vector.shape}, got {v.shape}'
-        
-        return v
-    
-    @classmethod
+
     def resolve_model(self, model=None):
         if model == None:
             model = self.model
         elif isinstance(model, str):
             model = c.connect(model)
-            
         return model
-        
+
+    def encode(self, text:str, **kwargs):
+        return self.model.encode(text, **kwargs)
 
     def embed(self, text:str, model=None, **kwargs):
         model = self.resolve_model(model)
-        vectors = self.model.embed(text, **kwargs)
-    
-    def add_vector(self, k, v , verbose=True):
-    
-
-        v = self.resolve_vector(v)
-        stacked_vectors = []
-        if len(self.vectors) == 0:
-            stacked_vectors = [v]
-        else:
-            stacked_vectors = [self.vectors, v]
-        
-        self.vectors = torch.stack(stacked_vectors)
-        idx = len(self.vectors) - 1
+        return model.embed(text, **kwargs)
+
+    def set_index(self, dim:int = None, capacity:int = 1024):
+        """
+        Preallocates the vector matrix, which doubles when full so inserts are amortized O(1)
+        """
+        self.dim = dim
+        self.capacity = capacity
+        self.n = 0
+        self.keys = []
+        self.k2index = {}
+        self.vectors = None
+        self.scales = None # per vector scale (int8)
+        self.sq_norms = None # per vector squared norm (l2)
+        self.centroids = None # ivf centroids
+        self.assignments = None # ivf list of each vector
+        self.lists = None # ivf inverted lists, rebuilt lazily from the assignments
+        if dim != None:
+            self.allocate(capacity)
+
+    def allocate(self, capacity:int):
+        vectors = np.zeros((capacity, self.dim), dtype=self.dtype)
+        scales = np.ones(capacity, dtype=np.float32)
+        sq_norms = np.zeros(capacity, dtype=np.float32)
+        assignments = np.zeros(capacity, dtype=np.int32)
+        if self.vectors is not None:
+            vectors[:self.n] = self.vectors[:self.n]
+            scales[:self.n] = self.scales[:self.n]
+            sq_norms[:self.n] = self.sq_norms[:self.n]
+            assignments[:self.n] = self.assignments[:self.n]
+        self.vectors, self.scales, self.sq_norms, self.assignments = vectors, scales, sq_norms, assignments
+        self.capacity = capacity
+
+    def resolve_vectors(self, v) -> np.ndarray:
+        if isinstance(v, torch.Tensor):
+            v = v.detach().cpu().numpy()
+        v = np.asarray(v, dtype=np.float32)
+        if v.ndim == 1:
+            v = v[None, :]
+        if self.dim == None:
+            self.dim = v.shape[1]
+            self.allocate(self.capacity)
+        assert v.shape[1] == self.dim, f'Expected vectors of dimension {self.dim}, got {v.shape[1]}'
+        if self.metric == 'cosine':
+            v = v / np.maximum(np.linalg.norm(v, axis=1, keepdims=True), 1e-12)
+        return v
+    resolve_vector = resolve_vectors
+
+    def quantize(self, v:np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if self.dtype == 'int8':
+            scales = np.maximum(np.abs(v).max(axis=1), 1e-12) / 127
+            return np.round(v / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+        return v.astype(self.dtype), np.ones(len(v), dtype=np.float32)
+
+    def dequantize(self, start:int, end:int) -> np.ndarray:
+        v = self.vectors[start:end].astype(np.float32)
+        if self.dtype == 'int8':
+            v *= self.scales[start:end, None]
+        return v
+
+    def add_vectors(self, keys:List[str], vectors, verbose:bool=False) -> dict:
+        vectors = self.resolve_vectors(vectors)
+        assert len(keys) == len(vectors), f'Got {len(keys)} keys for {len(vectors)} vectors'
+        # existing keys are overwritten in place
+        new = [i for i, k in enumerate(keys) if k not in self.k2index]
+        for i, k in enumerate(keys):
+            if k in self.k2index:
+                self.set_rows(np.array([self.k2index[k]]), vectors[i:i+1])
+        if len(new) == 0:
+            return {'success': True, 'n': self.n, 'added': 0}
+        vectors = vectors[new]
+        if self.n + len(vectors) > self.capacity:
+            self.allocate(max(self.capacity * 2, self.n + len(vectors)))
+        idxs = np.arange(self.n, self.n + len(vectors))
+        self.set_rows(idxs, vectors)
+        for i in new:
+            self.k2index[keys[i]] = len(self.keys)
+            self.keys.append(keys[i])
+        self.n += len(vectors)
         if verbose:
-            c.print(f'Adding vector {k} at index {idx}, {self.vectors}')
-        self.k2index[k] = idx
-        self.index2k[idx] = k
-        
+            c.print(f'Added {len(vectors)} vectors (n={self.n})')
+        return {'success': True, 'n': self.n, 'added': len(vectors)}
+
+    def ensure_writeable(self):
+        if not self.vectors.flags.writeable:
+            # a loaded memmap is read only, copy it into ram on the first write
+            self.vectors = np.array(self.vectors)
+
+    def set_rows(self, idxs:np.ndarray, vectors:np.ndarray):
+        self.ensure_writeable()
+        self.vectors[idxs], self.scales[idxs] = self.quantize(vectors)
+        self.sq_norms[idxs] = (vectors ** 2).sum(axis=1)
+        if self.centroids is not None:
+            self.assignments[idxs] = self.assign(vectors)
+            self.lists = None
+
+    def add_vector(self, k, v, verbose=False):
+        return self.add_vectors([k], [self.resolve_vectors(v)[0]], verbose=verbose)
+
     def rm_vector(self, k):
-        last_idx = len(self.vectors) - 1
-        print(f'last_idx: {last_idx}')
         # swap the vector to be removed with the last vector
-        idx = self.k2index[k]
-        last_k = self.index2k[last_idx]
-        last_v = self.vectors[last_idx]
-        self.vectors[idx] = last_v
-        self.k2index[last_k] = idx
-        self.index2k[idx] = last_k
-        # remove the last vector
-        del self.index2k[last_idx]
-        del self.k2index[last_k]
-        
-        self.vectors = self.vectors[:-1]
-
-
-
-
-    def search(self, query, top_k=10, chunks=1):
-        assert len(self.vectors) > 0, 'No vectors stored in the vector store'
-        c.print(f'query: {query}', 'vector shape:', self.vectors.shape)
-        query_vector = torch.tensor(query) 
-        if len(query_vector.shape) == 1:
-            query_vector = query_vector.unsqueeze(0)
-        # Convert the query into a tensor (assuming it's a vector representation)
-        print(query_vector.shape, self.vectors.shape)
-        similarities = torch.einsum('ij,kj->i', query_vector, self.vectors)  # Compute the similarity scores between the query and stored vectors
-        indices = similarities.argsort(descending=True)[:top_k]  # Sort the similarity scores and retrieve the indices of the top-k results
-        results = {}  # Create an empty dictionary to store the results
-        indices = indices.tolist()  # Convert the indices tensor to a list
-        for idx in indices:
-            key = self.index2k[idx]  # Retrieve the key corresponding to the index
-            score = similarities[idx].item()  # Retrieve the similarity score for the corresponding index
-            results[key] = score  # Store the key-score pair in the results dictionary
-        return results  # Return the dictionary of results
+        self.ensure_writeable()
+        idx = self.k2index.pop(k)
+        last_idx = self.n - 1
+        if idx != last_idx:
+            last_k = self.keys[last_idx]
+            for a in [self.vectors, self.scales, self.sq_norms, self.assignments]:
+                a[idx] = a[last_idx]
+            self.keys[idx] = last_k
+            self.k2index[last_k] = idx
+        self.keys.pop()
+        self.n -= 1
+        self.lists = None
+        return {'success': True, 'n': self.n}
 
+    def __len__(self):
+        return self.n
+
+    def score(self, queries:np.ndarray, start:int = 0, end:int = None, idxs:np.ndarray = None) -> np.ndarray:
+        """
+        Scores queries against a block of rows (or the given rows), higher is better
+        """
+        if idxs is None:
+            vectors, scales, sq_norms = self.vectors[start:end], self.scales[start:end], self.sq_norms[start:end]
+        else:
+            vectors, scales, sq_norms = self.vectors[idxs], self.scales[idxs], self.sq_norms[idxs]
+        scores = queries @ vectors.astype(np.float32).T
+        if self.dtype == 'int8':
+            scores *= scales[None, :]
+        if self.metric == 'l2':
+            scores = 2 * scores - sq_norms[None, :] - (queries ** 2).sum(axis=1, keepdims=True)
+        return scores
+
+    @staticmethod
+    def topk(scores:np.ndarray, k:int) -> np.ndarray:
+        k = min(k, scores.shape[1])
+        idxs = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, idxs, axis=1), axis=1)
+        return np.take_along_axis(idxs, order, axis=1)
+
+    def search_flat(self, queries:np.ndarray, top_k:int) -> Tuple[np.ndarray, np.ndarray]:
+        # keep a running top k over blocks, so memory stays at num_queries x block_size
+        best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+        best_idxs = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, self.n, self.block_size):
+            end = min(start + self.block_size, self.n)
+            scores = self.score(queries, start, end)
+            top = self.topk(scores, top_k)
+            scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+            idxs = np.concatenate([best_idxs, top + start], axis=1)
+            top = self.topk(scores, top_k)
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_idxs = np.take_along_axis(idxs, top, axis=1)
+        return best_scores, best_idxs
+
+    def search_ivf(self, queries:np.ndarray, top_k:int, nprobe:int) -> Tuple[np.ndarray, np.ndarray]:
+        lists = self.get_lists()
+        probes = self.topk(self.centroid_scores(queries), nprobe)
+        best_scores = np.full((len(queries), top_k), -np.inf, dtype=np.float32)
+        best_idxs = np.full((len(queries), top_k), -1, dtype=np.int64)
+        for i, q in enumerate(queries):
+            candidates = np.concatenate([lists[p] for p in probes[i]])
+            if len(candidates) == 0:
+                continue
+            scores = self.score(q[None, :], idxs=candidates)
+            top = self.topk(scores, top_k)[0]
+            best_scores[i, :len(top)] = scores[0, top]
+            best_idxs[i, :len(top)] = candidates[top]
+        return best_scores, best_idxs
+
+    def search_batch(self, queries, top_k:int = 10, nprobe:int = None, exact:bool = False) -> List[Dict[str, float]]:
+        """
+        Top k keys per query; uses the ivf index when trained unless exact=True
+        """
+        if self.n == 0:
+            return [{} for _ in range(len(queries))]
+        queries = self.resolve_vectors(queries)
+        nprobe = self.nprobe if nprobe == None else nprobe
+        if self.centroids is None or exact:
+            scores, idxs = self.search_flat(queries, top_k)
+        else:
+            scores, idxs = self.search_ivf(queries, top_k, nprobe)
+        return [{self.keys[i]: float(s) for s, i in zip(row_scores, row_idxs) if i >= 0}
+                for row_scores, row_idxs in zip(scores.tolist(), idxs.tolist())]
+
+    def search(self, query, top_k=10, **kwargs) -> Dict[str, float]:
+        assert self.n > 0, 'No vectors stored in the vector store'
+        return self.search_batch(self.resolve_vectors(query)[:1], top_k=top_k, **kwargs)[0]
+
+    ############ IVF LAND ###############
+
+    def centroid_scores(self, queries:np.ndarray) -> np.ndarray:
+        scores = queries @ self.centroids.T
+        if self.metric == 'l2':
+            scores = 2 * scores - (self.centroids ** 2).sum(axis=1)[None, :]
+        return scores
+
+    def assign(self, vectors:np.ndarray) -> np.ndarray:
+        return np.concatenate([self.centroid_scores(vectors[i:i+self.block_size]).argmax(axis=1)
+                               for i in range(0, len(vectors), self.block_size)]).astype(np.int32)
+
+    def train_index(self, nlist:int = None, iters:int = 10, sample_size:int = 65536, seed:int = 0) -> dict:
+        """
+        Trains the ivf centroids with k-means on a sample and assigns every vector to its list.
+        More lists and fewer probes trade recall for latency.
+        """
+        nlist = nlist or self.config.get('nlist') or max(1, int(np.sqrt(self.n)))
+        assert self.n >= nlist, f'Need at least {nlist} vectors to train {nlist} lists'
+        rng = np.random.default_rng(seed)
+        sample_idxs = np.sort(rng.choice(self.n, size=min(sample_size, self.n), replace=False))
+        sample = self.vectors[sample_idxs].astype(np.float32) * self.scales[sample_idxs, None]
+        self.centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iters):
+            labels = self.assign(sample)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            nonempty = counts > 0
+            self.centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+            if self.metric == 'cosine':
+                self.centroids /= np.maximum(np.linalg.norm(self.centroids, axis=1, keepdims=True), 1e-12)
+        for start in range(0, self.n, self.block_size):
+            end = min(start + self.block_size, self.n)
+            self.assignments[start:end] = self.assign(self.dequantize(start, end))
+        self.lists = None
+        return {'success': True, 'nlist': nlist, 'n': self.n}
+
+    def get_lists(self) -> List[np.ndarray]:
+        if self.lists is None:
+            assignments = self.assignments[:self.n]
+            order = np.argsort(assignments, kind='stable')
+            bounds = np.searchsorted(assignments[order], np.arange(len(self.centroids) + 1))
+            self.lists = [order[bounds[i]:bounds[i+1]] for i in range(len(self.centroids))]
+        return self.lists
+
+    ############ PERSISTENCE LAND ###############
+
+    def resolve_index_path(self, path:str = None) -> str:
+        path = path or self.config.get('path') or self.resolve_path('index')
+        if not c.exists(path):
+            c.mkdir(path)
+        return path
+
+    @staticmethod
+    def replace_file(path:str, write:Callable):
+        # written next to the target and renamed over it, so a live memmap of the old file
+        # (the index may have been loaded from this path) keeps its data
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+    def save(self, path:str = None) -> dict:
+        path = self.resolve_index_path(path)
+        arrays = {'vectors': self.vectors, 'scales': self.scales, 'sq_norms': self.sq_norms, 'assignments': self.assignments}
+        for name, array in arrays.items():
+            self.replace_file(f'{path}/{name}.npy', lambda f: np.save(f, array[:self.n]))
+        if self.centroids is not None:
+            self.replace_file(path + '/centroids.npy', lambda f: np.save(f, self.centroids))
+        meta = {'dim': self.dim, 'n': self.n, 'metric': self.metric, 'dtype': self.dtype,
+                'keys': self.keys, 'ivf': self.centroids is not None}
+        self.replace_file(path + '/meta.json', lambda f: f.write(json.dumps(meta).encode()))
+        return {'success': True, 'path': path, 'n': self.n}
+
+    def load(self, path:str = None) -> dict:
+        """
+        Memory maps the saved vectors, so a large index opens without reading it into ram
+        """
+        path = self.resolve_index_path(path)
+        meta = c.get_json(path + '/meta.json')
+        self.metric, self.dtype, self.dim, self.n = meta['metric'], meta['dtype'], meta['dim'], meta['n']
+        self.vectors = np.load(path + '/vectors.npy', mmap_mode='r')
+        self.scales = np.load(path + '/scales.npy')
+        self.sq_norms = np.load(path + '/sq_norms.npy')
+        self.assignments = np.load(path + '/assignments.npy')
+        self.centroids = np.load(path + '/centroids.npy') if meta['ivf'] else None
+        self.capacity = self.n
+        self.keys = meta['keys']
+        self.k2index = {k: i for i, k in enumerate(self.keys)}
+        self.lists = None
+        return {'success': True, 'path': path, 'n': self.n}
+
+    @classmethod
+    def benchmark(cls, n:int = 1_000_000, dim:int = 128, num_queries:int = 100, top_k:int = 10,
+                  nlist:int = 1024, nprobes:List[int] = [1, 4, 16, 64], dtype:str = 'float32',
+                  metric:str = 'cosine', batch_size:int = 100_000, seed:int = 0) -> dict:
+        """
+        Recall@k against exact search and per query latency for the flat and ivf indices
+        """
+        rng = np.random.default_rng(seed)
+        self = cls(model=None, dim=dim, dtype=dtype, metric=metric, capacity=n)
+        # clustered data, so the ivf index has structure to exploit
+        centers = rng.standard_normal((nlist, dim)).astype(np.float32)
+        t = c.time()
+        for start in range(0, n, batch_size):
+            size = min(batch_size, n - start)
+            vectors = centers[rng.integers(nlist, size=size)] + 0.5 * rng.standard_normal((size, dim)).astype(np.float32)
+            self.add_vectors(list(range(start, start + size)), vectors)
+        results = {'n': n, 'dim': dim, 'dtype': dtype, 'add_per_second': n / (c.time() - t)}
+        queries = centers[rng.integers(nlist, size=num_queries)] + 0.5 * rng.standard_normal((num_queries, dim)).astype(np.float32)
+
+        t = c.time()
+        truth = self.search_batch(queries, top_k=top_k, exact=True)
+        results['flat_ms'] = 1000 * (c.time() - t) / num_queries
+
+        t = c.time()
+        self.train_index(nlist=nlist)
+        results['train_seconds'] = c.time() - t
+        for nprobe in nprobes:
+            t = c.time()
+            found = self.search_batch(queries, top_k=top_k, nprobe=nprobe)
+            latency = 1000 * (c.time() - t) / num_queries
+            recall = np.mean([len(set(f) & set(r)) / len(r) for f, r in zip(found, truth)])
+            results[f'ivf_nprobe_{nprobe}'] = {'ms': latency, 'recall': float(recall)}
+        return results
 
     @classmethod
     def test(cls):
-        self = cls()
+        self = cls(model=None, metric='dot')
         self.add_vector('test', [1,2,3])
         assert self.search([1,2,3]) == {'test': 14.0}
         self.rm_vector('test')
-        assert len(self.vectors) == 0
+        assert len(self) == 0
+
+        self = cls(model=None, capacity=2)
+        vectors = np.random.randn(256, 16)
+        self.add_vectors([str(i) for i in range(256)], vectors)
+        assert self.capacity >= 256
+        assert list(self.search(vectors[7], top_k=1).keys()) == ['7']
+        self.train_index(nlist=8)
+        assert '7' in self.search(vectors[7], top_k=5, nprobe=8)
         print('test passed')
-        
-        
-        
@@ -0,0 +1,255 @@
+import os
+import sys
+import numpy as np
+from collections.abc import Mapping, Sequence
+from typing import Any, Dict, List, Optional
+from commune.modules.subspace.utils import U16_MAX
+
+
+def take_ragged(indptr:np.ndarray, values:List[np.ndarray], rows:np.ndarray):
+    """
+    Selects rows of a CSR structure, returns the new indptr and the gathered values
+    """
+    starts, ends = indptr[rows], indptr[rows + 1]
+    lengths = ends - starts
+    new_indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_indptr[1:])
+    # position of every kept entry: its row start plus its offset within the row
+    offsets = np.arange(new_indptr[-1]) - np.repeat(new_indptr[:-1], lengths)
+    positions = np.repeat(starts, lengths) + offsets
+    return new_indptr, [v[positions] for v in values]
+
+
+class ModuleRow(Mapping):
+    """
+    Read only dict view of one module in a ModuleTable, values are formatted on access
+    """
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table:'ModuleTable', row:int):
+        self.table = table
+        self.row = row
+
+    def __getitem__(self, field:str) -> Any:
+        return self.table.value(field, self.row)
+
+    def __iter__(self):
+        return iter(self.table.fields)
+
+    def __len__(self) -> int:
+        return len(self.table.fields)
+
+    def to_dict(self) -> dict:
+        return {field: self[field] for field in self}
+
+    def __repr__(self) -> str:
+        return repr(self.to_dict())
+
+
+class ModuleTable(Sequence):
+    """
+    Columnar table of the modules of a subnet.
+
+    Numeric fields are int64 arrays, string fields are arrays of interned strings and stake_from
+    (and weight) are CSR structures: the entries of row i are indptr[i]:indptr[i+1]. Lookups by
+    name, key and uid go through indexes that are built once, and amounts are formatted a column
+    at a time. Indexing or iterating yields ModuleRow views, so code written against the old list
+    of dicts keeps working.
+    """
+    int_fields = ['uid', 'emission', 'incentive', 'dividends', 'trust', 'regblock', 'last_update', 'delegation_fee', 'stake', 'balance']
+    str_fields = ['address', 'name', 'key']
+    amount_fields = ['emission', 'stake', 'balance']
+    ratio_fields = ['incentive', 'dividends']
+    field_order = ['uid', 'address', 'name', 'key', 'emission', 'incentive', 'trust', 'dividends',
+                   'stake_from', 'regblock', 'last_update', 'delegation_fee', 'stake', 'weight', 'balance']
+
+    def __init__(self, columns:Dict[str, np.ndarray], fmt:str = 'nano', token_decimals:int = 9):
+        self.columns = columns
+        self.fmt = fmt
+        self.token_decimals = token_decimals
+        self.fields = [f for f in self.field_order if f in columns or f + '_indptr' in columns]
+        self.formatted = {} # field -> formatted column (as a python list)
+        self.indexes = {} # field -> {value: row}
+
+    @classmethod
+    def from_state(cls, state:Dict[str, Any], fmt:str = 'nano', token_decimals:int = 9) -> 'ModuleTable':
+        """
+        Builds the table from the chain state gathered by Subspace.modules
+        """
+        uids = list(state['uid2key'].keys())
+        keys = [state['uid2key'][uid] for uid in uids]
+        intern = sys.intern
+        columns = {
+            'uid': np.array(uids, dtype=np.int64),
+            'key': np.array([intern(k) for k in keys], dtype=object),
+            'name': np.array([intern(state['names'][uid]) for uid in uids], dtype=object),
+            'address': np.array([intern(state['addresses'][uid]) for uid in uids], dtype=object),
+            'emission': np.array([state['emission'][uid] for uid in uids], dtype=np.int64),
+            'incentive': np.array([state['incentive'][uid] for uid in uids], dtype=np.int64),
+            'dividends': np.array([state['dividends'][uid] for uid in uids], dtype=np.int64),
+            'trust': np.array([state['trust'][uid] for uid in uids], dtype=np.int64),
+            'regblock': np.array([state['regblock'].get(uid, 0) for uid in uids], dtype=np.int64),
+            'last_update': np.array([state['last_update'][uid] for uid in uids], dtype=np.int64),
+            'delegation_fee': np.array([state['delegation_fee'].get(k, 20) for k in keys], dtype=np.int64),
+        }
+
+        # stake_from as CSR, with the staker keys interned into one vocabulary
+        staker2idx = {}
+        lengths, stakers, amounts = [], [], []
+        for k in keys:
+            stake_from = state['stake_from'].get(k, [])
+            lengths.append(len(stake_from))
+            for staker, amount in stake_from:
+                stakers.append(staker2idx.setdefault(staker, len(staker2idx)))
+                amounts.append(amount)
+        columns['stake_from_indptr'] = np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)]).astype(np.int64)
+        columns['stake_from_staker'] = np.array(stakers, dtype=np.int32)
+        columns['stake_from_amount'] = np.array(amounts, dtype=np.int64)
+        columns['stakers'] = np.array([intern(s) for s in staker2idx], dtype=object)
+        # per row sums from the running total, exact in int64
+        totals = np.concatenate([[0], np.cumsum(columns['stake_from_amount'], dtype=np.int64)])
+        indptr = columns['stake_from_indptr']
+        columns['stake'] = totals[indptr[1:]] - totals[indptr[:-1]]
+
+        if 'weights' in state:
+            weights = [state['weights'][uid] for uid in uids]
+            weights = [w.value if hasattr(w, 'value') else w for w in weights]
+            assert all(isinstance(w, list) for w in weights), 'Invalid weights, expected a list of [uid, weight] per module'
+            columns['weight_indptr'] = np.concatenate([[0], np.cumsum([len(w) for w in weights], dtype=np.int64)]).astype(np.int64)
+            pairs = np.array([p for w in weights for p in w], dtype=np.int64).reshape(-1, 2)
+            columns['weight_uid'], columns['weight_value'] = pairs[:, 0].copy(), pairs[:, 1].copy()
+        if 'balances' in state:
+            columns['balance'] = np.array([state['balances'].get(k, 0) for k in keys], dtype=np.int64)
+
+        return cls(columns, fmt=fmt, token_decimals=token_decimals)
+
+    ############ ACCESS LAND ###############
+
+    def __len__(self) -> int:
+        return len(self.columns['uid'])
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return self.take(np.arange(len(self))[row])
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(f'Row {row} out of range for {len(self)} modules')
+        return ModuleRow(self, row)
+
+    def column(self, field:str) -> list:
+        """
+        The formatted values of a field for every module, computed once per table
+        """
+        if field not in self.formatted:
+            if field == 'stake_from':
+                amounts = self.format_amounts(self.columns['stake_from_amount']).tolist()
+                stakers = self.columns['stakers'][self.columns['stake_from_staker']].tolist()
+                pairs = list(zip(stakers, amounts))
+                indptr = self.columns['stake_from_indptr'].tolist()
+                values = [pairs[indptr[i]:indptr[i + 1]] for i in range(len(self))]
+            elif field == 'weight':
+                pairs = np.stack([self.columns['weight_uid'], self.columns['weight_value']], axis=1).tolist()
+                indptr = self.columns['weight_indptr'].tolist()
+                values = [pairs[indptr[i]:indptr[i + 1]] for i in range(len(self))]
+            elif field in self.amount_fields:
+                values = self.format_amounts(self.columns[field]).tolist()
+            elif field in self.ratio_fields:
+                values = (self.columns[field] / U16_MAX).tolist()
+            else:
+                values = self.columns[field].tolist()
+            self.formatted[field] = values
+        return self.formatted[field]
+
+    def value(self, field:str, row:int) -> Any:
+        if field not in self.fields:
+            raise KeyError(field)
+        return self.column(field)[row]
+
+    def format_amounts(self, amounts:np.ndarray) -> np.ndarray:
+        if self.fmt in ['token', 'unit', 'j', 'J']:
+            return amounts / (10**self.token_decimals)
+        return amounts
+
+    def index(self, field:str) -> Dict[Any, int]:
+        if field not in self.indexes:
+            self.indexes[field] = {v: i for i, v in enumerate(self.columns[field].tolist())}
+        return self.indexes[field]
+
+    def row(self, field:str, value:Any) -> Optional[ModuleRow]:
+        """
+        The module whose field (name, key or uid) equals value, None if there is none
+        """
+        i = self.index(field).get(value)
+        return None if i == None else ModuleRow(self, i)
+
+    def mapping(self, key_field:str, value_field:str) -> dict:
+        return dict(zip(self.columns[key_field].tolist(), self.column(value_field)))
+
+    def staked_by(self, staker:str) -> Dict[str, Any]:
+        """
+        {module name: formatted amount} for every module the staker key stakes to
+        """
+        idx = np.flatnonzero(self.columns['stakers'] == staker)
+        if len(idx) == 0:
+            return {}
+        entries = np.flatnonzero(self.columns['stake_from_staker'] == idx[0])
+        rows = np.searchsorted(self.columns['stake_from_indptr'], entries, side='right') - 1
+        amounts = self.format_amounts(self.columns['stake_from_amount'][entries])
+        return dict(zip(self.columns['name'][rows].tolist(), amounts.tolist()))
+
+    ############ SELECT LAND ###############
+
+    def take(self, rows:np.ndarray) -> 'ModuleTable':
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = {k: v[rows] for k, v in self.columns.items() if k in self.int_fields + self.str_fields}
+        indptr, (stakers, amounts) = take_ragged(self.columns['stake_from_indptr'],
+                                                 [self.columns['stake_from_staker'], self.columns['stake_from_amount']], rows)
+        columns.update({'stake_from_indptr': indptr, 'stake_from_staker': stakers,
+                        'stake_from_amount': amounts, 'stakers': self.columns['stakers']})
+        if 'weight_indptr' in self.columns:
+            indptr, (uids, values) = take_ragged(self.columns['weight_indptr'],
+                                                 [self.columns['weight_uid'], self.columns['weight_value']], rows)
+            columns.update({'weight_indptr': indptr, 'weight_uid': uids, 'weight_value': values})
+        return ModuleTable(columns, fmt=self.fmt, token_decimals=self.token_decimals)
+
+    def search(self, search:str) -> 'ModuleTable':
+        mask = np.fromiter((search in name for name in self.columns['name']), dtype=bool, count=len(self))
+        return self.take(np.flatnonzero(mask))
+
+    def filter_keys(self, keys) -> 'ModuleTable':
+        keys = set(keys)
+        mask = np.fromiter((k in keys for k in self.columns['key']), dtype=bool, count=len(self))
+        return self.take(np.flatnonzero(mask))
+
+    def to_dicts(self) -> List[dict]:
+        columns = [self.column(f) for f in self.fields]
+        return [dict(zip(self.fields, values)) for values in zip(*columns)]
+
+    def df(self):
+        import pandas as pd
+        return pd.DataFrame({f: self.column(f) for f in self.fields})
+
+    ############ CACHE LAND ###############
+
+    def save(self, path:str) -> str:
+        """
+        Saves the raw columns as one uncompressed npz (strings as fixed width unicode)
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        arrays = {k: (v.astype(str) if v.dtype == object else v) for k, v in self.columns.items()}
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path:str, fmt:str = 'nano', token_decimals:int = 9) -> 'ModuleTable':
+        with np.load(path, allow_pickle=False) as data:
+            columns = {k: data[k] for k in data.files}
+        intern = sys.intern
+        for k, v in columns.items():
+            if v.dtype.kind == 'U':
+                columns[k] = np.array([intern(s) for s in v.tolist()], dtype=object)
+        return cls(columns, fmt=fmt, token_decimals=token_decimals)
@@ -0,0 +1,244 @@
+import time
+import threading
+import concurrent.futures
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+import commune as c
+
+
+class TxPipeline:
+    """
+    Submits signed extrinsics without waiting on them.
+
+    Nonces are tracked locally per key (seeded from system_accountNextIndex, which counts the
+    transaction pool), so one key can have many extrinsics in flight. A watcher thread follows every
+    new block, matches the pending extrinsic hashes and resolves each future once its extrinsic is
+    included (or finalized, if asked). An extrinsic past the timeout only fails once it has left the
+    transaction pool without being included. The nonce of a rejected or dropped extrinsic is handed
+    to the next one if later nonces of the key are still in flight (they wait behind it), otherwise
+    the key resyncs from the chain.
+    """
+    pipelines = {}
+    pipelines_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, pool, **kwargs) -> 'TxPipeline':
+        with cls.pipelines_lock:
+            if pool.url not in cls.pipelines:
+                cls.pipelines[pool.url] = cls(pool, **kwargs)
+            return cls.pipelines[pool.url]
+
+    def __init__(self, pool, poll_interval:float = 1.0, timeout:int = 120, max_blocks_per_step:int = 100):
+        self.pool = pool
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.max_blocks_per_step = max_blocks_per_step
+        self.nonces = {} # ss58 address -> next nonce to use
+        self.nonce_gaps = {} # ss58 address -> nonces handed back, used before new ones
+        self.in_flight = {} # ss58 address -> nonces handed out and not settled yet
+        self.nonce_lock = threading.Lock()
+        self.pending = {} # extrinsic hash -> {'future', 'key', 'nonce', 'data', 'wait_for', 'submitted', 'block_hash', 'block_number'}
+        self.pending_lock = threading.Lock()
+        self.last_block = None
+        self.watcher = None
+
+    ############ NONCE LAND ###############
+
+    def next_nonce(self, ss58_address:str) -> int:
+        with self.nonce_lock:
+            gaps = self.nonce_gaps.get(ss58_address)
+            if gaps:
+                nonce = min(gaps)
+                gaps.remove(nonce)
+            else:
+                if ss58_address not in self.nonces:
+                    with self.pool as substrate:
+                        self.nonces[ss58_address] = substrate.rpc_request('system_accountNextIndex', [ss58_address])['result']
+                nonce = self.nonces[ss58_address]
+                self.nonces[ss58_address] += 1
+            self.in_flight.setdefault(ss58_address, set()).add(nonce)
+            return nonce
+
+    def settle_nonce(self, ss58_address:str, nonce:int, used:bool = True, stale:bool = False):
+        """
+        Marks a nonce as done. An unused nonce is handed to the next extrinsic while later nonces of
+        the key are in flight, as they cannot be included before it. With nothing later in flight,
+        or a stale nonce (the chain moved past it), the key resyncs from the chain instead.
+        """
+        with self.nonce_lock:
+            in_flight = self.in_flight.get(ss58_address, set())
+            in_flight.discard(nonce)
+            if used:
+                return
+            if not stale and any([n > nonce for n in in_flight]):
+                self.nonce_gaps.setdefault(ss58_address, set()).add(nonce)
+            else:
+                self.nonces.pop(ss58_address, None)
+                self.nonce_gaps.pop(ss58_address, None)
+
+    def resync_nonce(self, ss58_address:str):
+        with self.nonce_lock:
+            self.nonces.pop(ss58_address, None)
+            self.nonce_gaps.pop(ss58_address, None)
+
+    ############ SUBMIT LAND ###############
+
+    def compose(self, substrate, fn:str, params:dict, module:str = 'SubspaceModule', sudo:bool = False):
+        call = substrate.compose_call(call_module=module, call_function=fn, call_params=params)
+        if sudo:
+            call = substrate.compose_call(call_module='Sudo', call_function='sudo', call_params={'call': call.value})
+        return call
+
+    def submit_call(self, call, key, wait_for:str = 'inclusion') -> Future:
+        """
+        Signs the call with the next local nonce of the key and submits it without waiting.
+        wait_for: 'inclusion' or 'finalization', when the returned future resolves
+        """
+        assert wait_for in ['inclusion', 'finalization'], f'wait_for must be inclusion or finalization, not {wait_for}'
+        future = Future()
+        nonce = self.next_nonce(key.ss58_address)
+        try:
+            with self.pool as substrate:
+                extrinsic = substrate.create_signed_extrinsic(call=call, keypair=key, nonce=nonce)
+                response = substrate.rpc_request('author_submitExtrinsic', [str(extrinsic.data)])
+            if 'result' not in response:
+                raise Exception(response.get('error', response))
+        except Exception as e:
+            # the nonce was not used, unless the chain is already past it
+            stale = any([s in str(e).lower() for s in ['outdated', 'stale']])
+            self.settle_nonce(key.ss58_address, nonce, used=False, stale=stale)
+            future.set_result({'success': False, 'error': str(e), 'nonce': nonce})
+            return future
+        tx_hash = response['result']
+        with self.pending_lock:
+            self.pending[tx_hash] = {'future': future, 'key': key.ss58_address, 'nonce': nonce, 'data': str(extrinsic.data),
+                                     'wait_for': wait_for, 'submitted': time.time(), 'block_hash': None, 'block_number': None}
+        self.start_watcher()
+        return future
+
+    def submit(self, fn:str, params:dict, key, module:str = 'SubspaceModule', sudo:bool = False, wait_for:str = 'inclusion') -> Future:
+        with self.pool as substrate:
+            call = self.compose(substrate, fn=fn, params=params, module=module, sudo=sudo)
+        return self.submit_call(call, key=key, wait_for=wait_for)
+
+    def submit_batch(self, calls:List[dict], key, batch_size:int = 64, atomic:bool = False, wait_for:str = 'inclusion') -> List[Future]:
+        """
+        Submits calls from one key wrapped in utility.batch (batch_all if atomic), batch_size calls per extrinsic.
+        Falls back to one extrinsic per call when the chain has no utility pallet.
+        calls: [{'fn', 'params', 'module'?, 'sudo'?}]
+        """
+        with self.pool as substrate:
+            composed = [self.compose(substrate, **call) for call in calls]
+            try:
+                has_utility = substrate.get_metadata_module('Utility') != None
+            except Exception:
+                has_utility = False
+            if not has_utility:
+                return [self.submit_call(call, key=key, wait_for=wait_for) for call in composed]
+            batches = []
+            for i in range(0, len(composed), batch_size):
+                batches += [substrate.compose_call(call_module='Utility',
+                                                   call_function='batch_all' if atomic else 'batch',
+                                                   call_params={'calls': [call.value for call in composed[i:i+batch_size]]})]
+        return [self.submit_call(batch, key=key, wait_for=wait_for) for batch in batches]
+
+    ############ WATCH LAND ###############
+
+    def start_watcher(self):
+        with self.pending_lock:
+            if self.watcher == None or not self.watcher.is_alive():
+                self.watcher = threading.Thread(target=self.watch_loop, daemon=True)
+                self.watcher.start()
+
+    def watch_loop(self):
+        while True:
+            with self.pending_lock:
+                if len(self.pending) == 0:
+                    self.watcher = None
+                    # the next watcher starts at the head, not where this one stopped
+                    self.last_block = None
+                    return
+            try:
+                self.watch_step()
+            except Exception as e:
+                c.print(f'Extrinsic watcher error {e}', color='red')
+            time.sleep(self.poll_interval)
+
+    def watch_step(self):
+        with self.pool as substrate:
+            head = substrate.get_block_header()['header']['number']
+            # every block since the last step, the head and its parent on the first one
+            start = max(head - 1, 0) if self.last_block == None else self.last_block + 1
+            end = min(head, start + self.max_blocks_per_step - 1)
+            for block_number in range(start, end + 1):
+                block = substrate.get_block(block_number=block_number)
+                block_hash = block['header']['hash']
+                for extrinsic in block['extrinsics']:
+                    tx_hash = f'0x{extrinsic.extrinsic_hash.hex()}' if extrinsic.extrinsic_hash else None
+                    with self.pending_lock:
+                        tx = self.pending.get(tx_hash)
+                    if tx != None and tx['block_hash'] == None:
+                        tx['block_hash'], tx['block_number'] = block_hash, block_number
+                        success, error = self.receipt(substrate, tx_hash, block_hash)
+                        tx['result'] = {'success': success, 'tx_hash': tx_hash, 'block_hash': block_hash, 'block_number': block_number}
+                        if not success:
+                            tx['result']['error'] = error
+                self.last_block = block_number
+            finalized = substrate.get_block_number(substrate.get_chain_finalised_head())
+            # timeouts are only judged once every block up to the head has been seen
+            if self.last_block == head:
+                self.check_expired(substrate, head)
+
+        settled = []
+        with self.pending_lock:
+            for tx_hash, tx in list(self.pending.items()):
+                if tx['block_hash'] != None:
+                    if tx['wait_for'] == 'inclusion' or tx['block_number'] <= finalized:
+                        tx['future'].set_result({**tx['result'], 'finalized': tx['block_number'] <= finalized})
+                        del self.pending[tx_hash]
+                        settled.append((tx['key'], tx['nonce'], True, False))
+                elif tx.get('outcome') != None:
+                    error = {'dropped': f'Dropped from the transaction pool after {self.timeout}s',
+                             'replaced': f'Nonce {tx["nonce"]} was used by another extrinsic'}[tx['outcome']]
+                    tx['future'].set_result({'success': False, 'tx_hash': tx_hash, 'nonce': tx['nonce'], 'error': error})
+                    del self.pending[tx_hash]
+                    settled.append((tx['key'], tx['nonce'], False, tx['outcome'] == 'replaced'))
+        for key, nonce, used, stale in settled:
+            self.settle_nonce(key, nonce, used=used, stale=stale)
+
+    def receipt(self, substrate, tx_hash:str, block_hash:str) -> tuple:
+        """
+        (success, error message) of an included extrinsic, from its events
+        """
+        from substrateinterface.base import ExtrinsicReceipt
+        receipt = ExtrinsicReceipt(substrate=substrate, extrinsic_hash=tx_hash, block_hash=block_hash)
+        return receipt.is_success, (None if receipt.is_success else receipt.error_message)
+
+    def check_expired(self, substrate, head:int):
+        """
+        Decides the outcome of the extrinsics past the timeout that are in none of the blocks up to head:
+        still in the pool they wait on, else they were replaced (the account nonce moved past theirs) or dropped
+        """
+        now = time.time()
+        with self.pending_lock:
+            expired = [tx for tx in self.pending.values() if tx['block_hash'] == None and now - tx['submitted'] > self.timeout]
+        if len(expired) == 0:
+            return
+        pool_extrinsics = set(substrate.rpc_request('author_pendingExtrinsics', [])['result'])
+        head_hash = substrate.get_block_hash(head)
+        account_nonces = {}
+        for tx in expired:
+            if tx['data'] in pool_extrinsics:
+                # it can still be included, reporting it failed now could be wrong
+                continue
+            if tx['key'] not in account_nonces:
+                account_nonces[tx['key']] = substrate.query('System', 'Account', [tx['key']], block_hash=head_hash).value['nonce']
+            tx['outcome'] = 'replaced' if account_nonces[tx['key']] > tx['nonce'] else 'dropped'
+
+    def wait(self, futures:List[Future], timeout:int = None) -> List[dict]:
+        """
+        The results of the futures, an extrinsic still pending after timeout is reported as such, not as failed
+        """
+        timeout = self.timeout if timeout == None else timeout
+        concurrent.futures.wait(futures, timeout=timeout)
+        return [f.result() if f.done() else {'success': False, 'pending': True, 'error': f'Still pending after {timeout}s'} for f in futures]
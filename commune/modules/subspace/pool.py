@@ -0,0 +1,154 @@
+import os
+import time
+import queue
+import pickle
+import threading
+from typing import Any, Dict, Optional
+import commune as c
+
+
+class MetadataCache:
+    """
+    Minimal cache region for SubstrateInterface (it calls get/set with METADATA_<runtime version>).
+    Metadata is kept in memory for the process and pickled to disk, so a new connection on a
+    runtime we have seen before skips the metadata download.
+    """
+    memory = {}
+
+    def __init__(self, path:str):
+        self.path = path
+        os.makedirs(self.path, exist_ok=True)
+
+    def get(self, key:str) -> Optional[Any]:
+        key_path = os.path.join(self.path, key + '.pkl')
+        if key_path not in self.memory and os.path.exists(key_path):
+            try:
+                with open(key_path, 'rb') as f:
+                    self.memory[key_path] = pickle.load(f)
+            except Exception:
+                return None
+        return self.memory.get(key_path)
+
+    def set(self, key:str, value:Any):
+        key_path = os.path.join(self.path, key + '.pkl')
+        self.memory[key_path] = value
+        tmp_path = f'{key_path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(value, f)
+            os.replace(tmp_path, key_path)
+        except Exception as e:
+            # an unpicklable metadata object only loses the disk cache
+            c.print(f'Could not cache metadata {key}: {e}', color='red')
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+class SubstratePool:
+    """
+    Process-wide pool of SubstrateInterface connections for one url.
+
+    `with pool as substrate` checks a connection out for the block and returns it afterwards,
+    so at most max_connections requests share the node at once. Connections idle for longer than
+    health_check_interval are pinged before reuse, and a connection that raised is dropped and
+    replaced with a new one on the next checkout.
+    """
+    pools = {}
+    pools_lock = threading.Lock()
+    metadata_dir = os.path.expanduser('~/.commune/subspace/metadata')
+
+    @classmethod
+    def get(cls, url:str, network:str = 'main', max_connections:int = 4, **substrate_kwargs) -> 'SubstratePool':
+        with cls.pools_lock:
+            if url not in cls.pools:
+                cls.pools[url] = cls(url, network=network, max_connections=max_connections, **substrate_kwargs)
+            return cls.pools[url]
+
+    @classmethod
+    def close_all(cls):
+        with cls.pools_lock:
+            for pool in cls.pools.values():
+                pool.close()
+            cls.pools = {}
+
+    def __init__(self, url:str, network:str = 'main', max_connections:int = 4, health_check_interval:int = 30, timeout:int = 60, **substrate_kwargs):
+        self.url = url
+        self.max_connections = max_connections
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+        substrate_kwargs['cache_region'] = substrate_kwargs.get('cache_region') or MetadataCache(os.path.join(self.metadata_dir, network))
+        self.substrate_kwargs = substrate_kwargs
+        self.idle = queue.LifoQueue() # (connection, last used), most recently used first
+        self.slots = threading.BoundedSemaphore(max_connections)
+        self.local = threading.local()
+
+    def connect(self):
+        from substrateinterface import SubstrateInterface
+        return SubstrateInterface(url=self.url, **self.substrate_kwargs)
+
+    def healthy(self, substrate) -> bool:
+        try:
+            substrate.rpc_request('system_health', [])
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f'No substrate connection to {self.url} free after {self.timeout}s')
+        try:
+            while True:
+                try:
+                    substrate, last_used = self.idle.get_nowait()
+                except queue.Empty:
+                    return self.connect()
+                if time.time() - last_used < self.health_check_interval or self.healthy(substrate):
+                    return substrate
+                self.discard(substrate)
+        except Exception:
+            self.slots.release()
+            raise
+
+    def release(self, substrate, healthy:bool = True):
+        if healthy:
+            self.idle.put((substrate, time.time()))
+        else:
+            self.discard(substrate)
+        self.slots.release()
+
+    def discard(self, substrate):
+        try:
+            substrate.close()
+        except Exception:
+            pass
+
+    def close(self):
+        while not self.idle.empty():
+            self.discard(self.idle.get_nowait()[0])
+
+    def __enter__(self):
+        substrate = self.acquire()
+        # nested and concurrent blocks each get their own connection, tracked per thread
+        self.local.__dict__.setdefault('stack', []).append(substrate)
+        return substrate
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        substrate = self.local.stack.pop()
+        # errors from the node itself leave the connection usable, broken sockets do not
+        broken = exc_type != None and issubclass(exc_type, (ConnectionError, OSError, TimeoutError)) \
+                 or exc_type != None and 'websocket' in exc_type.__module__.lower()
+        self.release(substrate, healthy=not broken)
+        return False
+
+    def __getattr__(self, key:str):
+        # direct use (pool.get_block(...)) checks a connection out for the duration of the call
+        if key.startswith('__') or key in ['url', 'substrate_kwargs', 'idle', 'slots', 'local']:
+            raise AttributeError(key)
+        with self as substrate:
+            attr = getattr(substrate, key)
+            if not callable(attr):
+                return attr
+        def call(*args, **kwargs):
+            with self as substrate:
+                return getattr(substrate, key)(*args, **kwargs)
+        return call
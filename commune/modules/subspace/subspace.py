@@ -10,6 +10,9 @@ from rich.prompt import Confirm
 from commune.modules.subspace.balance import Balance
 from commune.modules.subspace.utils import (U16_MAX,  is_valid_address_or_public_key, )
 from commune.modules.subspace.chain_data import (ModuleInfo, custom_rpc_type_registry)
+from commune.modules.subspace.pool import SubstratePool
+from commune.modules.subspace.pipeline import TxPipeline
+from commune.modules.subspace.module_table import ModuleTable
 
 import streamlit as st
 import json
@@ -60,6 +63,7 @@ class Subspace(c.Module):
                 auto_reconnect=True, 
                 verbose:bool=False,
                 max_trials:int = 10,
+                max_connections:int = 4,
                 **kwargs):
 
         '''
@@ -99,8 +103,7 @@ class Subspace(c.Module):
             ip = c.ip()
             url = url.replace(ip, '0.0.0.0')
 
-            kwargs.update(url=url, 
-                        websocket=websocket, 
+            kwargs.update(websocket=websocket, 
                         ss58_format=ss58_format, 
                         type_registry=type_registry, 
                         type_registry_preset=type_registry_preset, 
@@ -110,7 +113,9 @@ class Subspace(c.Module):
                         auto_discover=auto_discover, 
                         auto_reconnect=auto_reconnect)
             try:
-                self.substrate= SubstrateInterface(**kwargs)
+                # connections are pooled per url for the whole process, so only the first Subspace pays for the handshake and metadata
+                self.substrate = SubstratePool.get(url, network=network, max_connections=max_connections, **kwargs)
+                self.substrate.release(self.substrate.acquire())
                 break
             except Exception as e:
                 c.print(e, url)
@@ -246,13 +251,8 @@ class Subspace(c.Module):
 
     def names2uids(self, names: List[str] ) -> Union[torch.LongTensor, list]:
         # queries updated network state
-        current_network_state = self.modules() 
-        uids = []
-        for name in names:
-            for node in current_network_state:
-                if node['name'] == name:
-                    uids.append(node['uid'])
-                    break
+        name2uid = self.modules(return_table=True).mapping('name', 'uid')
+        uids = [name2uid[name] for name in names if name in name2uid]
 
         return torch.LongTensor(uids)
     
@@ -340,17 +340,27 @@ class Subspace(c.Module):
     def enter(cls):
         c.cmd('make enter', cwd=cls.chain_path)
 
-    def register_servers(self, search=None, **kwargs):
+    def register_servers(self, search=None, key:str = None, **kwargs):
+        """
+        Registers every local server that is not registered yet (updating the rest), the
+        registrations are submitted back to back from key instead of waiting a block each
+        """
         stakes = self.stakes()
-        for m in c.servers(network='local'):
+        key = self.resolve_key(key)
+        names, calls = [], []
+        for m in c.servers(search, network='local'):
             try:
-                key = c.get_key(m)
-                if key.ss58_address in stakes:
+                module_key = c.get_key(m)
+                if module_key.ss58_address in stakes:
                     self.update_module(module=m)
                 else:
-                    self.register(name=m)
+                    calls.append({'fn': 'register', 'params': self.register_params(name=m, key=key, **kwargs)})
+                    names.append(m)
             except Exception as e:
                 c.print(e, color='red')
+        if len(calls) == 0:
+            return {}
+        return dict(zip(names, self.submit_calls(calls, key=key, batch=False)))
     reg_servers = register_servers
     def reged_servers(self, **kwargs):
         servers =  c.servers(network='local')
@@ -387,7 +397,6 @@ class Subspace(c.Module):
         module_key = self.resolve_key(name)
         key = self.resolve_key(key)
 
-        # Validate address.
         if self.subnet_exists(subnet, network=network):
             netuid = self.get_netuid_for_subnet(subnet)
             if self.is_registered(module_key.ss58_address, netuid=netuid):
@@ -395,41 +404,53 @@ class Subspace(c.Module):
                     return self.update_module(module=name, name=name, address=address , netuid=netuid, network=network)
                 else: 
                     return {'success': False, f'msg': 'Module {name} already registered'}
-            min_stake = self.min_stake(netuid=netuid, registration=True)
+        try:
+            params = self.register_params(name=name, address=address, stake=stake, subnet=subnet, key=key, network=network, fmt=fmt)
+        except ValueError as e:
+            return {'success': False, 'message': str(e)}
+        stake = params['stake']
+        # create extrinsic call
+        response = self.compose_call('register', params=params, key=key, wait_for_inclusion=wait_for_inclusion, wait_for_finalization=wait_for_finalization)
+        c.print(response)
+        if response['success']:
+            response['msg'] = f'Registered {name} with {stake} stake'
 
+        return response
+
+    reg = register
+
+    def register_params(self, name:str, address:str = None, stake:float = 0, subnet:str = None, key:str = None, network:str = network, fmt:str = 'nano') -> dict:
+        """
+        The params of the register call for name, raises ValueError if the balance of key does not cover the minimum stake
+        """
+        if subnet == None:
+            subnet = self.config.subnet
+        if address == None:
+            address = c.namespace(network='local')[name]
+            address = address.replace(c.default_ip,c.ip())
+        module_key = self.resolve_key(name)
+        key = self.resolve_key(key)
+        if self.subnet_exists(subnet, network=network):
+            min_stake = self.min_stake(netuid=self.get_netuid_for_subnet(subnet), registration=True)
         else: 
             c.print(f"YOU ARE CREATING A NEW SUBNET: {subnet}")
             min_stake = self.min_stake(netuid=0, registration=True)
 
-            
         # convert to nanos
         balance = self.get_balance(key.ss58_address, fmt=fmt)
         if balance < min_stake:
-            return {'success': False, 'message': f'Insufficient balance: {balance} < {min_stake}'}
+            raise ValueError(f'Insufficient balance: {balance} < {min_stake}')
         if stake == None:
             stake = 0
-
-
         if stake < min_stake:
             stake = min_stake
-        stake = self.to_nanos(stake)
-
-        params = { 
+        return { 
                     'network': subnet.encode('utf-8'),
                     'address': address.encode('utf-8'),
                     'name': name.encode('utf-8'),
-                    'stake': stake,
+                    'stake': self.to_nanos(stake),
                     'module_key': module_key.ss58_address,
                 } 
-        # create extrinsic call
-        response = self.compose_call('register', params=params, key=key, wait_for_inclusion=wait_for_inclusion, wait_for_finalization=wait_for_finalization)
-        c.print(response)
-        if response['success']:
-            response['msg'] = f'Registered {name} with {stake} stake'
-
-        return response
-
-    reg = register
 
     ##################
     #### Transfer ####
@@ -1135,13 +1156,9 @@ class Subspace(c.Module):
 
 
     def get_staked_modules(self, key : str , netuid=None, **kwargs) -> Optional['Balance']:
-        modules = self.modules(netuid=netuid, **kwargs)
+        modules = self.modules(netuid=netuid, return_table=True, **kwargs)
         key_address = self.resolve_key_ss58( key )
-        staked_modules = {}
-        for module in modules:
-            for k,v in module['stake_from']:
-                if k == key_address:
-                    staked_modules[module['name']] = v
+        staked_modules = modules.staked_by(key_address)
 
         return staked_modules
         
@@ -1192,6 +1209,7 @@ class Subspace(c.Module):
                         key: str = None, 
                         netuid:int = 0,
                         n:str = 100,
+                        batch_size:int = 64,
                         network: str = None) -> Optional['Balance']:
         network = self.resolve_network( network )
         key = self.resolve_key( key )
@@ -1217,15 +1235,7 @@ class Subspace(c.Module):
 
         assert len(modules) == len(amounts), f"Length of modules and amounts must be the same. Got {len(modules)} and {len(amounts)}."
 
-        params = {
-            "netuid": netuid,
-            "module_keys": module_keys,
-            "amounts": amounts
-        }
-
-        response = self.compose_call('add_stake_multiple', params=params, key=key)
-
-        return response
+        return self.submit_multiple('add_stake_multiple', {'module_keys': module_keys, 'amounts': amounts}, netuid=netuid, key=key, batch_size=batch_size)
                     
 
 
@@ -1235,6 +1245,7 @@ class Subspace(c.Module):
                         key: str = None, 
                         netuid:int = 0,
                         n:str = 2,
+                        batch_size:int = 64,
                         network: str = None) -> Optional['Balance']:
         network = self.resolve_network( network )
         key = self.resolve_key( key )
@@ -1263,17 +1274,19 @@ class Subspace(c.Module):
         for i, amount in enumerate(amounts):
             amounts[i] = self.to_nanos(amount)
 
-        assert len(destidnations) == len(amounts), f"Length of modules and amounts must be the same. Got {len(modules)} and {len(amounts)}."
+        assert len(destinations) == len(amounts), f"Length of destinations and amounts must be the same. Got {len(destinations)} and {len(amounts)}."
 
-        params = {
-            "netuid": netuid,
-            "destinations": destinations,
-            "amounts": amounts
-        }
-
-        response = self.compose_call('transfer_multiple', params=params, key=key)
+        return self.submit_multiple('transfer_multiple', {'destinations': destinations, 'amounts': amounts}, netuid=netuid, key=key, batch_size=batch_size)
 
-        return response
+    def submit_multiple(self, fn:str, lists:Dict[str, list], netuid:int = 0, key:str = None, batch_size:int = 64) -> dict:
+        """
+        Splits a *_multiple call into calls of batch_size entries, submitted back to back through submit_calls
+        lists: the params that are lists of the same length, e.g. {'module_keys', 'amounts'}
+        """
+        n = len(list(lists.values())[0])
+        calls = [{'fn': fn, 'params': {'netuid': netuid, **{k: v[i:i+batch_size] for k, v in lists.items()}}} for i in range(0, n, batch_size)]
+        responses = self.submit_calls(calls, key=key, batch=False)
+        return {'success': all([r['success'] for r in responses]), 'responses': responses}
                     
 
 
@@ -1283,6 +1296,7 @@ class Subspace(c.Module):
                         amounts:Union[List[str], float, int] = None,
                         key: str = None, 
                         netuid:int = 0,
+                        batch_size:int = 64,
                         network: str = None) -> Optional['Balance']:
         network = self.resolve_network( network )
         key = self.resolve_key( key )
@@ -1316,15 +1330,7 @@ class Subspace(c.Module):
 
         assert len(module_keys) == len(amounts), f"Length of modules and amounts must be the same. Got {len(module_keys)} and {len(amounts)}."
 
-        params = {
-            "netuid": netuid,
-            "module_keys": module_keys,
-            "amounts": amounts
-        }
-
-        response = self.compose_call('remove_stake_multiple', params=params, key=key)
-
-        return response
+        return self.submit_multiple('remove_stake_multiple', {'module_keys': module_keys, 'amounts': amounts}, netuid=netuid, key=key, batch_size=batch_size)
                     
 
         
@@ -1584,26 +1590,40 @@ class Subspace(c.Module):
         network = self.resolve_network(network)
         netuid = self.resolve_netuid(netuid)
 
-        subnet_stake = self.query( 'TotalStake', params=netuid , block=block).value
-        subnet_emission = self.query( 'SubnetEmission', params=netuid, block=block ).value
-        subnet_founder = self.query( 'Founder', params=netuid, block=block ).value
-        n = self.query( 'N', params=netuid, block=block ).value
-        total_stake = self.total_stake(block=block, fmt='nano')
+        # one request for every parameter
+        values = self.query_multi({
+                'stake': ('TotalStake', [netuid]),
+                'emission': ('SubnetEmission', [netuid]),
+                'founder': ('Founder', [netuid]),
+                'n': ('N', [netuid]),
+                'tempo': ('Tempo', [netuid]),
+                'immunity_period': ('ImmunityPeriod', [netuid]),
+                'min_allowed_weights': ('MinAllowedWeights', [netuid]),
+                'max_allowed_weights': ('MaxAllowedWeights', [netuid]),
+                'max_allowed_uids': ('MaxAllowedUids', [netuid]),
+                'min_stake': ('MinStake', [netuid]),
+                'registrations_per_block': ('RegistrationsPerBlock', []),
+                'max_registrations_per_block': ('MaxRegistrationsPerBlock', []),
+                'total_stake': ('TotalStake', [self.resolve_netuid(None)]),
+            }, block=block)
+        values = {k: v.value for k,v in values.items()}
+        # same registration factor as min_stake
+        min_stake = values['min_stake'] * 2 **(values['registrations_per_block'] // values['max_registrations_per_block'])
 
         subnet = {
                 'name': self.netuid2subnet(netuid),
                 'netuid': netuid,
-                'stake': subnet_stake,
-                'emission': subnet_emission,
-                'n': n,
-                'tempo': self.tempo( netuid = netuid , block=block),
-                'immunity_period': self.immunity_period( netuid = netuid , block=block),
-                'min_allowed_weights': self.min_allowed_weights( netuid = netuid, block=block ),
-                'max_allowed_weights': self.max_allowed_weights( netuid = netuid , block=block),
-                'max_allowed_uids': self.max_allowed_uids( netuid = netuid , block=block),
-                'min_stake': self.min_stake( netuid = netuid , block=block, fmt='nano'),
-                'ratio': min(float(subnet_stake / total_stake), 1.00),
-                'founder': subnet_founder
+                'stake': values['stake'],
+                'emission': values['emission'],
+                'n': values['n'],
+                'tempo': values['tempo'],
+                'immunity_period': values['immunity_period'],
+                'min_allowed_weights': values['min_allowed_weights'],
+                'max_allowed_weights': values['max_allowed_weights'],
+                'max_allowed_uids': values['max_allowed_uids'],
+                'min_stake': min_stake,
+                'ratio': min(float(values['stake'] / values['total_stake']), 1.00),
+                'founder': values['founder']
             }
         
         for k in ['stake', 'emission', 'min_stake']:
@@ -1801,13 +1821,15 @@ class Subspace(c.Module):
         """
         self.resolve_network(network)
         netuid = self.resolve_netuid(netuid)
-        global_params = {}
-        global_params['max_name_length'] = self.query_constant( 'MaxNameLength').value
-        global_params['max_allowed_subnets'] = self.query_constant( 'MaxAllowedSubnets').value
-        global_params['max_allowed_modules'] = self.query_constant( 'MaxAllowedModules' ).value
-        global_params['max_registrations_per_block'] = self.query_constant( 'MaxRegistrationsPerBlock' ).value
-        global_params['unit_emission'] = self.query_constant( 'UnitEmission' ).value
-        global_params['tx_rate_limit'] = self.query_constant( 'TxRateLimit' ).value
+        global_params = self.query_multi({
+            'max_name_length': ('MaxNameLength', []),
+            'max_allowed_subnets': ('MaxAllowedSubnets', []),
+            'max_allowed_modules': ('MaxAllowedModules', []),
+            'max_registrations_per_block': ('MaxRegistrationsPerBlock', []),
+            'unit_emission': ('UnitEmission', []),
+            'tx_rate_limit': ('TxRateLimit', []),
+        })
+        global_params = {k: v.value for k,v in global_params.items()}
 
         return global_params
 
@@ -1958,15 +1980,8 @@ class Subspace(c.Module):
     resolve_net = resolve_subnet = resolve_netuid
 
 
-    def key2name(self, key: str = None, netuid: int = None) -> str:
-        modules = self.keys()
-        key2name =  { m['key']: m['name']for m in modules}
-        if key != None:
-            return key2name[key]
-        
     def name2uid(self,search:str=None, netuid: int = None, network: str = None) -> int:
-        modules = self.modules(netuid=netuid)
-        name2uid =  { m['name']: m['uid']for m in modules}
+        name2uid = self.modules(netuid=netuid, return_table=True).mapping('name', 'uid')
         if search != None:
             name2uid = {k:v for k,v in name2uid.items() if search in k}
         return name2uid
@@ -2114,43 +2129,102 @@ class Subspace(c.Module):
         return self.block_time * self.subnet(netuid=netuid)['tempo']
 
     
-    def get_module(self, name:str = None, key=None, netuid=None, **kwargs) -> ModuleInfo:
+    def get_module(self, name:str = None, key=None, netuid=None, block=None, network=None, fmt='nano', **kwargs) -> ModuleInfo:
+        '''
+        Looks up one module with point queries (two batched requests) instead of loading every module,
+        formatted like modules(): incentive and dividends as ratios, amounts in fmt
+        '''
+        network = self.resolve_network(network)
+        netuid = self.resolve_netuid(netuid)
         if key != None:
-            module = self.key2module(key=key, netuid=netuid, **kwargs)
-        if name != None:
-            module = self.name2module(name=name, netuid=netuid, **kwargs)
-            
+            key = self.resolve_key_ss58(key)
+            uid = self.query_multi([('Uids', [netuid, key])], block=block, network=network)[0].value
+        elif name != None:
+            uid, key = self.name2uid_key(name, netuid=netuid, block=block, network=network)
+        else:
+            raise ValueError('Provide a name or a key')
+        if uid == None or key == None:
+            return self.null_module
+
+        state = self.query_multi({
+            'name': ('Names', [netuid, uid]),
+            'address': ('Address', [netuid, uid]),
+            'emission': ('Emission', [netuid]),
+            'incentive': ('Incentive', [netuid]),
+            'trust': ('Trust', [netuid]),
+            'dividends': ('Dividends', [netuid]),
+            'last_update': ('LastUpdate', [netuid]),
+            'regblock': ('RegistrationBlock', [netuid, uid]),
+            'stake_from': ('StakeFrom', [netuid, key]),
+            'delegation_fee': ('DelegationFee', [netuid, key]),
+        }, block=block, network=network)
+        state = {k: v.value for k,v in state.items()}
+        stake_from = [[staker, self.format_amount(amount, fmt=fmt)] for staker, amount in (state['stake_from'] or [])]
+        module = {
+            'uid': uid,
+            'key': key,
+            'name': state['name'],
+            'address': state['address'],
+            'emission': self.format_amount(state['emission'][uid], fmt=fmt),
+            'incentive': state['incentive'][uid] / U16_MAX,
+            'trust': state['trust'][uid],
+            'dividends': state['dividends'][uid] / U16_MAX,
+            'stake_from': stake_from,
+            'stake': self.format_amount(sum([amount for staker, amount in (state['stake_from'] or [])]), fmt=fmt),
+            'regblock': state['regblock'] or 0,
+            'last_update': state['last_update'][uid],
+            'delegation_fee': state['delegation_fee'] if state['delegation_fee'] != None else 20,
+        }
         return module
 
+    def name2uid_key(self, name:str, netuid:int = None, block:int = None, network:str = None) -> Tuple[Optional[int], Optional[str]]:
+        '''
+        The uid and key of a name, from the names map of the subnet cached per network and netuid.
+        A cached uid is checked against the chain with a point query, the map is only fetched again
+        when the name is missing or has moved.
+        '''
+        if not hasattr(self, 'name2uid_cache'):
+            self.name2uid_cache = {}
+        cache_key = (network, netuid)
+        uid = self.name2uid_cache.get(cache_key, {}).get(name, None)
+        if uid != None:
+            uid_name, key = [v.value for v in self.query_multi([('Names', [netuid, uid]), ('Keys', [netuid, uid])], block=block, network=network)]
+            if uid_name == name:
+                return uid, key
+        name2uid = {v.value: k.value for k, v in self.query_map('Names', params=[netuid], block=block, network=network)}
+        if block == None:
+            self.name2uid_cache[cache_key] = name2uid
+        uid = name2uid.get(name, None)
+        if uid == None:
+            return None, None
+        return uid, self.query_multi([('Keys', [netuid, uid])], block=block, network=network)[0].value
+
     @property
     def null_module(self):
         return {'name': None, 'key': None, 'uid': None, 'address': None, 'stake': 0, 'balance': 0, 'emission': 0, 'incentive': 0, 'dividends': 0, 'stake_to': {}, 'stake_from': {}, 'weight': []}
         
         
     def name2module(self, name:str = None, netuid: int = None, **kwargs) -> ModuleInfo:
-        modules = self.modules(netuid=netuid, **kwargs)
-        name2module = { m['name']: m for m in modules }
-        default = {}
+        modules = self.modules(netuid=netuid, return_table=True, **kwargs)
         if name != None:
-            return name2module.get(name, self.null_module)
-        return name2module
+            module = modules.row('name', name)
+            return self.null_module if module == None else module.to_dict()
+        return { m['name']: m for m in modules.to_dicts() }
         
         
         
         
         
     def key2module(self, key: str = None, netuid: int = None, default: dict =None, **kwargs) -> Dict[str, str]:
-        modules = self.modules(netuid=netuid, **kwargs)
-        key2module =  { m['key']: m for m in modules }
-        
+        modules = self.modules(netuid=netuid, return_table=True, **kwargs)
         if key != None:
             key_ss58 = self.resolve_key_ss58(key)
-            return  key2module.get(key_ss58, default if default != None else {})
-        return key2module
+            module = modules.row('key', key_ss58)
+            return (default if default != None else {}) if module == None else module.to_dict()
+        return { m['key']: m for m in modules.to_dicts() }
         
     def module2key(self, module: str = None, **kwargs) -> Dict[str, str]:
-        modules = self.modules(**kwargs)
-        module2key =  { m['name']: m['key'] for m in modules }
+        module2key = self.modules(return_table=True, **kwargs).mapping('name', 'key')
         
         if module != None:
             return module2key[module]
@@ -2159,7 +2233,7 @@ class Subspace(c.Module):
 
     def module2stake(self,*args, **kwargs) -> Dict[str, str]:
         
-        module2stake =  { m['name']: m['stake'] for m in self.modules(*args, **kwargs) }
+        module2stake =  self.modules(*args, return_table=True, **kwargs).mapping('name', 'stake')
         
         return module2stake
         
@@ -2218,17 +2292,24 @@ class Subspace(c.Module):
                 timeout:int=200, 
                 include_balances = False, 
                 mode = 'process',
-                
-                ) -> Dict[str, ModuleInfo]:
+                return_table: bool = False,
+                ) -> Union[List[dict], ModuleTable]:
+        """
+        The modules of a subnet, as a list of dicts (or the ModuleTable itself if return_table)
+        The chain state is cached as a columnar npz under modules/{network}.{netuid}
+        """
         import inspect
 
-        cache_path = f'modules/{network}.{netuid}'
+        cache_path = self.resolve_path(f'modules/{network}.{netuid}', extension='npz')
 
-        modules = []
-        if not update :
-            modules = self.get(cache_path, [])
+        table = None
+        if not update and os.path.exists(cache_path):
+            try:
+                table = ModuleTable.load(cache_path, fmt=fmt, token_decimals=self.token_decimals)
+            except Exception as e:
+                c.print(f'Could not load modules cache {cache_path}: {e}', color='red')
 
-        if len(modules) == 0:
+        if table == None:
 
             network = self.resolve_network(network)
             netuid = self.resolve_netuid(netuid)
@@ -2236,9 +2317,9 @@ class Subspace(c.Module):
  
             
             if include_balances:
-                keys += ['balances']
+                keys = keys + ['balances']
             if include_weights:
-                keys += ['weights']
+                keys = keys + ['weights']
             if parallel:
                 executor = c.module('executor')(max_workers=len(keys), mode=mode)
                 futures = []
@@ -2262,79 +2343,26 @@ class Subspace(c.Module):
                         kwargs['block'] = block
 
                     state[key] = func(**kwargs)
-            for uid, key in state['uid2key'].items():
-
-                module= {
-                    'uid': uid,
-                    'address': state['addresses'][uid],
-                    'name': state['names'][uid],
-                    'key': key,
-                    'emission': state['emission'][uid],
-                    'incentive': state['incentive'][uid],
-                    'trust': state['trust'][uid],
-                    'dividends': state['dividends'][uid],
-                    'stake_from': state['stake_from'].get(key, []),
-                    'regblock': state['regblock'].get(uid, 0),
-                    'last_update': state['last_update'][uid],
-                    'delegation_fee': state['delegation_fee'].get(key, 20)
-                }
-
-                module['stake'] = sum([v for k,v in module['stake_from']])
-                
-                if include_weights:
-                    if hasattr(state['weights'][uid], 'value'):
-                        
-                        module['weight'] = state['weights'][uid].value
-                    elif isinstance(state['weights'][uid], list):
-                        module['weight'] =state['weights'][uid]
-                    else: 
-                        raise Exception(f"Invalid weight for module {uid}")
-
-                if include_balances:
-                    module['balance'] = state['balances'].get(key, 0)
-                    
-                modules.append(module)
 
-            self.put(cache_path, modules)
+            table = ModuleTable.from_state(state, fmt=fmt, token_decimals=self.token_decimals)
+            table.save(cache_path)
 
-        if len(modules) > 0:
-            keys = list(modules[0].keys())
-            if isinstance(keys, str):
-                keys = [keys]
-            keys = list(set(keys))
-            for i, module in enumerate(modules):
-                modules[i] ={k: module[k] for k in keys}
-
-                for k in ['emission', 'stake']:
-                    module[k] = self.format_amount(module[k], fmt=fmt)
-
-                for k in ['incentive', 'dividends']:
-                    module[k] = module[k] / (U16_MAX)
-                
-                module['stake_from']= [(k, self.format_amount(v, fmt=fmt))  for k, v in module['stake_from']]
-      
-                if include_balances:
-                    module['balance'] = self.format_amount(module['balance'], fmt=fmt)
-
-                modules[i] = module
         if search != None:
-            modules = [m for m in modules if search in m['name']]
+            table = table.search(search)
 
         if df:
-            modules = c.df(modules)
+            return table.df()
+        if return_table:
+            return table
 
-        return modules
+        return table.to_dicts()
     
 
     def my_modules(self,search:str=None,  modules:List[int] = None, netuid:int=None, df:bool = True, **kwargs):
-        my_modules = []
         address2key = c.address2key()
         if modules == None:
-            modules = self.modules(search=search, netuid=netuid, df=False, **kwargs)
-        for module in modules:
-            if module['key'] in address2key:
-                my_modules += [module]
-        return my_modules
+            return self.modules(search=search, netuid=netuid, df=False, return_table=True, **kwargs).filter_keys(address2key).to_dicts()
+        return [module for module in modules if module['key'] in address2key]
 
     def my_servers(self, search=None,  **kwargs):
         servers = [m['name'] for m in self.my_modules(**kwargs)]
@@ -2451,6 +2479,32 @@ class Subspace(c.Module):
             )
             
         return value
+
+    def query_multi(self, queries:Union[List[tuple], Dict[str, tuple]], block=None, network: str = network, module:str='SubspaceModule'):
+        '''
+        Runs many point queries in one state_queryStorageAt request, resolving the block hash once.
+        queries: a list (or dict of name -> query) of (storage_function, params) or (module, storage_function, params)
+        Returns the scale values in the same order (or under the same names), like query.
+        '''
+        names = list(queries.keys()) if isinstance(queries, dict) else None
+        queries = list(queries.values()) if isinstance(queries, dict) else queries
+        self.resolve_network(network)
+        with self.substrate as substrate:
+            block_hash = None if block == None else substrate.get_block_hash(block)
+            storage_keys = []
+            for query in queries:
+                query_module, (name, params) = (module, query) if len(query) == 2 else (query[0], query[1:])
+                if params == None:
+                    params = []
+                if not isinstance(params, list):
+                    params = [params]
+                storage_keys.append(substrate.create_storage_key(query_module, name, params))
+            results = substrate.query_multi(list({k.to_hex(): k for k in storage_keys}.values()), block_hash=block_hash)
+        key2value = {storage_key.to_hex(): value for storage_key, value in results}
+        values = [key2value[k.to_hex()] for k in storage_keys]
+        if names != None:
+            return dict(zip(names, values))
+        return values
         
 
         
@@ -2901,8 +2955,7 @@ class Subspace(c.Module):
                      **kwargs):
 
         """
-        Composes a call to a Substrate chain.
-
+        Composes a call to a Substrate chain and waits for it (see submit_call to submit without waiting)
         """
         params = {} if params == None else params
         key = self.resolve_key(key)
@@ -2952,7 +3005,51 @@ class Subspace(c.Module):
             response =  {'success': True, 'tx_hash': response.extrinsic_hash, 'msg': f'Called {module}.{fn} on {self.network} with key {key}'}
             
         return response
-            
+
+    def tx_pipeline(self) -> TxPipeline:
+        return TxPipeline.get(self.substrate)
+
+    def submit_call(self,
+                    fn:str,
+                    params:dict = None,
+                    key:str = None,
+                    module:str = 'SubspaceModule',
+                    sudo:bool = False,
+                    wait_for:str = 'inclusion'):
+        """
+        Submits a call without waiting on it, using a locally tracked nonce for the key.
+        Returns a future that resolves to {'success', 'tx_hash', ...} once the extrinsic is included (or finalized).
+        """
+        params = {} if params == None else params
+        key = self.resolve_key(key)
+        return self.tx_pipeline().submit(fn=fn, params=params, key=key, module=module, sudo=sudo, wait_for=wait_for)
+
+    def submit_calls(self,
+                    calls:List[dict],
+                    key:str = None,
+                    batch:bool = True,
+                    batch_size:int = 64,
+                    atomic:bool = False,
+                    wait_for:str = 'inclusion',
+                    timeout:int = None,
+                    save_history:bool = True) -> List[dict]:
+        """
+        Submits many calls from one key back to back and waits for all of them.
+        calls: [{'fn', 'params', 'module'?, 'sudo'?}]
+        batch: wrap the calls in utility.batch (batch_all if atomic), batch_size calls per extrinsic
+        """
+        key = self.resolve_key(key)
+        pipeline = self.tx_pipeline()
+        calls = [{'module': 'SubspaceModule', 'sudo': False, 'params': {}, **call} for call in calls]
+        if batch:
+            futures = pipeline.submit_batch(calls, key=key, batch_size=batch_size, atomic=atomic, wait_for=wait_for)
+        else:
+            futures = [pipeline.submit(**call, key=key, wait_for=wait_for) for call in calls]
+        responses = pipeline.wait(futures, timeout=timeout)
+        if save_history:
+            for response in responses:
+                self.add_history(response)
+        return responses
 
     history_path = f'history'
 
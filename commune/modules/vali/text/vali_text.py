@@ -1,5 +1,7 @@
 import commune as c
 import json
+import threading
+from collections import deque
 Vali = c.module('vali')
 
 class ValiText(Vali):
@@ -8,6 +10,7 @@ class ValiText(Vali):
         kwargs['start'] = False
         Vali.__init__(self, config=config, **kwargs)
         self.set_dataset( self.config.dataset )
+        self.set_sample_buffer()
         self.start()
 
 
@@ -27,6 +30,7 @@ class ValiText(Vali):
             module = c.connect(module)
         module.info(timeout=1)
         sample = self.sample()
+        answers = sample['answers']
         prompt = f'COMPLETE THE JSON \n {sample} \n' + " GIVE THE ANSWER AS AN INDEX -> {answer_idx:int} ? \n ```json"
         output = module.generate(prompt, max_tokens=256)
         if isinstance(output, str):
@@ -44,9 +48,74 @@ class ValiText(Vali):
             w = 0
         return {'w': w, 'answer_idx': answer_idx, 'answers': answers, 'output': output, 'sample': sample}
 
+    def set_sample_buffer(self):
+        """
+        Keeps a local buffer of dataset samples, refilled in the background with batched calls
+        whenever it drops below the low water mark, so scoring never waits on the dataset server.
+        With replay, samples are read back from the on disk cache in order instead.
+        """
+        self.sample_buffer = deque()
+        self.sample_condition = threading.Condition()
+        if self.config.replay:
+            samples = [json.loads(line) for line in c.get_text(self.sample_cache_path()).splitlines() if line]
+            assert len(samples) > 0, f'No cached samples to replay in {self.sample_cache_path()}'
+            self.sample_buffer.extend(samples)
+            self.replay_samples = samples
+        else:
+            c.thread(self.sample_buffer_loop, tag='sample_buffer')
+
+    def sample_cache_path(self) -> str:
+        return self.resolve_path(f'{self.config.tag}/samples.jsonl')
+
+    def sample_buffer_loop(self, max_backoff:float = 32):
+        backoff = 1
+        while True:
+            with self.sample_condition:
+                while len(self.sample_buffer) >= self.config.sample_low_water:
+                    self.sample_condition.wait()
+            try:
+                samples = self.dataset.sample(batch_size=self.config.sample_batch_size)
+                if isinstance(samples, dict):
+                    samples = [samples]
+                assert isinstance(samples, list), f'Expected a batch of samples, got {samples}'
+                # the server answers failures with an error dict instead of raising
+                errors = [sample for sample in samples if c.is_error(sample)]
+                samples = [sample for sample in samples if not c.is_error(sample)]
+                assert len(samples) > 0, f'The dataset returned no samples, errors: {errors}'
+                if len(errors) > 0:
+                    c.print(f'Dropped {len(errors)} failed samples from the dataset {errors[0]}', color='red')
+            except Exception as e:
+                c.print(f'Failed to sample from the dataset {e}, retrying in {backoff}s', color='red')
+                c.sleep(backoff)
+                backoff = min(backoff * 2, max_backoff)
+                continue
+            backoff = 1
+            if self.config.cache_samples:
+                with open(self.sample_cache_path(), 'a') as f:
+                    f.write(''.join(json.dumps(sample) + '\n' for sample in samples))
+            with self.sample_condition:
+                self.sample_buffer.extend(samples)
+                self.sample_condition.notify_all()
+
+    def next_sample(self, timeout:int = None) -> dict:
+        timeout = self.config.timeout if timeout == None else timeout
+        with self.sample_condition:
+            if self.config.replay and len(self.sample_buffer) == 0:
+                self.sample_buffer.extend(self.replay_samples)
+            if len(self.sample_buffer) == 0:
+                self.sample_condition.wait_for(lambda: len(self.sample_buffer) > 0, timeout=timeout)
+            sample = self.sample_buffer.popleft() if len(self.sample_buffer) > 0 else None
+            # wake the filler once we fall below the low water mark
+            self.sample_condition.notify_all()
+        if sample == None:
+            # the buffer could not be filled in time, go to the dataset directly
+            sample = self.dataset.sample()
+            assert not c.is_error(sample), f'Failed to sample from the dataset {sample}'
+        return sample
+
     def sample(self):
         # get sample
-        sample = self.dataset.sample()
+        sample = self.next_sample()
         sample = {
             'question': sample['question'],
             'choices': c.shuffle(sample['incorrect_answers'] + sample['correct_answers']),
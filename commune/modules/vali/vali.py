@@ -62,7 +62,7 @@ class Vali(c.Module):
                 netuid = self.config.netuid
             self.subspace = c.module('subspace')(network=network, netuid=netuid)
             
-            self.modules = self.subspace.modules(search=self.config.search, update=update, netuid=netuid)
+            self.modules = self.subspace.modules(search=self.config.search, update=update, netuid=netuid, return_table=True)
             self.n  = len(self.modules)                
             self.subnet = self.subspace.subnet(netuid=netuid)
 
@@ -78,7 +78,7 @@ class Vali(c.Module):
             c.print(traceback.format_exc(), color='red')
             return {'success': False, 'message': f'Error syncing {e}'}
 
-        return {'modules': self.modules, 'subnet': self.subnet}
+        return {'modules': self.modules.to_dicts(), 'subnet': self.subnet}
 
     def score_module(self, module):
 
@@ -335,9 +335,9 @@ class Vali(c.Module):
         futures = []
         while self.running:
 
-            modules = c.shuffle(c.copy(self.modules))
             time_between_interval = c.time()
-            module = c.choice(modules)
+            # pick a row of the module table instead of copying and shuffling every module
+            module = self.modules[c.random_int(self.n - 1)].to_dict()
 
             c.print(f'Sending -> {module["name"]} {c.emoji("rocket")} ({module["address"]}) {c.emoji("rocket")}', color='yellow')
             c.sleep(self.config.sleep_time)
@@ -419,7 +419,7 @@ class Vali(c.Module):
 
     @classmethod
     def check_loop_running(cls):
-        return c.pm2_exists(cls.check_loop_name)
+        return c.process_exists(cls.check_loop_name)
 
     @classmethod
     def ensure_check_loop(self):